@@ -1,7 +1,21 @@
-from typing import List, Dict
-from services.matcher import Matcher
+import argparse
+import csv
+import json
+import logging
+import sys
+from contextlib import nullcontext
+from typing import Dict, Iterable, Iterator, TextIO
+from services.dedupe import DeduplicatingMatcher
+from services.matcher import SCORING_MODES, Matcher
+from services.metrics import LogSink, Metrics, SamplingProfiler, TextfileSink
 from services.normaliser import Normaliser
-from models import VehicleDatabase
+from services.scoring import ScoringPlan
+from services.parallel import ParallelMatcher
+from models import MatchResultWriter, VehicleDatabase
+from models.snapshot import SnapshotDatabase, write_snapshot
+
+OUTPUT_FORMATS = ("text", "jsonl", "csv", "table")
+CSV_FIELDS = ("input", "vehicle_id", "confidence", "listing_count")
 
 
 class VehicleMatcherApp:
@@ -10,43 +24,281 @@ class VehicleMatcherApp:
     them against a vehicle database using a matching service, and outputs the
     results with confidence scores.
     """
-    def __init__(self):
-        self.db = VehicleDatabase()
-        self.matcher = Matcher(self.db, Normaliser())
+    def __init__(self, workers: int = 1, chunk_size: int = 1000,
+                 abbreviations_path: str = None, cache_size: int = 10000,
+                 snapshot_path: str = None, write_snapshot_path: str = None,
+                 max_edit_distance: int = 0, metrics: Metrics = None,
+                 profile_path: str = None, compact: bool = False,
+                 result_batch_size: int = 5000, result_commit_every: int = 10,
+                 scoring: str = "heap", scoring_plan_path: str = None,
+                 dedupe_window: int = 0, verify_snapshot: bool = False):
+        """
+        :param workers: Number of matching processes; above 1 descriptions
+            are sharded across a pool of forked workers
+        :param chunk_size: Number of descriptions sent to a worker per task
+        :param abbreviations_path: JSON abbreviation table replacing the
+            Normaliser defaults
+        :param cache_size: Entries in each of the matcher's LRU caches
+        :param snapshot_path: Load the catalogue from this snapshot file
+            instead of the database, warning if it is stale when
+            DATABASE_URL is set
+        :param write_snapshot_path: Write a snapshot of the catalogue and
+            the matcher's index here once it is loaded
+        :param max_edit_distance: Correct misspelled words up to this many
+            edits from a catalogue word; 0 matches exactly
+        :param metrics: Record per-stage metrics here and export them to its
+            sinks after the run; with workers above 1 matching happens in
+            the workers and only loading is recorded
+        :param profile_path: Sample stacks during the run and write them
+            here in collapsed (flame graph) format
+        :param compact: Hold the catalogue loaded from the database in
+            compact dictionary-encoded columns
+        :param result_batch_size: With the "table" format, results upserted
+            per statement
+        :param result_commit_every: With the "table" format, batches
+            written per transaction
+        :param scoring: Matcher scoring mode, one of SCORING_MODES
+        :param scoring_plan_path: JSON scoring plan (fields, weights and
+            match modes) replacing the default ScoringPlan
+        :param dedupe_window: Above 0, match each distinct normalised
+            description of every window of this many descriptions once and
+            report the dedupe ratio and time saved on stderr
+        :param verify_snapshot: Checksum the whole snapshot when loading it
+        """
+        normaliser = (Normaliser.from_file(abbreviations_path)
+                      if abbreviations_path else Normaliser())
+        self.db = (SnapshotDatabase(snapshot_path, verify_snapshot,
+                                    check_source=True)
+                   if snapshot_path else VehicleDatabase(compact))
+        self.write_snapshot_path = write_snapshot_path
+        plan = (ScoringPlan.from_file(scoring_plan_path) if scoring_plan_path
+                else None)
+        self.matcher = Matcher(self.db, normaliser, cache_size,
+                               max_edit_distance, scoring, plan)
+        self.matcher.instrument(metrics)
+        # Only connects if results are written with the "table" format
+        self.result_writer = MatchResultWriter(
+            batch_size=result_batch_size, commit_every=result_commit_every)
+        self.result_writer.metrics = metrics
+        self.metrics = metrics
+        self.profile_path = profile_path
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.dedupe_window = dedupe_window
+        # DeduplicatingMatcher of the last run with dedupe_window
+        self.deduplicator = None
 
-    def run(self):
+    def run(self, input_path: str = "input.txt", output_format: str = "text",
+            output: TextIO = None):
         """Runs the vehicle matching application workflow.
 
-        The workflow consists of:
-        1. Reading vehicle descriptions from input.txt
-        2. Loading vehicle data from the database
+        The workflow is a streaming pipeline, so memory stays flat however
+        large the input is and each result is written as soon as it is ready:
+        1. Loading vehicle data from the database
+        2. Lazily reading vehicle descriptions from the input file or stdin
         3. Matching descriptions to database entries
-        4. Printing the formatted results
+        4. Writing each result in the requested format, or upserting them
+           into the match_result table in batches
+
+        :param input_path: Path of the input file, or "-" for stdin
+        :param output_format: One of "text", "jsonl", "csv" or "table"
+        :param output: Stream to write results to (default: stdout)
         """
-        # Read descriptions
-        with open("input.txt", "r") as f:
-            descriptions = [line.strip() for line in f if line.strip()]
+        output = output or sys.stdout
+        profiler = SamplingProfiler() if self.profile_path else None
+        if profiler:
+            profiler.start()
+        try:
+            # Load Data, releasing the connection as matching never needs it
+            self.db.load_data(release_connection=True)
+            if self.write_snapshot_path:
+                write_snapshot(self.db, self.write_snapshot_path,
+                               self.matcher.index)
 
-        # Load Data
-        self.db.load_data()
+            with self._open_input(input_path) as f:
+                # Read, match and write one description at a time
+                results = self._match(self._read_descriptions(f))
+                self._write_results(results, output_format, output)
+            if self.deduplicator is not None:
+                print(self.deduplicator.stats.summary(), file=sys.stderr)
+        finally:
+            if profiler:
+                profiler.stop()
+                profiler.write(self.profile_path)
+            if self.metrics is not None:
+                self.metrics.export()
 
-        # Match
-        results = self.matcher.match_descriptions(descriptions)
+    @staticmethod
+    def _open_input(input_path: str):
+        """Open the input file, or wrap stdin without closing it."""
+        if input_path == "-":
+            return nullcontext(sys.stdin)
+        return open(input_path, "r")
+
+    @staticmethod
+    def _read_descriptions(lines: Iterable[str]) -> Iterator[str]:
+        """
+        Lazily yield the non-blank, stripped lines of the input.
+
+        :param lines: Iterable of raw input lines
+        :return: Iterator of vehicle descriptions
+        """
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line
 
-        # Print formatted results
-        self._print_results(results)
+    def _match(self, descriptions: Iterable[str]) -> Iterator[Dict]:
+        """
+        Match descriptions on this process or across worker processes,
+        deduplicated by window when dedupe_window is set.
+
+        :param descriptions: Iterable of vehicle descriptions
+        :return: Iterator of results in input order
+        """
+        if self.dedupe_window:
+            self.deduplicator = DeduplicatingMatcher(
+                self.matcher, self.dedupe_window, self.workers,
+                self.chunk_size)
+            return self.deduplicator.match_descriptions(descriptions)
+        if self.workers > 1:
+            return ParallelMatcher(
+                self.matcher, self.workers, self.chunk_size
+            ).match_descriptions(descriptions)
+        return self.matcher.iter_matches(descriptions)
+
+    def _write_results(self, results: Iterable[Dict], output_format: str,
+                       output: TextIO):
+        """
+        Write results in the requested format.
+
+        :param results: Iterable of result dictionaries
+        :param output_format: One of "text", "jsonl", "csv" or "table"
+        :param output: Stream to write results to
+        """
+        if output_format == "text":
+            self._print_results(results, output)
+        elif output_format == "jsonl":
+            self._write_jsonl(results, output)
+        elif output_format == "csv":
+            self._write_csv(results, output)
+        elif output_format == "table":
+            self._write_table(results, output)
+        else:
+            raise ValueError(f"Unknown output format: {output_format}")
 
-    def _print_results(self, results: List[Dict]):
+    def _print_results(self, results: Iterable[Dict], output: TextIO = None):
         """
         Print results in the requested format.
 
         :param results: A list of dictionaries where each dictionary contains
         - input, vehicle_id and confidence
+        :param output: Stream to write results to (default: stdout)
         """
         for result in results:
-            print(f"Input: {result['input']}")
-            print(f"Vehicle ID: {result['vehicle_id']}")
-            print(f"Confidence: {result['confidence']}\n")
+            print(f"Input: {result['input']}", file=output)
+            print(f"Vehicle ID: {result['vehicle_id']}", file=output)
+            print(f"Confidence: {result['confidence']}\n", file=output)
+
+    def _write_jsonl(self, results: Iterable[Dict], output: TextIO):
+        """
+        Write one JSON object per result per line.
+
+        :param results: Iterable of result dictionaries
+        :param output: Stream to write results to
+        """
+        for result in results:
+            output.write(json.dumps(result) + "\n")
+
+    def _write_csv(self, results: Iterable[Dict], output: TextIO):
+        """
+        Write results as CSV with a header row; unmatched descriptions have
+        an empty vehicle_id and listing_count.
+
+        :param results: Iterable of result dictionaries
+        :param output: Stream to write results to
+        """
+        writer = csv.DictWriter(output, fieldnames=CSV_FIELDS, restval="")
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
+
+    def _write_table(self, results: Iterable[Dict], output: TextIO):
+        """
+        Upsert results into the match_result table in batches and report
+        how many were written.
+
+        :param results: Iterable of result dictionaries
+        :param output: Stream to write the summary to
+        """
+        written = self.result_writer.write_all(results)
+        print(f"Wrote {written} results to match_result", file=output)
+
 
 if __name__ == "__main__":
-    VehicleMatcherApp().run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Match vehicle descriptions")
+    parser.add_argument("--input", default="input.txt",
+                        help='input file, or "-" for stdin')
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="text",
+                        help='output format; "table" upserts results into '
+                             'the match_result table')
+    parser.add_argument("--batch-size", type=int, default=5000,
+                        help="results upserted per statement with --format "
+                             "table")
+    parser.add_argument("--commit-every", type=int, default=10,
+                        help="batches written per transaction with --format "
+                             "table")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of matching processes")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="descriptions sent to a worker per task")
+    parser.add_argument("--abbreviations",
+                        help="JSON file mapping abbreviations to expansions")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="entries in each LRU cache, 0 to disable")
+    parser.add_argument("--snapshot",
+                        help="load the catalogue from a snapshot file")
+    parser.add_argument("--verify-snapshot", action="store_true",
+                        help="checksum the whole snapshot when loading it")
+    parser.add_argument("--write-snapshot",
+                        help="write a snapshot of the loaded catalogue "
+                             "and its match index")
+    parser.add_argument("--fuzzy", type=int, default=0, metavar="EDITS",
+                        help="correct misspellings up to EDITS edits (1-2)")
+    parser.add_argument("--scoring", choices=SCORING_MODES, default="heap",
+                        help="score candidates from the index into a heap, "
+                             "or combine per-field bitsets")
+    parser.add_argument("--scoring-plan", metavar="PATH",
+                        help="JSON file of scored fields, weights and match "
+                             "modes")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="match each distinct normalised description "
+                             "once per window and report the time saved")
+    parser.add_argument("--dedupe-window", type=int, default=100000,
+                        metavar="LINES",
+                        help="descriptions grouped at a time with --dedupe")
+    parser.add_argument("--compact", action="store_true",
+                        help="hold the catalogue in compact columns")
+    parser.add_argument("--metrics-log", action="store_true",
+                        help="log per-stage metrics to stderr after the run")
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help="write per-stage metrics in Prometheus text "
+                             "format after the run")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="sample stacks during the run and write them "
+                             "here in collapsed (flame graph) format")
+    args = parser.parse_args()
+    sinks = []
+    if args.metrics_log:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        sinks.append(LogSink())
+    if args.metrics_file:
+        sinks.append(TextfileSink(args.metrics_file))
+    VehicleMatcherApp(args.workers, args.chunk_size, args.abbreviations,
+                      args.cache_size, args.snapshot, args.write_snapshot,
+                      args.fuzzy, Metrics(sinks) if sinks else None,
+                      args.profile, args.compact, args.batch_size,
+                      args.commit_every, args.scoring,
+                      args.scoring_plan,
+                      args.dedupe_window if args.dedupe else 0,
+                      args.verify_snapshot).run(args.input, args.format)
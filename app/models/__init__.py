@@ -1,42 +1,258 @@
+import time
 from collections import Counter
-from typing import Dict
+from typing import Dict, Iterable, Iterator, List, Set
+from sqlalchemy import func, select
+from sqlalchemy.exc import DBAPIError
 from db.connector import get_session
-from .vehicle import Vehicle
+from .change import CatalogueChange
+from .compact import CompactListingCounts, CompactVehicles
+from .vehicle import Vehicle, VehicleRow
 from .listing import Listing
+from .match_result import MatchResult, MatchResultWriter
+
+# Maximum number of IDs bound into a single IN (...) clause
+_IN_CHUNK_SIZE = 1000
+
+# Rows fetched per round trip from the server-side cursor
+_YIELD_PER = 10000
+
+
+class CatalogueDelta:
+    """The vehicles changed by an incremental refresh."""
+
+    def __init__(self, vehicles: Dict, removed: Set[str],
+                 listing_counts: Dict[str, int], watermark: int = None,
+                 listings: List = None):
+        """
+        :param vehicles: Mapping of ID to VehicleRow for added or updated
+            vehicles
+        :param removed: IDs of vehicles no longer in the catalogue
+        :param listing_counts: New listing count of every changed vehicle
+        :param watermark: Latest catalogue_change row the delta covers
+        :param listings: Current Listing rows of the changed vehicles, when
+            listings are loaded
+        """
+        self.vehicles = vehicles
+        self.removed = removed
+        self.listing_counts = listing_counts
+        self.watermark = watermark
+        self.listings = listings
+
+    def __bool__(self) -> bool:
+        return bool(self.vehicles or self.removed or self.listing_counts)
 
 
 class VehicleDatabase:
     """A database interface for vehicle and listing data."""
 
-    def __init__(self):
+    def __init__(self, compact: bool = False):
+        """
+        :param compact: Hold the catalogue as dictionary-encoded columns
+            (CompactVehicles) rather than a dict of VehicleRow, for
+            catalogues of millions of vehicles
+        """
+        self.compact = compact
         self.session = get_session()
         self.vehicles = {}
         self.listings = []
+        self.listings_loaded = False
         self.listing_counts = {}
+        # Last catalogue_change row reflected in memory; None if unknown
+        self.change_watermark = None
+        # services.metrics.Metrics recording the db_load and db_refresh
+        # stages; None disables instrumentation
+        self.metrics = None
+
+    def load_data(self, load_listings: bool = False,
+                  release_connection: bool = False):
+        """
+        Loads and caches all vehicle data and per-vehicle listing counts
+        from the database.
+
+        Vehicles are streamed through a server-side cursor as plain
+        VehicleRow tuples of the needed columns, without building ORM
+        instances.
+
+        :param load_listings: Also materialise every Listing row in
+            self.listings; the counts never need them
+        :param release_connection: Return the connection to the pool once
+            loaded, for callers that only match afterwards
+        """
+        start = time.perf_counter()
+
+        # Record the watermark first, so changes made while loading are
+        # picked up again by the next refresh
+        self.change_watermark = self._get_change_watermark()
+
+        # Count listings in the database rather than loading them
+        listing_counts = self._get_listing_counts()
+        self.listings = (self.session.query(Listing).all() if load_listings
+                         else [])
+        self.listings_loaded = load_listings
+
+        # Cache all vehicles; compact columns are filled straight from the
+        # cursor, without an intermediate dict
+        if self.compact:
+            self.vehicles = CompactVehicles(self._iter_vehicles())
+            self.listing_counts = CompactListingCounts(self.vehicles,
+                                                       listing_counts)
+        else:
+            self.vehicles = self._get_vehicles()
+            self.listing_counts = listing_counts
+
+        if release_connection:
+            self.session.close()
+
+        if self.metrics is not None:
+            self.metrics.observe_stage('db_load', time.perf_counter() - start)
+            self.metrics.set_gauge('vehicles', len(self.vehicles))
+
+    def refresh(self) -> CatalogueDelta:
+        """
+        Incrementally refresh the cached catalogue with the vehicles and
+        listings changed since the last load or refresh, as recorded in the
+        catalogue_change table.
+
+        This is fetch_changes followed by apply_changes. Falls back to a
+        full load_data when no watermark is known.
 
-    def load_data(self):
+        :return: CatalogueDelta describing the applied changes
         """
-        Loads and caches all vehicle and listing data from the database.
+        delta = self.fetch_changes()
+        if delta is None:
+            self.load_data()
+            return CatalogueDelta({}, set(), {})
+        self.apply_changes(delta)
+        return delta
+
+    def fetch_changes(self) -> 'CatalogueDelta':
+        """
+        Query the vehicles and listings changed since the last load or
+        refresh, without touching the cached catalogue. It may run on
+        another thread than the matching, which only waits for
+        apply_changes.
+
+        :return: CatalogueDelta to pass to apply_changes, or None when no
+            watermark is known and only a full load_data can refresh
+        """
+        if self.change_watermark is None:
+            return None
+
+        start = time.perf_counter()
+        changes = self.session.query(
+            CatalogueChange.id, CatalogueChange.vehicle_id
+        ).filter(CatalogueChange.id > self.change_watermark).all()
+        if not changes:
+            return CatalogueDelta({}, set(), {})
+
+        watermark = max(change_id for change_id, _ in changes)
+        changed_ids = sorted({vehicle_id for _, vehicle_id in changes})
+
+        vehicles = {}
+        counts = {}
+        listings = []
+        for ids in self._chunks(changed_ids):
+            vehicles.update(self._get_vehicles(ids))
+            counts.update(self._get_listing_counts(ids))
+            if self.listings_loaded:
+                listings.extend(self.session.query(Listing)
+                                .filter(Listing.vehicle_id.in_(ids))
+                                .populate_existing())
+
+        if self.metrics is not None:
+            self.metrics.observe_stage('db_refresh',
+                                       time.perf_counter() - start)
+        return CatalogueDelta(
+            vehicles,
+            {vehicle_id for vehicle_id in changed_ids
+             if vehicle_id not in vehicles},
+            {vehicle_id: counts.get(vehicle_id, 0)
+             for vehicle_id in changed_ids},
+            watermark, listings if self.listings_loaded else None)
+
+    def apply_changes(self, delta: CatalogueDelta):
+        """
+        Update the cached catalogue in place with changes from
+        fetch_changes. No queries are run.
+
+        :param delta: CatalogueDelta returned by fetch_changes
+        """
+        if not delta:
+            return
+        if delta.listings is not None:
+            changed = set(delta.listing_counts)
+            self.listings = [listing for listing in self.listings
+                             if listing.vehicle_id not in changed
+                             ] + delta.listings
+        for vehicle_id, count in delta.listing_counts.items():
+            if count:
+                self.listing_counts[vehicle_id] = count
+            else:
+                self.listing_counts.pop(vehicle_id, None)
+        for vehicle_id in delta.removed:
+            self.vehicles.pop(vehicle_id, None)
+        self.vehicles.update(delta.vehicles)
+        self.change_watermark = delta.watermark
+
+        if self.metrics is not None:
+            self.metrics.increment('vehicles_refreshed',
+                                   len(delta.listing_counts))
+            self.metrics.set_gauge('vehicles', len(self.vehicles))
+
+    def _get_change_watermark(self):
+        """
+        Return the ID of the latest catalogue change, 0 if there are none, or
+        None if the database does not track changes.
+        """
+        try:
+            return self.session.query(
+                func.max(CatalogueChange.id)).scalar() or 0
+        except DBAPIError:
+            self.session.rollback()
+            return None
+
+    def _get_vehicles(self, vehicle_ids: List[str] = None) -> Dict[str, VehicleRow]:
+        """
+        Stream the vehicle columns into VehicleRow tuples.
+
+        :param vehicle_ids: Only fetch these vehicles
+        :return: A dictionary mapping vehicle IDs to VehicleRow, in
+        database order
+        """
+        return {row[0]: row for row in self._iter_vehicles(vehicle_ids)}
+
+    def _iter_vehicles(self, vehicle_ids: List[str] = None) -> Iterator[VehicleRow]:
+        """
+        Stream the vehicle columns as VehicleRow tuples, in database order.
+
+        :param vehicle_ids: Only fetch these vehicles
         """
-        # Cache all listings
-        self.listings = self.session.query(Listing).all()
-        self.listing_counts = self._get_listing_counts()
+        query = select(*(getattr(Vehicle, column)
+                         for column in VehicleRow._fields))
+        if vehicle_ids is not None:
+            query = query.where(Vehicle.id.in_(vehicle_ids))
+        result = self.session.execute(
+            query.execution_options(yield_per=_YIELD_PER))
+        return map(VehicleRow._make, result)
 
-        # Cache all vehicles
-        vehicles = self.session.query(Vehicle).all()
-        self.vehicles = {v.id: v for v in vehicles}
+    @staticmethod
+    def _chunks(ids: List[str]) -> Iterable[List[str]]:
+        for start in range(0, len(ids), _IN_CHUNK_SIZE):
+            yield ids[start:start + _IN_CHUNK_SIZE]
 
-    def _get_listing_counts(self) -> Dict[str, int]:
+    def _get_listing_counts(self, vehicle_ids: List[str] = None) -> Dict[str, int]:
         """
-        Counts the number of listings associated with each vehicle.
+        Counts the number of listings associated with each vehicle with a
+        GROUP BY in the database.
+        :param vehicle_ids: Only count listings of these vehicles
         :return: A dictionary mapping vehicle IDs to their respective
         listing counts.
         """
-        counts = Counter()
-        for listing in self.listings:
-            counts[listing.vehicle_id] += 1
-        return counts
+        query = self.session.query(Listing.vehicle_id, func.count(Listing.id))
+        if vehicle_ids is not None:
+            query = query.filter(Listing.vehicle_id.in_(vehicle_ids))
+        return Counter(dict(query.group_by(Listing.vehicle_id)))
 
     def close(self):
         """Closes the database session and releases resources."""
-        self.session.close()
\ No newline at end of file
+        self.session.close()
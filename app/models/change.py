@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, BigInteger, DateTime
+from db.connector import Base
+
+class CatalogueChange(Base):
+    __tablename__ = "catalogue_change"
+
+    id = Column(BigInteger, primary_key=True)
+    vehicle_id = Column(String, nullable=False)
+    changed_at = Column(DateTime)
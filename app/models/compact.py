@@ -0,0 +1,366 @@
+from array import array
+from bisect import bisect_right
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .vehicle import VehicleRow
+
+# Largest code a uint16 array holds before it is widened to uint32
+_MAX_SHORT_CODE = 0xFFFF
+
+# IDs added since the sorted lookup arrays were built are kept in a dict;
+# beyond this many the arrays are rebuilt
+_MAX_UNSORTED = 4096
+
+# Columns stored as a sequence of word codes rather than one code per value:
+# badges are mostly distinct ("110TSI Comfortline", "132TSI Comfortline")
+# but share their words
+TOKENISED_FIELDS = ('badge',)
+
+
+def _is_integer_id(vehicle_id) -> bool:
+    """Whether an ID round-trips through int64 unchanged, e.g. "6434473696559104"."""
+    return (isinstance(vehicle_id, str) and 0 < len(vehicle_id) <= 18
+            and vehicle_id.isascii() and vehicle_id.isdigit()
+            and (vehicle_id[0] != "0" or vehicle_id == "0"))
+
+
+class StringTable:
+    """Interned strings addressed by dense integer codes."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def _widen(codes: array, code: int) -> array:
+    """Return codes as uint32 if code no longer fits its item size."""
+    if code > _MAX_SHORT_CODE and codes.typecode == 'H':
+        return array('I', codes)
+    return codes
+
+
+class CategoricalColumn:
+    """A dictionary-encoded string column: one uint16 code per row into a
+    table of the distinct values, widened to uint32 past 65535 of them."""
+
+    def __init__(self):
+        self.table = StringTable()
+        self.codes = array('H')
+
+    def append(self, value: str):
+        code = self.table.encode(value)
+        self.codes = _widen(self.codes, code)
+        self.codes.append(code)
+
+    def __setitem__(self, position: int, value: str):
+        code = self.table.encode(value)
+        self.codes = _widen(self.codes, code)
+        self.codes[position] = code
+
+    def __getitem__(self, position: int) -> str:
+        return self.table.values[self.codes[position]]
+
+
+class TokenColumn:
+    """A string column stored as word codes into a shared word table.
+
+    Row i is the words tokens[starts[i]:starts[i] + lengths[i]], joined by
+    single spaces. Splitting on single spaces keeps empty words, so values
+    round-trip exactly. Updated rows are appended and the old words left
+    unused.
+    """
+
+    def __init__(self):
+        self.table = StringTable()
+        self.tokens = array('H')
+        self.starts = array('I')
+        self.lengths = array('H')
+
+    def _encode(self, value: str) -> Tuple[int, int]:
+        start = len(self.tokens)
+        words = value.split(' ')
+        for word in words:
+            code = self.table.encode(word)
+            self.tokens = _widen(self.tokens, code)
+            self.tokens.append(code)
+        return start, len(words)
+
+    def append(self, value: str):
+        start, length = self._encode(value)
+        self.starts.append(start)
+        self.lengths.append(length)
+
+    def __setitem__(self, position: int, value: str):
+        self.starts[position], self.lengths[position] = self._encode(value)
+
+    def __getitem__(self, position: int) -> str:
+        start = self.starts[position]
+        values = self.table.values
+        return ' '.join([values[code] for code in
+                         self.tokens[start:start + self.lengths[position]]])
+
+
+class CompactVehicles(MutableMapping):
+    """Mapping of vehicle ID to VehicleRow in columnar, dictionary-encoded
+    form, for catalogues of millions of vehicles.
+
+    Rows are stored by position in catalogue order. IDs sit in an int64
+    array. Make, model and the type columns are uint16 codes into tables of
+    their distinct values, and badges are word codes. The strings of a
+    column are held once however many vehicles share them. IDs are found by
+    binary search over a sorted copy. If any ID is not a canonical decimal
+    integer, IDs fall back to a list of strings and a dict.
+
+    Behaves like the dict it replaces: updating a vehicle keeps its
+    position, new vehicles are appended and removed ones leave a hole, so
+    iteration order matches. Rows are rebuilt as VehicleRow on access.
+
+    Positions are public (position, vehicle_id, enumerate_vehicles), so
+    that structures aligned with the catalogue, such as the matcher's
+    FeatureTable, need no ID mapping of their own.
+    """
+
+    def __init__(self, rows: Iterable[Tuple] = ()):
+        """
+        :param rows: Iterable of VehicleRow-shaped tuples, in catalogue
+            order
+        """
+        self.fields = VehicleRow._fields[1:]
+        self.columns = [TokenColumn() if field in TOKENISED_FIELDS
+                        else CategoricalColumn() for field in self.fields]
+        self._ids = array('q')
+        self._integer_ids = True
+        self._alive = bytearray()
+        self._size = 0
+        # Sorted IDs and their positions, for binary search. Removed vehicles
+        # stay, so that their last position can still be found
+        self._sorted_ids = array('q')
+        self._sorted_positions = array('i')
+        # ID -> latest position of vehicles added since the sort (every
+        # vehicle for string IDs)
+        self._unsorted: Dict = {}
+        for row in rows:
+            self._append(row[0], row[1:])
+        self._sort()
+
+    def _key(self, vehicle_id):
+        """The stored form of an ID, or None if no stored ID can equal it."""
+        if not self._integer_ids:
+            return vehicle_id
+        return int(vehicle_id) if _is_integer_id(vehicle_id) else None
+
+    def position(self, vehicle_id) -> Optional[int]:
+        """
+        Return the latest position of a vehicle. A removed vehicle keeps
+        its position until it is added again, at a new one.
+
+        :param vehicle_id: ID of the vehicle
+        :return: Position, or None if the ID was never stored
+        """
+        key = self._key(vehicle_id)
+        if key is None:
+            return None
+        position = self._unsorted.get(key)
+        if position is None:
+            sorted_ids = self._sorted_ids
+            # The last of equal IDs is the most recent position
+            at = bisect_right(sorted_ids, key) - 1
+            if at < 0 or sorted_ids[at] != key:
+                return None
+            position = self._sorted_positions[at]
+        return position
+
+    def vehicle_id(self, position: int) -> str:
+        """
+        :param position: Position of a vehicle, stored or removed
+        :return: ID of the vehicle at that position
+        """
+        vehicle_id = self._ids[position]
+        return str(vehicle_id) if self._integer_ids else vehicle_id
+
+    def enumerate_vehicles(self) -> Iterator[Tuple[int, VehicleRow]]:
+        """Yield (position, vehicle) for every stored vehicle, in order."""
+        for position, alive in enumerate(self._alive):
+            if alive:
+                yield position, self._row(position)
+
+    def _position(self, vehicle_id) -> Optional[int]:
+        """Return the position of a vehicle, or None if it is not stored."""
+        position = self.position(vehicle_id)
+        return (position if position is not None and self._alive[position]
+                else None)
+
+    def _append(self, vehicle_id, values: Tuple):
+        """Store a row at the end; it is not found until indexed or sorted."""
+        if self._integer_ids and not _is_integer_id(vehicle_id):
+            self._use_string_ids()
+        self._ids.append(int(vehicle_id) if self._integer_ids else vehicle_id)
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        self._alive.append(1)
+        self._size += 1
+
+    def _sort(self):
+        """Rebuild the lookup structures over every position, removed or not."""
+        if not self._integer_ids:
+            self._use_string_ids()
+            return
+        keys = np.array(self._ids, dtype=np.int64)
+        # Stable, so equal IDs stay in position order
+        order = np.argsort(keys, kind="stable")
+        self._sorted_ids = array('q', keys[order].tobytes())
+        self._sorted_positions = array(
+            'i', order.astype(np.int32).tobytes())
+        self._unsorted = {}
+
+    def _use_string_ids(self):
+        """Switch to string IDs once an ID that is not an integer appears."""
+        if self._integer_ids:
+            self._ids = [str(key) for key in self._ids]
+            self._integer_ids = False
+        self._unsorted = {vehicle_id: position
+                          for position, vehicle_id in enumerate(self._ids)}
+        self._sorted_ids = array('q')
+        self._sorted_positions = array('i')
+
+    def _row(self, position: int) -> VehicleRow:
+        return VehicleRow(self.vehicle_id(position),
+                          *(column[position] for column in self.columns))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[str]:
+        ids = self._ids
+        integer_ids = self._integer_ids
+        for position, alive in enumerate(self._alive):
+            if alive:
+                yield str(ids[position]) if integer_ids else ids[position]
+
+    def __contains__(self, vehicle_id) -> bool:
+        return self._position(vehicle_id) is not None
+
+    def __getitem__(self, vehicle_id) -> VehicleRow:
+        position = self._position(vehicle_id)
+        if position is None:
+            raise KeyError(vehicle_id)
+        return self._row(position)
+
+    def __setitem__(self, vehicle_id, vehicle):
+        values = tuple(getattr(vehicle, field) for field in self.fields)
+        position = self._position(vehicle_id)
+        if position is None:
+            self._append(vehicle_id, values)
+            self._unsorted[self._key(vehicle_id)] = len(self._alive) - 1
+            if self._integer_ids and len(self._unsorted) > _MAX_UNSORTED:
+                self._sort()
+            return
+        for column, value in zip(self.columns, values):
+            column[position] = value
+
+    def __delitem__(self, vehicle_id):
+        position = self._position(vehicle_id)
+        if position is None:
+            raise KeyError(vehicle_id)
+        self._alive[position] = 0
+        self._size -= 1
+
+    def items(self):
+        for _, row in self.enumerate_vehicles():
+            yield row.id, row
+
+    def values(self):
+        return (vehicle for _, vehicle in self.items())
+
+
+class CompactListingCounts(MutableMapping):
+    """Mapping of vehicle ID to listing count, stored as a uint32 array
+    aligned with the positions of a CompactVehicles.
+
+    Counts set after construction, by incremental refreshes, go to a small
+    override dict. As with the Counter it replaces, a vehicle without
+    listings is absent but reads as 0.
+    """
+
+    def __init__(self, vehicles: CompactVehicles, counts: Dict[str, int]):
+        """
+        :param vehicles: Catalogue whose positions index the counts
+        :param counts: Mapping of vehicle ID to listing count
+        """
+        self._vehicles = vehicles
+        self._counts = array('I', bytes(4 * len(vehicles._alive)))
+        self._overrides: Dict[str, int] = {}
+        for vehicle_id, count in counts.items():
+            position = vehicles._position(vehicle_id)
+            if position is None:
+                self._overrides[vehicle_id] = count
+            else:
+                self._counts[position] = count
+
+    def _get(self, vehicle_id) -> int:
+        count = self._overrides.get(vehicle_id)
+        if count is not None:
+            return count
+        position = self._vehicles._position(vehicle_id)
+        if position is None or position >= len(self._counts):
+            return 0
+        return self._counts[position]
+
+    def __getitem__(self, vehicle_id) -> int:
+        return self._get(vehicle_id)
+
+    def __contains__(self, vehicle_id) -> bool:
+        return bool(self._get(vehicle_id))
+
+    def get(self, vehicle_id, default=None):
+        count = self._get(vehicle_id)
+        return count if count else default
+
+    def __setitem__(self, vehicle_id, count: int):
+        self._overrides[vehicle_id] = count
+
+    def __delitem__(self, vehicle_id):
+        if not self._get(vehicle_id):
+            raise KeyError(vehicle_id)
+        self._overrides[vehicle_id] = 0
+
+    def pop(self, vehicle_id, *default):
+        count = self._get(vehicle_id)
+        if not count:
+            if default:
+                return default[0]
+            raise KeyError(vehicle_id)
+        self._overrides[vehicle_id] = 0
+        return count
+
+    def __iter__(self) -> Iterator[str]:
+        overrides = self._overrides
+        counts = self._counts
+        vehicles = self._vehicles
+        alive = vehicles._alive
+        for position in range(len(counts)):
+            if counts[position] and alive[position]:
+                vehicle_id = vehicles._ids[position]
+                vehicle_id = (str(vehicle_id) if vehicles._integer_ids
+                              else vehicle_id)
+                if vehicle_id not in overrides:
+                    yield vehicle_id
+        for vehicle_id, count in overrides.items():
+            if count:
+                yield vehicle_id
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
@@ -5,7 +5,7 @@ class Listing(Base):
     __tablename__ = "listing"
 
     id = Column(String, primary_key=True, index=True)
-    vehicle_id = Column(String, nullable=False)
+    vehicle_id = Column(String, nullable=False, index=True)
     url = Column(String, nullable=False)
     price = Column(String, nullable=False)
     kms = Column(String, nullable=False)
\ No newline at end of file
@@ -0,0 +1,120 @@
+import time
+from typing import Dict, Iterable
+from sqlalchemy import Column, DateTime, Integer, String, func
+from sqlalchemy.dialects import postgresql, sqlite
+from db.connector import Base, get_session
+
+# Dialects whose INSERT supports ON CONFLICT ... DO UPDATE
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+# Columns written from each result
+RESULT_FIELDS = ("input", "vehicle_id", "confidence", "listing_count")
+
+
+class MatchResult(Base):
+    __tablename__ = "match_result"
+
+    input = Column(String, primary_key=True)
+    vehicle_id = Column(String)
+    confidence = Column(Integer, nullable=False)
+    listing_count = Column(Integer)
+    matched_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class MatchResultWriter:
+    """Writes match results to the match_result table in bulk.
+
+    Results are buffered and sent batch_size at a time as one executemany of
+    INSERT ... ON CONFLICT (input) DO UPDATE, so a rerun of the same feed
+    overwrites its earlier rows instead of failing or duplicating them. The
+    transaction is committed every commit_every batches and on close: a
+    failed run keeps what was committed, and rerunning it is safe.
+    """
+
+    def __init__(self, session=None, batch_size: int = 5000,
+                 commit_every: int = 10):
+        """
+        :param session: SQLAlchemy session to write through (default: a new
+            session on the configured database)
+        :param batch_size: Results sent per statement
+        :param commit_every: Batches written per transaction
+        """
+        if batch_size < 1 or commit_every < 1:
+            raise ValueError("batch_size and commit_every must be positive")
+        self.session = session if session is not None else get_session()
+        self.batch_size = batch_size
+        self.commit_every = commit_every
+        # Results sent to the database so far
+        self.written = 0
+        # input -> row; a description repeated within a batch keeps its
+        # last result, as one statement may not upsert the same key twice
+        self._batch: Dict[str, Dict] = {}
+        self._uncommitted = 0
+        self._statement = None
+        # services.metrics.Metrics recording the persist stage; None
+        # disables instrumentation
+        self.metrics = None
+
+    def write(self, result: Dict):
+        """
+        Buffer one result, sending the batch once it is full.
+
+        :param result: Result dictionary as from Matcher.match_descriptions
+        """
+        self._batch[result['input']] = {
+            field: result.get(field) for field in RESULT_FIELDS}
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_all(self, results: Iterable[Dict]) -> int:
+        """
+        Write every result and commit.
+
+        :param results: Iterable of result dictionaries
+        :return: Number of results written by this writer in total
+        """
+        for result in results:
+            self.write(result)
+        self.close()
+        return self.written
+
+    def flush(self):
+        """Send the buffered results, committing every commit_every batches."""
+        if not self._batch:
+            return
+        start = time.perf_counter()
+        rows = list(self._batch.values())
+        self.session.execute(self._upsert(), rows)
+        self._batch = {}
+        self.written += len(rows)
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+        if self.metrics is not None:
+            self.metrics.observe_stage('persist', time.perf_counter() - start)
+            self.metrics.increment('results_written', len(rows))
+
+    def commit(self):
+        self.session.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        """Send any buffered results and commit them."""
+        self.flush()
+        if self._uncommitted:
+            self.commit()
+
+    def _upsert(self):
+        """Build, once, the upsert statement for the session's dialect."""
+        if self._statement is None:
+            dialect = self.session.get_bind().dialect.name
+            insert = _UPSERT_INSERTS.get(dialect)
+            if insert is None:
+                raise ValueError(f"Upserts are not supported on {dialect}")
+            statement = insert(MatchResult)
+            self._statement = statement.on_conflict_do_update(
+                index_elements=[MatchResult.input],
+                set_={**{field: statement.excluded[field]
+                         for field in RESULT_FIELDS[1:]},
+                      'matched_at': func.now()})
+        return self._statement
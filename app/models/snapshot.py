@@ -0,0 +1,543 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+import time
+from collections.abc import Mapping
+from itertools import chain
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from . import CatalogueDelta, VehicleDatabase
+from .vehicle import VehicleRow
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"VMSNAP\0\0"
+SNAPSHOT_FORMAT = 1
+
+# Arrays are aligned so they can be memory-mapped directly
+_ALIGNMENT = 64
+_PREFIX = struct.Struct("<8sI")
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is unreadable, corrupt or of another format."""
+
+
+def write_snapshot(db, path: str, index=None):
+    """
+    Write the loaded catalogue and listing counts to a snapshot file, and
+    optionally the matcher's index over it.
+
+    The file holds a JSON header followed by aligned arrays: a string table
+    (UTF-8 blob plus offsets) and, per vehicle, the string IDs of its ID and
+    columns and its listing count. With an index, the index's features and
+    postings follow (see _index_arrays). It is written to a temporary file
+    and renamed, so readers never see a partial snapshot.
+
+    :param db: Loaded VehicleDatabase
+    :param path: Destination path
+    :param index: VehicleIndex built over db.vehicles since it was loaded,
+        e.g. Matcher.index, so that its positions are the catalogue order
+    :raises SnapshotError: If the index is not in catalogue order
+    """
+    strings: Dict[str, int] = {}
+
+    def string_id(value: str) -> int:
+        return strings.setdefault(value, len(strings))
+
+    fields = VehicleRow._fields[1:]
+    vehicle_ids = np.array([string_id(vehicle_id) for vehicle_id in db.vehicles],
+                           dtype=np.int32)
+    columns = np.array([[string_id(getattr(vehicle, field)) for field in fields]
+                        for vehicle in db.vehicles.values()],
+                       dtype=np.int32).reshape(len(vehicle_ids), len(fields))
+    listing_counts = np.array([db.listing_counts.get(vehicle_id, 0)
+                               for vehicle_id in db.vehicles], dtype=np.int64)
+    index_arrays = ({} if index is None
+                    else _index_arrays(index, db.vehicles, string_id))
+    encoded = [value.encode("utf-8") for value in strings]
+    string_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=string_offsets[1:])
+    string_data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    arrays = {
+        "string_offsets": string_offsets,
+        "string_data": string_data,
+        "vehicle_ids": vehicle_ids,
+        "columns": columns,
+        "listing_counts": listing_counts,
+        **index_arrays,
+    }
+    checksum = hashlib.blake2b()
+    for array in arrays.values():
+        checksum.update(array.tobytes())
+
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "catalogue_version": db.change_watermark,
+        "fields": list(fields),
+        "checksum": checksum.hexdigest(),
+        "arrays": {},
+    }
+    if index is not None:
+        header["index"] = {
+            "phrase_fields": list(index.table.phrase_fields),
+            "word_fields": list(index.table.word_fields),
+            "always_mask": index.always_mask,
+        }
+    # Offsets depend on the header length, which depends on the offsets;
+    # reserve room for them first
+    header_size = len(json.dumps(header)) + 64 * len(arrays) + 256
+    offset = _align(_PREFIX.size + header_size)
+    for name, array in arrays.items():
+        header["arrays"][name] = {"offset": offset, "dtype": array.dtype.str,
+                                  "shape": list(array.shape)}
+        offset = _align(offset + array.nbytes)
+    encoded_header = json.dumps(header).encode("utf-8")
+    if len(encoded_header) > header_size:
+        raise SnapshotError("Snapshot header overflow")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREFIX.pack(SNAPSHOT_MAGIC, len(encoded_header)))
+            f.write(encoded_header)
+            for name, array in arrays.items():
+                f.seek(header["arrays"][name]["offset"])
+                f.write(array.tobytes())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def _index_arrays(index, vehicles, string_id) -> Dict[str, np.ndarray]:
+    """
+    Encode a VehicleIndex as arrays of string IDs.
+
+    Features are stored once per distinct (phrases, word sets) pair and word
+    sets once per distinct set, so vehicles sharing them share them again
+    when read. Phrase and word postings are each a key array, offsets into
+    a position array and the key's field bitmask.
+    """
+    table = index.table
+    records = table.records
+    if len(records) != len(vehicles) or any(
+            features is None or table.vehicle_id(position) != vehicle_id
+            for position, (features, vehicle_id) in
+            enumerate(zip(records, vehicles))):
+        raise SnapshotError("Index positions differ from the catalogue order")
+
+    word_sets: Dict[Tuple[str, ...], int] = {}
+    word_set_words: List[int] = []
+    word_set_offsets = [0]
+    distinct: Dict[Tuple, int] = {}
+    feature_phrases: List[List[int]] = []
+    feature_words: List[List[int]] = []
+    feature_ids = np.empty(len(records), dtype=np.int32)
+    for position, features in enumerate(records):
+        key = (features.phrases, features.words)
+        feature_id = distinct.get(key)
+        if feature_id is None:
+            feature_id = distinct[key] = len(distinct)
+            feature_phrases.append([string_id(value)
+                                    for value in features.phrases])
+            set_ids = []
+            for words in features.words:
+                set_id = word_sets.get(words)
+                if set_id is None:
+                    set_id = word_sets[words] = len(word_sets)
+                    word_set_words.extend(string_id(word) for word in words)
+                    word_set_offsets.append(len(word_set_words))
+                set_ids.append(set_id)
+            feature_words.append(set_ids)
+        feature_ids[position] = feature_id
+
+    return {
+        "feature_ids": feature_ids,
+        "feature_phrases": np.array(feature_phrases, dtype=np.int32).reshape(
+            len(feature_phrases), len(table.phrase_fields)),
+        "feature_words": np.array(feature_words, dtype=np.int32).reshape(
+            len(feature_words), len(table.word_fields)),
+        "word_set_offsets": np.array(word_set_offsets, dtype=np.int64),
+        "word_set_words": np.array(word_set_words, dtype=np.int32),
+        "always": np.array(index.always, dtype=np.int32),
+        **_postings_arrays("phrase", index.phrases, index.phrase_masks,
+                           string_id),
+        **_postings_arrays("word", index.words, index.word_masks, string_id),
+    }
+
+
+def _postings_arrays(name: str, postings: Dict[str, List[int]],
+                     masks: Dict[str, int],
+                     string_id) -> Dict[str, np.ndarray]:
+    keys = list(postings)
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum([len(postings[key]) for key in keys], out=offsets[1:])
+    return {
+        f"{name}_keys": np.array([string_id(key) for key in keys],
+                                 dtype=np.int32),
+        f"{name}_offsets": offsets,
+        f"{name}_positions": np.fromiter(
+            chain.from_iterable(postings[key] for key in keys),
+            dtype=np.int32, count=int(offsets[-1])),
+        f"{name}_masks": np.array([masks.get(key, 0) for key in keys],
+                                  dtype=np.int64),
+    }
+
+
+def _read_postings(arrays: Dict[str, np.ndarray], name: str,
+                   strings: List[str]) -> Tuple['SavedPostings',
+                                                Dict[str, int]]:
+    keys = [strings[i] for i in arrays[f"{name}_keys"].tolist()]
+    postings = SavedPostings(keys, arrays[f"{name}_offsets"],
+                             arrays[f"{name}_positions"])
+    return postings, dict(zip(keys, arrays[f"{name}_masks"].tolist()))
+
+
+class SavedPostings(Mapping):
+    """Read-only mapping of index key to posting list over the memory-mapped
+    key, offset and position arrays of a snapshot.
+
+    Only the keys are read when the index is restored. A key's positions
+    are sliced from the file on its first lookup and kept, so memory holds
+    only the postings matching has used. Re-slicing on every lookup instead
+    would convert the long postings of common phrases to ints for every
+    description. An index restored from a snapshot is never updated in
+    place, as snapshot catalogues never change.
+    """
+
+    def __init__(self, keys: List[str], offsets: np.ndarray,
+                 positions: np.ndarray):
+        """
+        :param keys: Key of each row of offsets, decoded
+        :param offsets: Start of each key's postings in positions, and the
+            end of the last
+        :param positions: Concatenated posting lists
+        """
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._offsets = offsets.tolist()
+        # A plain view slices faster than the memmap subclass
+        self._positions = positions.view(np.ndarray)
+        self._decoded: Dict[str, List[int]] = {}
+
+    def get(self, key: str, default=None):
+        posting = self._decoded.get(key)
+        if posting is None:
+            row = self._rows.get(key)
+            if row is None:
+                return default
+            offsets = self._offsets
+            posting = self._decoded[key] = self._positions[
+                offsets[row]:offsets[row + 1]].tolist()
+        return posting
+
+    def __getitem__(self, key: str) -> List[int]:
+        posting = self.get(key)
+        if posting is None:
+            raise KeyError(key)
+        return posting
+
+    def __contains__(self, key) -> bool:
+        return key in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+
+class SavedIndex(NamedTuple):
+    """The parts of a VehicleIndex read from a snapshot, for
+    VehicleIndex.from_saved."""
+    # Distinct (phrases, word sets) pairs
+    features: List[Tuple[Tuple[str, ...], Tuple[Tuple[str, ...], ...]]]
+    # Index into features of each vehicle, in catalogue order
+    feature_ids: List[int]
+    phrases: SavedPostings
+    words: SavedPostings
+    always: List[int]
+    phrase_masks: Dict[str, int]
+    word_masks: Dict[str, int]
+    always_mask: int
+    # Listing count of each vehicle, in catalogue order
+    listing_counts: List[int]
+
+
+class SnapshotVehicles(Mapping):
+    """Read-only mapping of vehicle ID to VehicleRow over memory-mapped
+    snapshot arrays, in catalogue order. Strings are decoded once, on first
+    access."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self._arrays = arrays
+        self._strings: List[str] = None
+        self._positions: Dict[str, int] = None
+
+    def _get_strings(self) -> List[str]:
+        if self._strings is None:
+            offsets = self._arrays["string_offsets"].tolist()
+            data = self._arrays["string_data"].tobytes()
+            text = data.decode("utf-8")
+            if len(text) == len(data):
+                # ASCII, so byte offsets are character offsets and slicing
+                # the decoded text spares a decode per string
+                self._strings = [text[start:end] for start, end in
+                                 zip(offsets, offsets[1:])]
+            else:
+                self._strings = [data[start:end].decode("utf-8")
+                                 for start, end in zip(offsets, offsets[1:])]
+        return self._strings
+
+    def _row(self, position: int) -> VehicleRow:
+        strings = self._get_strings()
+        vehicle_id = strings[self._arrays["vehicle_ids"][position]]
+        return VehicleRow(vehicle_id, *(
+            strings[i] for i in self._arrays["columns"][position].tolist()))
+
+    def position(self, vehicle_id: str) -> Optional[int]:
+        """Return the catalogue position of a vehicle, or None."""
+        return self.positions().get(vehicle_id)
+
+    def vehicle_id(self, position: int) -> str:
+        """Return the ID of the vehicle at a catalogue position."""
+        return self._get_strings()[self._arrays["vehicle_ids"][position]]
+
+    def enumerate_vehicles(self) -> Iterator[Tuple[int, VehicleRow]]:
+        """Yield (position, vehicle) for every vehicle, in order."""
+        return enumerate(self.values())
+
+    def positions(self) -> Dict[str, int]:
+        """Return the mapping of vehicle ID to catalogue position."""
+        if self._positions is None:
+            strings = self._get_strings()
+            self._positions = {
+                strings[i]: position for position, i in
+                enumerate(self._arrays["vehicle_ids"].tolist())}
+        return self._positions
+
+    def __len__(self) -> int:
+        return len(self._arrays["vehicle_ids"])
+
+    def __iter__(self) -> Iterator[str]:
+        strings = self._get_strings()
+        return (strings[i] for i in self._arrays["vehicle_ids"].tolist())
+
+    def __getitem__(self, vehicle_id: str) -> VehicleRow:
+        return self._row(self.positions()[vehicle_id])
+
+    def items(self):
+        strings = self._get_strings()
+        for i, columns in zip(self._arrays["vehicle_ids"].tolist(),
+                              self._arrays["columns"].tolist()):
+            vehicle_id = strings[i]
+            yield vehicle_id, VehicleRow(vehicle_id,
+                                         *(strings[j] for j in columns))
+
+    def values(self):
+        return (vehicle for _, vehicle in self.items())
+
+
+class SnapshotListingCounts(Mapping):
+    """Read-only mapping of vehicle ID to listing count over a snapshot."""
+
+    def __init__(self, vehicles: SnapshotVehicles, counts: np.ndarray):
+        self._vehicles = vehicles
+        self._counts = counts
+        # The counts as ints, read once on first access, as the matcher
+        # reads every count when it orders ties
+        self._values: List[int] = None
+
+    def _get_values(self) -> List[int]:
+        if self._values is None:
+            self._values = self._counts.tolist()
+        return self._values
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._vehicles)
+
+    def __getitem__(self, vehicle_id: str) -> int:
+        return self._get_values()[self._vehicles.positions()[vehicle_id]]
+
+    def get(self, vehicle_id: str, default=None):
+        position = self._vehicles.positions().get(vehicle_id)
+        return default if position is None else self._get_values()[position]
+
+
+class SnapshotDatabase:
+    """A read-only stand-in for VehicleDatabase backed by a snapshot file,
+    for matching without a database connection."""
+
+    def __init__(self, path: str, verify: bool = False,
+                 check_source: bool = False):
+        """
+        :param path: Snapshot file written by write_snapshot
+        :param verify: Check the checksum of every array when loading, which
+            reads the whole file; otherwise only the header and the array
+            bounds are checked
+        :param check_source: When DATABASE_URL is set, compare the snapshot
+            with that database on each load and log a warning if it is stale
+        """
+        self.path = path
+        self.verify = verify
+        self.check_source = check_source
+        self.vehicles = {}
+        # Arrays and header of the index saved with the catalogue, if any
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._index_header = None
+        self.listings = []
+        self.listing_counts = {}
+        self.change_watermark = None
+        # services.metrics.Metrics recording the db_load stage
+        self.metrics = None
+
+    def load_data(self, load_listings: bool = False,
+                  release_connection: bool = False):
+        """
+        Memory-map the snapshot. Only the header is parsed; strings are
+        decoded when the catalogue is first read.
+
+        :param load_listings: Unsupported, snapshots only hold the counts
+        :param release_connection: Ignored, there is no connection
+        :raises SnapshotError: If the file is not a readable snapshot of
+            this format or, when verifying, its checksum does not match
+        """
+        if load_listings:
+            raise SnapshotError("Snapshots do not hold listings")
+        start = time.perf_counter()
+
+        with open(self.path, "rb") as f:
+            prefix = f.read(_PREFIX.size)
+            if len(prefix) < _PREFIX.size:
+                raise SnapshotError(f"Truncated snapshot: {self.path}")
+            magic, header_size = _PREFIX.unpack(prefix)
+            if magic != SNAPSHOT_MAGIC:
+                raise SnapshotError(f"Not a snapshot: {self.path}")
+            header = json.loads(f.read(header_size))
+        if header.get("format") != SNAPSHOT_FORMAT:
+            raise SnapshotError(
+                f"Unsupported snapshot format {header.get('format')}: "
+                f"{self.path}")
+        if header["fields"] != list(VehicleRow._fields[1:]):
+            raise SnapshotError(f"Snapshot fields differ: {self.path}")
+
+        size = os.path.getsize(self.path)
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            shape = tuple(spec["shape"])
+            nbytes = int(np.prod(shape)) * dtype.itemsize
+            if nbytes and spec["offset"] + nbytes > size:
+                raise SnapshotError(f"Truncated snapshot: {self.path}")
+            arrays[name] = (np.memmap(self.path, dtype=dtype, mode="r",
+                                      offset=spec["offset"], shape=shape)
+                            if nbytes else np.zeros(shape, dtype=dtype))
+
+        if self.verify:
+            checksum = hashlib.blake2b()
+            for array in arrays.values():
+                checksum.update(array.tobytes())
+            if checksum.hexdigest() != header["checksum"]:
+                raise SnapshotError(f"Snapshot checksum mismatch: {self.path}")
+
+        self.vehicles = SnapshotVehicles(arrays)
+        self.listing_counts = SnapshotListingCounts(self.vehicles,
+                                                    arrays["listing_counts"])
+        self.change_watermark = header["catalogue_version"]
+        self._arrays = arrays
+        self._index_header = header.get("index")
+
+        if self.metrics is not None:
+            self.metrics.observe_stage('db_load', time.perf_counter() - start)
+            self.metrics.set_gauge('vehicles', len(self.vehicles))
+        if self.check_source and os.getenv("DATABASE_URL"):
+            self._check_source()
+
+    def saved_index(self, phrase_fields: Tuple[str, ...],
+                    word_fields: Tuple[str, ...]) -> Optional[SavedIndex]:
+        """
+        Read the matcher's index saved with the catalogue, so the matcher
+        need not build it on first use.
+
+        :param phrase_fields: Phrase fields of the matcher's scoring plan
+        :param word_fields: Word fields of the matcher's scoring plan
+        :return: SavedIndex, or None if the snapshot has no index or one
+            for other fields
+        """
+        saved = self._index_header
+        if (saved is None or saved["phrase_fields"] != list(phrase_fields)
+                or saved["word_fields"] != list(word_fields)):
+            return None
+        arrays = self._arrays
+        strings = self.vehicles._get_strings()
+        # Object arrays gather the strings of whole columns in C
+        string_array = np.empty(len(strings), dtype=object)
+        string_array[:] = strings
+        offsets = arrays["word_set_offsets"].tolist()
+        words = string_array[arrays["word_set_words"]].tolist()
+        word_sets = np.empty(len(offsets) - 1, dtype=object)
+        word_sets[:] = [tuple(words[start:end])
+                        for start, end in zip(offsets, offsets[1:])]
+        distinct = list(zip(
+            map(tuple, string_array[arrays["feature_phrases"]].tolist()),
+            map(tuple, word_sets[arrays["feature_words"]].tolist())))
+        phrases, phrase_masks = _read_postings(arrays, "phrase", strings)
+        words, word_masks = _read_postings(arrays, "word", strings)
+        return SavedIndex(
+            distinct, arrays["feature_ids"].tolist(), phrases, words,
+            arrays["always"].tolist(), phrase_masks, word_masks,
+            saved["always_mask"], arrays["listing_counts"].tolist())
+
+    def _check_source(self):
+        """Warn if the database at DATABASE_URL has changed since the
+        snapshot was written."""
+        source = VehicleDatabase()
+        try:
+            stale = self.is_stale(source)
+        finally:
+            source.close()
+        if stale:
+            logger.warning(
+                "Snapshot %s may be stale: the database has catalogue "
+                "changes after version %s, or they could not be read",
+                self.path, self.change_watermark)
+
+    def is_stale(self, db) -> bool:
+        """
+        Check whether the catalogue changed since the snapshot was written.
+
+        :param db: VehicleDatabase connected to the source database
+        :return: True if the database has changes the snapshot lacks, or
+            either side does not track changes
+        """
+        current = db._get_change_watermark()
+        return (current is None or self.change_watermark is None
+                or current != self.change_watermark)
+
+    def refresh(self):
+        """Snapshots are immutable; reload a newer snapshot instead."""
+        return CatalogueDelta({}, set(), {})
+
+    def fetch_changes(self):
+        """Snapshots are immutable, so there is never anything to fetch."""
+        return CatalogueDelta({}, set(), {})
+
+    def apply_changes(self, delta: CatalogueDelta):
+        """Nothing to apply, as fetch_changes finds no changes."""
+
+    def close(self):
+        """Nothing to release; the arrays are unmapped with the object."""
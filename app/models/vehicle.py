@@ -1,13 +1,19 @@
-from sqlalchemy import Column, String, Integer
+from collections import namedtuple
+from sqlalchemy import Column, String
 from db.connector import Base
 
 class Vehicle(Base):
     __tablename__ = "vehicle"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(String, primary_key=True, index=True)
     make = Column(String, nullable=False)
     model = Column(String, nullable=False)
     badge = Column(String, nullable=False)
     transmission_type = Column(String, nullable=False)
     fuel_type = Column(String, nullable=False)
-    drive_type = Column(String, nullable=False)
\ No newline at end of file
+    drive_type = Column(String, nullable=False)
+
+# Plain row of the vehicle columns, loaded without ORM instances
+VehicleRow = namedtuple("VehicleRow", [
+    "id", "make", "model", "badge", "transmission_type", "fuel_type",
+    "drive_type"])
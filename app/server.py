@@ -0,0 +1,386 @@
+import argparse
+import asyncio
+import json
+import logging
+import signal
+from typing import Dict, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from services.matcher import Matcher
+from services.metrics import LogSink, Metrics, SamplingProfiler
+from services.microbatch import BATCH_SCORING_LIMIT, MicroBatcher
+from services.normaliser import Normaliser
+from services.scoring import ScoringPlan
+from models import VehicleDatabase
+from models.snapshot import SnapshotDatabase
+
+logger = logging.getLogger(__name__)
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 1 << 20
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+def load_matcher(snapshot_path: str = None, abbreviations_path: str = None,
+                 cache_size: int = 10000, max_edit_distance: int = 0,
+                 metrics: Metrics = None, compact: bool = False,
+                 scoring_plan_path: str = None,
+                 verify_snapshot: bool = False) -> Matcher:
+    """
+    Load the catalogue and build a prepared matcher over it.
+
+    :param snapshot_path: Load from this snapshot instead of the database,
+        warning if it is stale when DATABASE_URL is set
+    :param abbreviations_path: JSON abbreviation table for the Normaliser
+    :param cache_size: Entries in each of the matcher's LRU caches
+    :param max_edit_distance: Correct misspelled words up to this many edits
+    :param metrics: Metrics to record the load and matching stages into
+    :param compact: Hold a catalogue loaded from the database in compact
+        dictionary-encoded columns
+    :param scoring_plan_path: JSON scoring plan replacing the default
+    :param verify_snapshot: Checksum the whole snapshot when loading it
+    :return: Matcher with its index built
+    """
+    normaliser = (Normaliser.from_file(abbreviations_path)
+                  if abbreviations_path else Normaliser())
+    db = (SnapshotDatabase(snapshot_path, verify_snapshot, check_source=True)
+          if snapshot_path else VehicleDatabase(compact))
+    plan = (ScoringPlan.from_file(scoring_plan_path) if scoring_plan_path
+            else None)
+    matcher = Matcher(db, normaliser, cache_size, max_edit_distance,
+                      plan=plan)
+    matcher.instrument(metrics)
+    db.load_data(release_connection=True)
+    matcher.prepare()
+    return matcher
+
+
+class MatchServer:
+    """A long-lived HTTP/1.1 matching service on asyncio streams.
+
+    Endpoints (JSON in and out):
+        POST /match        {"description": "..."} -> result
+        POST /match/batch  {"descriptions": [...]} -> {"results": [...]}
+        POST /reload       incremental refresh; ?full=1 reloads everything
+        GET  /health       catalogue size, batching and cache statistics
+        GET  /metrics      Prometheus text exposition, when metrics are on
+
+    Connections are kept alive. Concurrent requests are coalesced into
+    micro-batches by a MicroBatcher.
+    """
+
+    def __init__(self, batcher: MicroBatcher, loader=None,
+                 metrics: Metrics = None):
+        """
+        :param batcher: MicroBatcher over the serving matcher
+        :param loader: Callable returning a freshly loaded, prepared Matcher
+            for full reloads
+        :param metrics: Metrics the matchers record into, served on
+            /metrics
+        """
+        self.batcher = batcher
+        self.loader = loader
+        self.metrics = metrics
+        self._reloading: asyncio.Lock = None
+        self._server: asyncio.AbstractServer = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000):
+        """
+        Start accepting connections.
+
+        :param host: Interface to bind
+        :param port: Port to bind; 0 picks a free one
+        :return: The bound (host, port)
+        """
+        self._reloading = asyncio.Lock()
+        await self.batcher.start()
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        """Stop accepting connections and finish queued matches."""
+        self._server.close()
+        await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def reload(self, full: bool = False) -> Dict:
+        """
+        Reload the catalogue while serving.
+
+        An incremental reload queries the changes on another thread while
+        batches keep being scored, then applies them in memory between two
+        batches. A full reload builds a new matcher on another thread while
+        the current one keeps serving, then swaps it in. Incremental reloads
+        of a database that does not track changes reload fully.
+
+        :param full: Reload the whole catalogue instead of the changes
+        :return: Dictionary describing the reload
+        """
+        loop = asyncio.get_running_loop()
+        async with self._reloading:
+            if not full:
+                matcher = self.batcher.matcher
+                delta = await loop.run_in_executor(
+                    None, matcher.db.fetch_changes)
+                if delta is not None:
+                    await self.batcher.run_exclusive(matcher.refresh, delta)
+                    return {'full': False, 'updated': len(delta.vehicles),
+                            'removed': len(delta.removed)}
+            if self.loader is None:
+                raise ValueError("Full reloads need a loader")
+            matcher = await loop.run_in_executor(None, self.loader)
+            previous = self.batcher.swap(matcher)
+            await self.batcher.run_exclusive(previous.db.close)
+            return {'full': True, 'vehicles': len(matcher.db.vehicles)}
+
+    def health(self) -> Dict:
+        matcher = self.batcher.matcher
+        return {
+            'status': 'ok',
+            'vehicles': len(matcher.db.vehicles),
+            'batching': self.batcher.stats(),
+            'cache': matcher.cache_stats()
+        }
+
+    def metrics_text(self) -> str:
+        """
+        Render the metrics, with the batching and cache statistics as
+        gauges.
+        """
+        metrics = self.metrics
+        for name, value in self.batcher.stats().items():
+            metrics.set_gauge(f'batching_{name}', value)
+        for cache, stats in self.batcher.matcher.cache_stats().items():
+            for name in ('size', 'hits', 'misses', 'evictions'):
+                metrics.set_gauge(f'{cache}_cache_{name}', stats[name])
+        return metrics.prometheus_text()
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                keep_alive = await self._respond(request_line, reader,
+                                                 writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, request_line: bytes,
+                       reader: asyncio.StreamReader,
+                       writer: asyncio.StreamWriter) -> bool:
+        """
+        Read the rest of one request and write its response.
+
+        :return: Whether the connection stays open
+        """
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            self._write(writer, 400, {'error': "Malformed request line"},
+                        False)
+            return False
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = (version == "HTTP/1.1"
+                      and headers.get("connection", "").lower() != "close")
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BODY_SIZE:
+            self._write(writer, 413 if length > 0 else 400,
+                        {'error': "Invalid or oversized body"}, False)
+            return False
+        body = await reader.readexactly(length) if length else b""
+
+        status, payload = await self._dispatch(method, target, body)
+        self._write(writer, status, payload, keep_alive)
+        return keep_alive
+
+    async def _dispatch(self, method: str, target: str,
+                        body: bytes) -> Tuple[int, Union[Dict, str]]:
+        """
+        Route a request.
+
+        :return: tuple: (status code, JSON payload or plain text)
+        """
+        url = urlsplit(target)
+        routes = {
+            "/match": ("POST", self._match),
+            "/match/batch": ("POST", self._match_batch),
+            "/reload": ("POST", self._reload),
+            "/health": ("GET", self._health),
+        }
+        if self.metrics is not None:
+            routes["/metrics"] = ("GET", self._metrics)
+        if url.path not in routes:
+            return 404, {'error': f"No route {url.path}"}
+        expected, handler = routes[url.path]
+        if method != expected:
+            return 405, {'error': f"Use {expected} for {url.path}"}
+
+        try:
+            request = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {'error': "Body is not valid JSON"}
+        if not isinstance(request, dict):
+            return 400, {'error': "Body must be a JSON object"}
+        try:
+            return 200, await handler(request, parse_qs(url.query))
+        except ValueError as error:
+            return 400, {'error': str(error)}
+        except Exception:
+            logger.exception("Failed to handle %s %s", method, target)
+            return 500, {'error': "Internal server error"}
+
+    async def _match(self, request: Dict, query: Dict) -> Dict:
+        description = request.get("description")
+        if not isinstance(description, str):
+            raise ValueError('"description" must be a string')
+        return await self.batcher.match(description)
+
+    async def _match_batch(self, request: Dict, query: Dict) -> Dict:
+        descriptions = request.get("descriptions")
+        if (not isinstance(descriptions, list)
+                or not all(isinstance(d, str) for d in descriptions)):
+            raise ValueError('"descriptions" must be a list of strings')
+        return {'results': await self.batcher.match_many(descriptions)}
+
+    async def _reload(self, request: Dict, query: Dict) -> Dict:
+        full = query.get("full", ["0"])[-1].lower() in ("1", "true", "yes")
+        return await self.reload(full)
+
+    async def _health(self, request: Dict, query: Dict) -> Dict:
+        return self.health()
+
+    async def _metrics(self, request: Dict, query: Dict) -> str:
+        return self.metrics_text()
+
+    @staticmethod
+    def _write(writer: asyncio.StreamWriter, status: int,
+               payload: Union[Dict, str], keep_alive: bool):
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload).encode("utf-8")
+            content_type = "application/json"
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n".encode("latin-1") + body)
+
+
+async def serve(args: argparse.Namespace):
+    """Run the service until SIGINT or SIGTERM; SIGHUP reloads fully."""
+    metrics = (Metrics([LogSink(logger)])
+               if args.metrics or args.metrics_interval else None)
+
+    def loader():
+        return load_matcher(args.snapshot, args.abbreviations,
+                            args.cache_size, args.fuzzy, metrics,
+                            args.compact, args.scoring_plan,
+                            args.verify_snapshot)
+
+    loop = asyncio.get_running_loop()
+    matcher = await loop.run_in_executor(None, loader)
+    server = MatchServer(
+        MicroBatcher(matcher, args.max_batch_size, args.max_wait_ms / 1000,
+                     args.batch_scoring_limit),
+        loader, metrics)
+    host, port = await server.start(args.host, args.port)
+    logger.info("Serving %d vehicles on http://%s:%d",
+                len(matcher.db.vehicles), host, port)
+
+    async def reload():
+        try:
+            logger.info("Reloaded: %s", await server.reload(full=True))
+        except Exception:
+            logger.exception("Reload failed, still serving the old catalogue")
+
+    stopping = asyncio.Event()
+    loop.add_signal_handler(signal.SIGINT, stopping.set)
+    loop.add_signal_handler(signal.SIGTERM, stopping.set)
+    loop.add_signal_handler(signal.SIGHUP, lambda: loop.create_task(reload()))
+
+    async def dump_metrics():
+        while True:
+            await asyncio.sleep(args.metrics_interval)
+            metrics.export()
+
+    dumping = (loop.create_task(dump_metrics())
+               if args.metrics_interval else None)
+    profiler = SamplingProfiler() if args.profile else None
+    if profiler:
+        profiler.start()
+    try:
+        await stopping.wait()
+        await server.stop()
+    finally:
+        if dumping:
+            dumping.cancel()
+        if profiler:
+            profiler.stop()
+            profiler.write(args.profile)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve vehicle matching")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="interface to bind")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="port to bind")
+    parser.add_argument("--max-batch-size", type=int, default=64,
+                        help="most descriptions scored together")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0,
+                        help="time to hold a batch open for more requests")
+    parser.add_argument("--batch-scoring-limit", type=int,
+                        default=BATCH_SCORING_LIMIT,
+                        metavar="VEHICLES",
+                        help="largest catalogue scored with the vectorised "
+                             "batch scorer; larger ones are scored per "
+                             "description")
+    parser.add_argument("--snapshot",
+                        help="load the catalogue from a snapshot file")
+    parser.add_argument("--verify-snapshot", action="store_true",
+                        help="checksum the whole snapshot when loading it")
+    parser.add_argument("--abbreviations",
+                        help="JSON file mapping abbreviations to expansions")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="entries in each LRU cache, 0 to disable")
+    parser.add_argument("--fuzzy", type=int, default=0, metavar="EDITS",
+                        help="correct misspellings up to EDITS edits (1-2)")
+    parser.add_argument("--scoring-plan", metavar="PATH",
+                        help="JSON file of scored fields, weights and match "
+                             "modes")
+    parser.add_argument("--compact", action="store_true",
+                        help="hold the catalogue in compact columns")
+    parser.add_argument("--metrics", action="store_true",
+                        help="record per-stage metrics, served on /metrics")
+    parser.add_argument("--metrics-interval", type=float, default=0,
+                        metavar="SECONDS",
+                        help="also log the metrics every SECONDS")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="sample stacks until shutdown and write them "
+                             "here in collapsed (flame graph) format")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(parser.parse_args()))
@@ -0,0 +1,215 @@
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from services.index import VehicleIndex
+
+
+class BatchScorer:
+    """Scores whole batches of descriptions against the catalogue at once.
+
+    Vehicles and descriptions are encoded as sparse token-incidence matrices
+    over the index vocabulary. A batch's weighted field scores are then a
+    handful of sparse products, and the best match, tie flag and confidence
+    of every row are reduced on arrays with the same rules as
+    Matcher._top_candidates and Matcher._calculate_confidence.
+    """
+
+    def __init__(self, index: VehicleIndex, phrase_weights: Sequence[int],
+                 word_weights: Sequence[int], listing_counts: Dict,
+                 max_score: int, expander=None):
+        """
+        Encode the catalogue.
+
+        :param index: VehicleIndex over the loaded catalogue
+        :param phrase_weights: Weight of each phrase field of the feature table
+        :param word_weights: Weight of each word field of the feature table
+        :param listing_counts: Mapping of vehicle ID to listing count
+        :param max_score: Sum of all field weights
+        :param expander: services.scoring.WordExpander resolving the words
+            each word field matches; None matches the description's words
+        """
+        self.index = index
+        self.max_score = max_score
+        self.expander = expander
+        # Snapshot, as a concurrent refresh may append vehicles; the phrase
+        # and word ids are taken from the snapshot rather than the index
+        records = list(index.table.records)
+        size = len(records)
+        self.phrase_ids: Dict[str, int] = {}
+        self.word_ids: Dict[str, int] = {}
+
+        # Weighted phrase incidence (phrases x vehicles); a vehicle whose
+        # fields share a value is credited with each field's weight
+        rows, cols, data = [], [], []
+        always = np.zeros(size, dtype=np.int64)
+        phrase_ids = self.phrase_ids
+        for position, features in enumerate(records):
+            if features is None:
+                continue
+            for value, weight in zip(features.phrases, phrase_weights):
+                if value:
+                    rows.append(phrase_ids.setdefault(value, len(phrase_ids)))
+                    cols.append(position)
+                    data.append(weight)
+                else:
+                    always[position] += weight
+        self.phrase_matrix = sparse.csr_matrix(
+            (np.array(data, dtype=np.int64), (rows, cols)),
+            shape=(len(phrase_ids), size))
+        self.always = sparse.csr_matrix(always) if always.any() else None
+
+        # Binary word incidence (words x vehicles), one matrix per word field
+        # because a field scores its weight once however many words match
+        word_ids = self.word_ids
+        incidence = []
+        for field in range(len(word_weights)):
+            rows, cols = [], []
+            for position, features in enumerate(records):
+                if features is None:
+                    continue
+                for word in features.words[field]:
+                    rows.append(word_ids.setdefault(word, len(word_ids)))
+                    cols.append(position)
+            incidence.append((rows, cols))
+        self.word_matrices: List[Tuple[int, sparse.csr_matrix]] = [
+            (weight, sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.int64), (rows, cols)),
+                shape=(len(word_ids), size)))
+            for weight, (rows, cols) in zip(word_weights, incidence)]
+
+        table = index.table
+        self.vehicle_ids = [table.vehicle_id(position) if features else None
+                            for position, features in enumerate(records)]
+        self.listing_counts = np.array(
+            [listing_counts.get(vehicle_id, 0) if vehicle_id is not None else 0
+             for vehicle_id in self.vehicle_ids],
+            dtype=np.int64)
+
+    def encode(self, descriptions: Sequence[str]) -> Tuple[
+            sparse.csr_matrix, List[sparse.csr_matrix]]:
+        """
+        Encode normalised descriptions as phrase and word incidence matrices.
+
+        :param descriptions: Normalised description strings
+        :return: tuple: (descriptions x phrases, descriptions x words per
+            word field); fields matching the description's own words share
+            one matrix
+        """
+        fields = len(self.word_matrices)
+        expander = self.expander
+        expands = expander is not None and expander.expands
+        # Prefix and fuzzy fields get their own matrix, the rest share one
+        # of the description's own words, kept last
+        own = [not expands or mode == "word"
+               for mode in (expander.plan.word_modes if expands
+                            else [None] * fields)]
+        phrase_rows, phrase_cols = [], []
+        word_rows = [[] for _ in range(fields + 1)]
+        word_cols = [[] for _ in range(fields + 1)]
+        for row, description in enumerate(descriptions):
+            description = description.lower()
+            for phrase in self.index.phrases_in(description):
+                phrase_id = self.phrase_ids.get(phrase)
+                if phrase_id is not None:
+                    phrase_rows.append(row)
+                    phrase_cols.append(phrase_id)
+            description_words = set(description.split())
+            field_words = (expander.expand(description_words) if expands
+                           else ())
+            for field in range(fields + 1):
+                if field < fields and own[field]:
+                    continue
+                words = (description_words if field == fields
+                         else field_words[field])
+                for word in words:
+                    word_id = self.word_ids.get(word)
+                    if word_id is not None:
+                        word_rows[field].append(row)
+                        word_cols[field].append(word_id)
+
+        shape = len(descriptions)
+        phrases = sparse.csr_matrix(
+            (np.ones(len(phrase_rows), dtype=np.int64),
+             (phrase_rows, phrase_cols)), shape=(shape, len(self.phrase_ids)))
+        matrices = [
+            sparse.csr_matrix((np.ones(len(rows), dtype=np.int64),
+                               (rows, cols)),
+                              shape=(shape, len(self.word_ids)))
+            if field == fields or not own[field] else None
+            for field, (rows, cols) in enumerate(zip(word_rows, word_cols))]
+        words = matrices.pop()
+        return phrases, [words if matrix is None else matrix
+                         for matrix in matrices]
+
+    def scores(self, descriptions: Sequence[str]) -> sparse.coo_matrix:
+        """
+        Compute the score of every vehicle for every description.
+
+        :param descriptions: Normalised description strings
+        :return: Sparse (descriptions x vehicles) matrix of scores
+        """
+        phrases, field_words = self.encode(descriptions)
+        scores = phrases @ self.phrase_matrix
+        for (weight, matrix), words in zip(self.word_matrices, field_words):
+            matched = (words @ matrix) > 0
+            scores = scores + matched.astype(np.int64) * weight
+        if self.always is not None:
+            ones = sparse.csr_matrix(np.ones((len(descriptions), 1),
+                                             dtype=np.int64))
+            scores = scores + ones @ self.always
+        return scores.tocoo()
+
+    def best_matches(self, descriptions: Sequence[str]) -> Tuple[np.ndarray,
+                                                                  np.ndarray,
+                                                                  np.ndarray]:
+        """
+        Resolve the best match of every description.
+
+        Candidates are ordered by score, then listing count, then catalogue
+        position, so the first candidate of each row is the one the
+        per-description path picks.
+
+        :param descriptions: Normalised description strings
+        :return: tuple: (positions, scores, has_tie) per description, where
+            position is -1 for descriptions without any match
+        """
+        count = len(descriptions)
+        scores = self.scores(descriptions)
+        keep = scores.data > 0
+        rows = scores.row[keep]
+        cols = scores.col[keep]
+        data = scores.data[keep]
+
+        order = np.lexsort((cols, -self.listing_counts[cols], -data, rows))
+        rows, cols, data = rows[order], cols[order], data[order]
+
+        positions = np.full(count, -1, dtype=np.int64)
+        best_scores = np.zeros(count, dtype=np.int64)
+        has_tie = np.zeros(count, dtype=bool)
+        if len(rows):
+            matched, first = np.unique(rows, return_index=True)
+            positions[matched] = cols[first]
+            best_scores[matched] = data[first]
+            at_best = data == best_scores[rows]
+            has_tie = np.bincount(rows[at_best], minlength=count) > 1
+        return positions, best_scores, has_tie
+
+    def confidences(self, best_scores: np.ndarray,
+                    has_tie: np.ndarray) -> np.ndarray:
+        """
+        Convert best scores to confidences, less one point for ties.
+
+        :param best_scores: Best score per description
+        :param has_tie: Whether each best score was shared
+        :return: Confidence per description
+        """
+        if self.max_score <= 0:
+            confidence = np.zeros(len(best_scores), dtype=np.int64)
+        else:
+            # Same float64 operations and half-to-even rounding as round()
+            confidence = np.minimum(
+                10, np.round((best_scores / self.max_score) * 10)
+            ).astype(np.int64)
+        return confidence - has_tie
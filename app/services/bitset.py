@@ -0,0 +1,211 @@
+from typing import Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from services.index import VehicleIndex
+
+# A value gets a precomputed bitset once it occurs in at least 1/64th of
+# the catalogue, where the bitset is no larger than 8 bytes per vehicle
+_DENSE_FRACTION = 64
+
+
+class FieldBitsets:
+    """The vehicles holding each value of one field, as bitsets over ranks.
+
+    Frequent values keep a precomputed int bitset. Rare values keep a sorted
+    array of ranks and are packed into bits only when a description
+    mentions them, so memory stays proportional to the catalogue's postings
+    rather than to its values times its size.
+    """
+
+    def __init__(self, ranks: Dict[str, List[int]], size: int):
+        """
+        :param ranks: Mapping of value to the ranks of the vehicles holding it
+        :param size: Number of ranks
+        """
+        self.size = size
+        self.dense: Dict[str, int] = {}
+        self.sparse: Dict[str, np.ndarray] = {}
+        threshold = max(1, size // _DENSE_FRACTION)
+        for value, value_ranks in ranks.items():
+            value_ranks = np.array(value_ranks, dtype=np.int64)
+            if len(value_ranks) >= threshold:
+                self.dense[value] = _pack(value_ranks, size)
+            else:
+                self.sparse[value] = value_ranks
+
+    def union(self, values) -> int:
+        """
+        Bitset of the vehicles holding any of the values.
+
+        :param values: Iterable of values, unknown ones ignored
+        :return: int with bit r set for each matching rank r
+        """
+        bits = 0
+        rare = []
+        dense = self.dense
+        sparse = self.sparse
+        for value in values:
+            value_bits = dense.get(value)
+            if value_bits is not None:
+                bits |= value_bits
+            else:
+                value_ranks = sparse.get(value)
+                if value_ranks is not None:
+                    rare.append(value_ranks)
+        if rare:
+            bits |= _pack(np.concatenate(rare), self.size)
+        return bits
+
+
+def _pack(ranks: np.ndarray, size: int) -> int:
+    """Pack ranks into an int bitset, bit r for rank r."""
+    # Each bit within a byte is counted at most once, so the weighted
+    # bincount is the byte's bitwise OR
+    packed = np.bincount(ranks >> 3, weights=1 << (ranks & 7),
+                         minlength=(size + 7) // 8).astype(np.uint8)
+    return int.from_bytes(packed.tobytes(), 'little')
+
+
+class BitsetScorer:
+    """Scores descriptions with per-field bitsets of the catalogue.
+
+    Vehicles are numbered by rank in tie-break order: most listings first,
+    then catalogue order. Each field maps its values to the bitset of the
+    vehicles holding them. A description's matches in a field are the union
+    of the bitsets of the values it contains: phrase values it contains as
+    substrings, and the words a word field matches (its own words, or their
+    prefix and fuzzy expansions). The weighted sum of the fields is
+    accumulated into binary digit planes with a bit-sliced adder, so the
+    best vehicles of a score are its lowest set bits. The work per
+    description is a few int operations per matched value and per score
+    level, each over the catalogue's bits rather than a Python loop over its
+    vehicles.
+    """
+
+    def __init__(self, index: VehicleIndex, phrase_weights: Sequence[int],
+                 word_weights: Sequence[int], position_counts: List[int]):
+        """
+        Build the bitsets.
+
+        :param index: VehicleIndex over the loaded catalogue
+        :param phrase_weights: Weight of each phrase field of the feature table
+        :param word_weights: Weight of each word field of the feature table
+        :param position_counts: Listing count of each catalogue position
+        """
+        self.index = index
+        self.position_counts = position_counts
+        self.phrase_weights = tuple(phrase_weights)
+        self.word_weights = tuple(word_weights)
+        records = index.table.records
+        # Vehicles appended by a concurrent refresh are left to the rebuild
+        # that follows it
+        size = min(len(records), len(position_counts))
+
+        # Stable, so equal listing counts stay in catalogue order
+        self.positions = [position for position in sorted(
+            range(size), key=position_counts.__getitem__, reverse=True)
+            if records[position] is not None]
+        size = len(self.positions)
+
+        phrase_ranks = [{} for _ in self.phrase_weights]
+        word_ranks = [{} for _ in self.word_weights]
+        # An empty phrase is a substring of every description
+        always = [[] for _ in self.phrase_weights]
+        for rank, position in enumerate(self.positions):
+            features = records[position]
+            for field, value in enumerate(features.phrases):
+                if value:
+                    phrase_ranks[field].setdefault(value, []).append(rank)
+                else:
+                    always[field].append(rank)
+            for field, words in enumerate(features.words):
+                for word in words:
+                    word_ranks[field].setdefault(word, []).append(rank)
+
+        self.phrase_bitsets = [FieldBitsets(ranks, size)
+                               for ranks in phrase_ranks]
+        self.word_bitsets = [FieldBitsets(ranks, size) for ranks in word_ranks]
+        self.always = [_pack(np.array(ranks, dtype=np.int64), size)
+                       for ranks in always]
+
+    def field_matches(self, description: str,
+                      field_words: Tuple[Set[str], ...]
+                      ) -> List[Tuple[int, int]]:
+        """
+        Find the vehicles matching each field of a description.
+
+        :param description: Lowercased description string
+        :param field_words: Description words matched by each word field
+        :return: List of (weight, bitset) per field with any match
+        """
+        phrases = self.index.phrases_in(description)
+        matches = []
+        for bitsets, always, weight in zip(self.phrase_bitsets, self.always,
+                                           self.phrase_weights):
+            bits = bitsets.union(phrases) | always
+            if bits:
+                matches.append((weight, bits))
+        for bitsets, words, weight in zip(self.word_bitsets, field_words,
+                                          self.word_weights):
+            bits = bitsets.union(words)
+            if bits:
+                matches.append((weight, bits))
+        return matches
+
+    def top(self, description: str, field_words: Tuple[Set[str], ...],
+            k: int) -> List[Tuple[int, int]]:
+        """
+        Find the K best scoring vehicles, in the order of
+        Matcher._top_candidates.
+
+        :param description: Lowercased description string
+        :param field_words: Description words matched by each word field
+        :param k: Number of candidates to return
+        :return: List of (score, position) tuples, best first
+        """
+        matches = self.field_matches(description, field_words)
+        if not matches:
+            return []
+
+        # Binary digits of every vehicle's score, least significant first
+        planes: List[int] = []
+        matched = 0
+        for weight, bits in matches:
+            matched |= bits
+            digit = 0
+            while weight:
+                if weight & 1:
+                    _add(planes, bits, digit)
+                weight >>= 1
+                digit += 1
+
+        top = []
+        positions = self.positions
+        for score in range(sum(weight for weight, _ in matches), 0, -1):
+            if score >> len(planes):
+                continue
+            level = matched
+            for digit, plane in enumerate(planes):
+                level &= plane if score >> digit & 1 else ~plane
+                if not level:
+                    break
+            # Lowest ranks first, i.e. in tie-break order
+            while level:
+                low = level & -level
+                top.append((score, positions[low.bit_length() - 1]))
+                if len(top) == k:
+                    return top
+                level ^= low
+        return top
+
+
+def _add(planes: List[int], bits: int, digit: int):
+    """Add one at a binary digit of every vehicle in bits, rippling the
+    carry through the digit planes."""
+    carry = bits
+    while carry:
+        while digit >= len(planes):
+            planes.append(0)
+        planes[digit], carry = planes[digit] ^ carry, planes[digit] & carry
+        digit += 1
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from typing import Dict, Hashable
+
+
+class LRUCache:
+    """A size-bounded least-recently-used cache with hit, miss and eviction
+    counters."""
+
+    def __init__(self, maxsize: int):
+        """
+        :param maxsize: Maximum number of entries; 0 disables the cache
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable):
+        """
+        Return the cached value and mark it most recently used.
+
+        :param key: Cache key
+        :return: Cached value, or None on a miss
+        """
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            # Cleared by a catalogue refresh on another thread
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value):
+        """
+        Cache a value, evicting the least recently used entry when full.
+
+        :param key: Cache key
+        :param value: Value to cache (must not be None)
+        """
+        if self.maxsize <= 0:
+            return
+        entries = self._entries
+        try:
+            entries[key] = value
+            entries.move_to_end(key)
+            if len(entries) > self.maxsize:
+                entries.popitem(last=False)
+                self.evictions += 1
+        except KeyError:
+            # Cleared by a catalogue refresh on another thread
+            pass
+
+    def discard(self, key: Hashable):
+        """Drop an entry if it is cached."""
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry, keeping the counters."""
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        """
+        :return: Dictionary of size, maxsize, hits, misses, evictions and
+            hit_rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,152 @@
+import multiprocessing.pool
+import time
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from services.matcher import Matcher
+from services.parallel import ParallelMatcher
+
+
+class DedupeStats:
+    """Counts of a deduplicated run and the matching time it avoided."""
+
+    def __init__(self):
+        # Descriptions read and distinct normalised descriptions matched
+        self.descriptions = 0
+        self.unique = 0
+        # Seconds spent matching the unique descriptions
+        self.match_seconds = 0.0
+
+    @property
+    def ratio(self) -> float:
+        """Descriptions per unique description matched."""
+        return self.descriptions / self.unique if self.unique else 0.0
+
+    @property
+    def seconds_saved(self) -> float:
+        """Estimated matching time of the duplicates, at the mean time per
+        unique description."""
+        if not self.unique:
+            return 0.0
+        return (self.descriptions - self.unique) * (
+            self.match_seconds / self.unique)
+
+    def summary(self) -> str:
+        return (f"Deduplicated {self.descriptions} descriptions to "
+                f"{self.unique} unique ({self.ratio:.1f}x), matched in "
+                f"{self.match_seconds:.2f}s, saving an estimated "
+                f"{self.seconds_saved:.2f}s")
+
+
+class DeduplicatingMatcher:
+    """Matches each distinct normalised description of a window once.
+
+    Descriptions are read a window at a time and grouped by their normalised
+    form. Each normalised form is matched once, on this process or across a
+    pool of worker processes forked once per run, and its result is fanned
+    back out to every member in input order. Unlike the matcher's LRU
+    cache, reuse within a window is exact whatever the skew of the input,
+    and memory is bounded by the window rather than by the number of
+    distinct descriptions.
+    """
+
+    def __init__(self, matcher: Matcher, window: int = 100000,
+                 workers: int = 1, chunk_size: int = 1000):
+        """
+        :param matcher: Matcher over a loaded VehicleDatabase
+        :param window: Descriptions grouped at a time
+        :param workers: Number of matching processes for the unique
+            descriptions; above 1 they are sharded by ParallelMatcher
+        :param chunk_size: Number of descriptions sent to a worker per task
+        """
+        if window < 1:
+            raise ValueError("window must be positive")
+        self.matcher = matcher
+        self.window = window
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.stats = DedupeStats()
+
+    def match_descriptions(self, descriptions: Iterable[str]) -> Iterator[Dict]:
+        """
+        Match vehicle descriptions, yielding results in input order once
+        their window is matched.
+
+        :param descriptions: Iterable of vehicle description strings
+        :return: Iterator of result dictionaries as from
+            Matcher.match_descriptions
+        """
+        self.matcher.prepare()
+        descriptions = iter(descriptions)
+        if self.workers <= 1:
+            yield from self._match_windows(descriptions, None, None)
+            return
+        # One pool for the whole run, forked after the index is built
+        parallel = ParallelMatcher(self.matcher, self.workers, self.chunk_size)
+        with parallel.pool() as pool:
+            yield from self._match_windows(descriptions, parallel, pool)
+
+    def _match_windows(self, descriptions: Iterator[str],
+                       parallel: Optional[ParallelMatcher],
+                       pool: Optional[multiprocessing.pool.Pool]
+                       ) -> Iterator[Dict]:
+        while True:
+            window = list(islice(descriptions, self.window))
+            if not window:
+                return
+            yield from self._match_window(window, parallel, pool)
+
+    def _match_window(self, window: List[str],
+                      parallel: Optional[ParallelMatcher],
+                      pool: Optional[multiprocessing.pool.Pool]
+                      ) -> Iterator[Dict]:
+        matcher = self.matcher
+        metrics = matcher.metrics
+        start = time.perf_counter()
+
+        # Group of each description, numbered by first occurrence; equal
+        # raw descriptions are normalised once
+        normalised: Dict[str, str] = {}
+        groups: Dict[str, int] = {}
+        keys = []
+        members = []
+        for description in window:
+            key = normalised.get(description)
+            if key is None:
+                key = normalised[description] = matcher.normalise(description)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = len(keys)
+                keys.append(key)
+            members.append(group)
+
+        grouped = time.perf_counter()
+        # The keys are distinct and already normalised, so they skip the
+        # matcher's caches
+        if parallel is not None:
+            matches = list(parallel.match_normalised(pool, keys))
+        else:
+            matcher._get_index()
+            matches = [matcher._match_normalised(key) for key in keys]
+        matched = time.perf_counter()
+
+        stats = self.stats
+        stats.descriptions += len(window)
+        stats.unique += len(keys)
+        stats.match_seconds += matched - grouped
+        if metrics is not None:
+            # Per line, as Matcher counts them; the unique keys count as
+            # descriptions_scored, which workers cannot record here
+            metrics.observe_stage('dedupe', grouped - start)
+            metrics.increment('descriptions', len(window))
+            metrics.increment('no_match', sum(
+                1 for group in members if matches[group]['vehicle_id'] is None))
+            if parallel is not None:
+                metrics.increment('descriptions_scored', len(keys))
+            metrics.increment('descriptions_deduplicated',
+                              len(window) - len(keys))
+
+        for description, group in zip(window, members):
+            result = {'input': description}
+            result.update(matches[group])
+            yield result
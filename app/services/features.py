@@ -0,0 +1,203 @@
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class VehicleFeatures:
+    """The scored field values of a vehicle, lowered and interned once.
+
+    Phrase fields are matched as substrings of a description and word fields
+    on whole words, so word fields are stored pre-split into sorted tuples of
+    distinct words, tested against the set of description words; a tuple
+    takes a fraction of the memory of a small set. Vehicles with the same
+    values may share one instance, so it holds no vehicle ID.
+    """
+    __slots__ = ('phrases', 'words')
+
+    def __init__(self, phrases: Tuple[str, ...],
+                 words: Tuple[Tuple[str, ...], ...]):
+        self.phrases = phrases
+        self.words = words
+
+    @classmethod
+    def from_vehicle(cls, vehicle, phrase_fields: Iterable[str],
+                     word_fields: Iterable[str]) -> 'VehicleFeatures':
+        """
+        Extract the features of a vehicle.
+
+        :param vehicle: Vehicle instance (or any object with the fields)
+        :param phrase_fields: Fields matched as substrings of the description
+        :param word_fields: Fields matched on whole words of the description
+        :return: VehicleFeatures for the vehicle
+        """
+        intern = sys.intern
+        return cls(
+            tuple(intern(getattr(vehicle, field, '').lower())
+                  for field in phrase_fields),
+            tuple(tuple(sorted({intern(word) for word in
+                                getattr(vehicle, field, '').lower().split()}))
+                  for field in word_fields))
+
+
+class FeatureTable:
+    """The features of every vehicle in the catalogue, by catalogue position.
+
+    Vehicles with equal features share one VehicleFeatures, and equal
+    phrase and word tuples are shared between the rest, as in a snapshot. Removed vehicles leave a None tombstone so that the positions
+    of the remaining vehicles, and therefore their order, stay stable.
+
+    A catalogue that stores vehicles by position, such as CompactVehicles,
+    also serves the table's vehicle IDs and positions: the table follows
+    its positions, holes included, and keeps no mapping of its own. Any
+    other mapping gets a list of IDs and a dict of positions.
+    """
+
+    def __init__(self, vehicles: Dict, phrase_fields: Iterable[str],
+                 word_fields: Iterable[str]):
+        """
+        Build the table from the loaded catalogue.
+
+        :param vehicles: Mapping of vehicle ID to vehicle, in catalogue order
+        :param phrase_fields: Fields matched as substrings of the description
+        :param word_fields: Fields matched on whole words of the description
+        """
+        self.phrase_fields = tuple(phrase_fields)
+        self.word_fields = tuple(word_fields)
+        self._use_catalogue(vehicles)
+        if self._catalogue is None:
+            vehicles = enumerate(vehicles.values())
+        else:
+            vehicles = vehicles.enumerate_vehicles()
+        shared = {}
+        self.records: List[Optional[VehicleFeatures]] = []
+        for position, vehicle in vehicles:
+            features = VehicleFeatures.from_vehicle(
+                vehicle, self.phrase_fields, self.word_fields)
+            self._place(position, self._share(shared, features))
+
+    @classmethod
+    def from_records(cls, records: List[VehicleFeatures], vehicles,
+                     phrase_fields: Iterable[str],
+                     word_fields: Iterable[str]) -> 'FeatureTable':
+        """
+        Build the table from features extracted earlier, e.g. read from a
+        snapshot, without reading the vehicles again.
+
+        :param records: Features of every vehicle, by catalogue position
+        :param vehicles: Catalogue the records were extracted from
+        :param phrase_fields: Fields the phrases were extracted from
+        :param word_fields: Fields the words were extracted from
+        :return: FeatureTable holding the records
+        """
+        table = cls.__new__(cls)
+        table.phrase_fields = tuple(phrase_fields)
+        table.word_fields = tuple(word_fields)
+        table._use_catalogue(vehicles)
+        table.records = records
+        return table
+
+    def _use_catalogue(self, vehicles):
+        # Catalogues that expose their positions are shared, not copied
+        if hasattr(vehicles, 'enumerate_vehicles'):
+            self._catalogue = vehicles
+            self._ids = self._positions = None
+        else:
+            self._catalogue = None
+            self._ids: List = list(vehicles)
+            self._positions: Dict = {vehicle_id: position for position,
+                                     vehicle_id in enumerate(self._ids)}
+
+    @staticmethod
+    def _share(shared: Dict, features: VehicleFeatures) -> VehicleFeatures:
+        """Return an equal VehicleFeatures seen before, or this one with its
+        phrase and word tuples replaced by equal ones seen before."""
+        key = (features.phrases, features.words)
+        existing = shared.get(key)
+        if existing is not None:
+            return existing
+        features.phrases = shared.setdefault(features.phrases,
+                                             features.phrases)
+        features.words = shared.setdefault(features.words, tuple(
+            shared.setdefault(words, words) for words in features.words))
+        shared[key] = features
+        return features
+
+    def _place(self, position: int, features: VehicleFeatures):
+        records = self.records
+        if position < len(records):
+            records[position] = features
+            return
+        # Positions of vehicles removed before the table was built
+        records.extend([None] * (position - len(records)))
+        records.append(features)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, position: int) -> Optional[VehicleFeatures]:
+        return self.records[position]
+
+    def vehicle_id(self, position: int):
+        """
+        :param position: Position of a vehicle in the table
+        :return: ID of the vehicle
+        """
+        if self._catalogue is None:
+            return self._ids[position]
+        return self._catalogue.vehicle_id(position)
+
+    def position(self, vehicle_id) -> Optional[int]:
+        """
+        :param vehicle_id: ID of a vehicle
+        :return: Position of the vehicle, or None if the table does not
+            hold it
+        """
+        if self._catalogue is None:
+            return self._positions.get(vehicle_id)
+        position = self._catalogue.position(vehicle_id)
+        if (position is None or position >= len(self.records)
+                or self.records[position] is None):
+            return None
+        return position
+
+    def upsert(self, vehicle_id, vehicle) -> Tuple[int, Optional[VehicleFeatures],
+                                                    VehicleFeatures]:
+        """
+        Replace the features of a vehicle in place, or append a new vehicle.
+        A catalogue serving the positions must already hold the vehicle.
+
+        :param vehicle_id: ID of the vehicle
+        :param vehicle: Vehicle instance
+        :return: tuple: (position, old features or None, new features)
+        """
+        features = VehicleFeatures.from_vehicle(
+            vehicle, self.phrase_fields, self.word_fields)
+        position = self.position(vehicle_id)
+        if position is None:
+            if self._catalogue is None:
+                position = len(self.records)
+                self._ids.append(vehicle_id)
+                self._positions[vehicle_id] = position
+            else:
+                position = self._catalogue.position(vehicle_id)
+            self._place(position, features)
+            return position, None, features
+        old = self.records[position]
+        self.records[position] = features
+        return position, old, features
+
+    def remove(self, vehicle_id) -> Tuple[Optional[int],
+                                          Optional[VehicleFeatures]]:
+        """
+        Remove a vehicle, leaving a tombstone at its position.
+
+        :param vehicle_id: ID of the vehicle
+        :return: tuple: (position, old features), both None if absent
+        """
+        position = self.position(vehicle_id)
+        if position is None:
+            return None, None
+        if self._positions is not None:
+            del self._positions[vehicle_id]
+        old = self.records[position]
+        self.records[position] = None
+        return position, old
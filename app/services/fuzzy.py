@@ -0,0 +1,171 @@
+from typing import Dict, Iterable, List, Set
+
+# Words shorter than this are never corrected; "gt" and "gts" are one edit
+# apart yet different badges
+MIN_CORRECTED_LENGTH = 4
+
+# Words at least this long may be corrected by two edits, shorter ones by one
+LONG_WORD_LENGTH = 8
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Damerau-Levenshtein (optimal string alignment) distance, giving up once
+    it exceeds a limit.
+
+    :param a: First string
+    :param b: Second string
+    :param limit: Largest distance of interest
+    :return: The distance, or limit + 1 if it is larger than limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            cost = 0 if char_a == char_b else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + cost)
+            if (i > 1 and j > 1 and char_a == b[j - 2]
+                    and a[i - 2] == char_b):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+def _deletes(word: str, distance: int) -> Set[str]:
+    """
+    Every string made by deleting up to distance characters from word.
+    """
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {variant[:i] + variant[i + 1:]
+                    for variant in frontier for i in range(len(variant))}
+        found |= frontier
+    return found
+
+
+class FuzzyVocabulary:
+    """Resolves misspelled words to the catalogue vocabulary.
+
+    A SymSpell-style deletion dictionary maps every string made by deleting
+    up to max_distance characters from a catalogue token back to the token.
+    A misspelled word is looked up through its own deletions, so only the
+    few tokens sharing one are compared by edit distance, however large the
+    vocabulary.
+    """
+
+    def __init__(self, frequencies: Dict[str, int], max_distance: int = 2):
+        """
+        Build the deletion dictionary.
+
+        :param frequencies: Mapping of catalogue token to the number of
+            vehicles it occurs in, used to break ties between corrections
+        :param max_distance: Most edits to correct; words shorter than
+            LONG_WORD_LENGTH are corrected by at most one
+        """
+        self.frequencies = frequencies
+        self.max_distance = max_distance
+        self._deletions: Dict[str, List[str]] = {}
+        for token in frequencies:
+            if len(token) < MIN_CORRECTED_LENGTH - max_distance:
+                continue
+            for variant in _deletes(token, max_distance):
+                self._deletions.setdefault(variant, []).append(token)
+
+    @classmethod
+    def from_tokens(cls, tokens: Iterable[str],
+                    max_distance: int = 2) -> 'FuzzyVocabulary':
+        """
+        Build a vocabulary from a token stream, counting occurrences.
+
+        :param tokens: Iterable of catalogue tokens, repeated per occurrence
+        :param max_distance: Most edits to correct
+        :return: FuzzyVocabulary over the distinct tokens
+        """
+        frequencies: Dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        return cls(frequencies, max_distance)
+
+    def allowed_distance(self, word: str) -> int:
+        """
+        :return: Most edits tolerated for the word: none for short words
+            and words with digits (model codes such as "110tsi" and
+            "118tsi" differ by one), one below LONG_WORD_LENGTH
+        """
+        if len(word) < MIN_CORRECTED_LENGTH or any(c.isdigit() for c in word):
+            return 0
+        if len(word) < LONG_WORD_LENGTH:
+            return min(1, self.max_distance)
+        return self.max_distance
+
+    def correct(self, word: str) -> str:
+        """
+        Resolve a word to the closest catalogue token within the allowed
+        distance, preferring more frequent then alphabetically first tokens.
+
+        :param word: Lowercased word
+        :return: The correction, or the word itself when it is a catalogue
+            token or nothing is close enough
+        """
+        if word in self.frequencies:
+            return word
+        limit = self.allowed_distance(word)
+        if not limit:
+            return word
+
+        best = None
+        best_key = None
+        seen = set()
+        deletions = self._deletions
+        for variant in _deletes(word, limit):
+            for token in deletions.get(variant, ()):
+                if token in seen:
+                    continue
+                seen.add(token)
+                distance = edit_distance(word, token, limit)
+                if distance > limit:
+                    continue
+                key = (distance, -self.frequencies[token], token)
+                if best_key is None or key < best_key:
+                    best, best_key = token, key
+        return best if best is not None else word
+
+    def matches(self, word: str) -> Set[str]:
+        """
+        Find every catalogue token within the allowed distance of a word.
+
+        :param word: Lowercased word
+        :return: Set of tokens, including the word when it is one
+        """
+        found = {word} if word in self.frequencies else set()
+        limit = self.allowed_distance(word)
+        if not limit:
+            return found
+        deletions = self._deletions
+        for variant in _deletes(word, limit):
+            for token in deletions.get(variant, ()):
+                if (token not in found
+                        and edit_distance(word, token, limit) <= limit):
+                    found.add(token)
+        return found
+
+    def correct_text(self, text: str) -> str:
+        """
+        Correct every word of a normalised description.
+
+        :param text: Normalised description
+        :return: The description with misspelled words replaced, or the
+            text itself when nothing changed
+        """
+        words = text.split()
+        corrected = [self.correct(word) for word in words]
+        if corrected == words:
+            return text
+        return ' '.join(corrected)
@@ -0,0 +1,250 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional, Set, Tuple
+from services.features import FeatureTable, VehicleFeatures
+
+
+class VehicleIndex:
+    """An inverted index over the vehicle catalogue.
+
+    Maps the normalised phrases and words the matcher scores on to the
+    positions of the vehicles containing them, so that only vehicles sharing
+    at least one of them with a description need to be scored.
+    """
+
+    def __init__(self, table: FeatureTable):
+        """
+        Build the index from the catalogue's feature table.
+
+        :param table: FeatureTable of the loaded catalogue
+        """
+        self.table = table
+        self.phrases: Dict[str, List[int]] = {}
+        self.words: Dict[str, List[int]] = {}
+        # An empty phrase is a substring of every description
+        self.always: List[int] = []
+        # Bitmasks of the table's phrase and word fields each key occurs in.
+        # They only ever grow, so after updates they may over-approximate,
+        # which keeps any score bound derived from them safe
+        self.phrase_masks: Dict[str, int] = {}
+        self.word_masks: Dict[str, int] = {}
+        self.always_mask = 0
+
+        for position, features in enumerate(table.records):
+            if features is None:
+                continue
+            for value in features.phrases:
+                if value:
+                    self._add(self.phrases, value, position)
+                elif not self.always or self.always[-1] != position:
+                    self.always.append(position)
+
+            for words in features.words:
+                for word in words:
+                    self._add(self.words, word, position)
+            self._add_masks(features)
+
+        self._update_phrase_lengths()
+
+    @classmethod
+    def from_saved(cls, saved, vehicles, phrase_fields: Tuple[str, ...],
+                   word_fields: Tuple[str, ...]) -> 'VehicleIndex':
+        """
+        Restore an index saved alongside the catalogue, without scanning the
+        features again.
+
+        :param saved: SavedIndex read from a snapshot, built over the same
+            catalogue and fields
+        :param vehicles: The snapshot's catalogue
+        :param phrase_fields: Phrase fields of the scoring plan
+        :param word_fields: Word fields of the scoring plan
+        :return: VehicleIndex equal to one built from the catalogue
+        """
+        index = cls.__new__(cls)
+        distinct = [VehicleFeatures(phrases, words)
+                    for phrases, words in saved.features]
+        index.table = FeatureTable.from_records(
+            [distinct[i] for i in saved.feature_ids], vehicles,
+            phrase_fields, word_fields)
+        index.phrases = saved.phrases
+        index.words = saved.words
+        index.always = saved.always
+        index.phrase_masks = saved.phrase_masks
+        index.word_masks = saved.word_masks
+        index.always_mask = saved.always_mask
+        index._update_phrase_lengths()
+        return index
+
+    def _update_phrase_lengths(self):
+        self.phrase_lengths = sorted({len(phrase) for phrase in self.phrases})
+
+    @staticmethod
+    def _add(postings: Dict[str, List[int]], key: str, position: int):
+        """Append a position to a posting list, skipping duplicates."""
+        posting = postings.setdefault(key, [])
+        if not posting or posting[-1] != position:
+            posting.append(position)
+
+    def _add_masks(self, features: VehicleFeatures):
+        phrase_masks = self.phrase_masks
+        for field, value in enumerate(features.phrases):
+            if value:
+                phrase_masks[value] = phrase_masks.get(value, 0) | 1 << field
+            else:
+                self.always_mask |= 1 << field
+        word_masks = self.word_masks
+        for field, words in enumerate(features.words):
+            for word in words:
+                word_masks[word] = word_masks.get(word, 0) | 1 << field
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def replace(self, position: int, old: Optional[VehicleFeatures],
+                new: Optional[VehicleFeatures]):
+        """
+        Move a vehicle's postings from its old features to its new ones in
+        place. Keys shared by both are left untouched, so concurrent lookups
+        never miss an unchanged vehicle.
+
+        :param position: Catalogue position of the vehicle
+        :param old: Previous features, or None for a new vehicle
+        :param new: Current features, or None for a removed vehicle
+        """
+        old_phrases, old_words = self._keys(old)
+        new_phrases, new_words = self._keys(new)
+
+        for phrase in new_phrases - old_phrases:
+            self._insert(self.always if phrase == '' else
+                         self.phrases.setdefault(phrase, []), position)
+        for word in new_words - old_words:
+            self._insert(self.words.setdefault(word, []), position)
+
+        for phrase in old_phrases - new_phrases:
+            if phrase == '':
+                self._delete(self.always, position)
+            else:
+                self._delete_key(self.phrases, phrase, position)
+        for word in old_words - new_words:
+            self._delete_key(self.words, word, position)
+
+        if new is not None:
+            self._add_masks(new)
+        if new_phrases != old_phrases:
+            self._update_phrase_lengths()
+
+    @staticmethod
+    def _keys(features: Optional[VehicleFeatures]):
+        if features is None:
+            return set(), set()
+        return (set(features.phrases),
+                {word for words in features.words for word in words})
+
+    @staticmethod
+    def _insert(posting: List[int], position: int):
+        index = bisect_left(posting, position)
+        if index == len(posting) or posting[index] != position:
+            posting.insert(index, position)
+
+    @staticmethod
+    def _delete(posting: List[int], position: int):
+        index = bisect_left(posting, position)
+        if index < len(posting) and posting[index] == position:
+            del posting[index]
+
+    def _delete_key(self, postings: Dict[str, List[int]], key: str,
+                    position: int):
+        posting = postings.get(key)
+        if posting is not None:
+            self._delete(posting, position)
+            if not posting:
+                del postings[key]
+
+    def candidates(self, description: str) -> List:
+        """
+        Find every vehicle sharing a phrase or word with the description.
+
+        :param description: Normalized vehicle description string
+        :return: Candidate vehicle IDs in catalogue order
+        """
+        description = description.lower()
+        table = self.table
+        return [table.vehicle_id(position) for position in
+                self.candidate_positions(description, set(description.split()))
+                if table.records[position] is not None]
+
+    def candidate_positions(self, description: str,
+                            description_words: Set[str]) -> List[int]:
+        """
+        Find the catalogue positions of the candidate vehicles.
+
+        :param description: Lowercased description string
+        :param description_words: Whitespace-separated words of the description
+        :return: Sorted candidate positions
+        """
+        return self.lookup(description, description_words)[0]
+
+    def lookup(self, description: str, description_words: Set[str],
+               block_mask: int = 0) -> Tuple[List[int], int, int, Set[int]]:
+        """
+        Find the candidate positions, the fields any candidate can match
+        and the block of candidates mentioned by some block field.
+
+        The phrase masks double as the dictionary of block field values, so
+        the block holds every vehicle with a block field value in the
+        description (and possibly some sharing that phrase in another field).
+
+        :param description: Lowercased description string
+        :param description_words: Whitespace-separated words of the description
+        :param block_mask: Bitmask of the phrase fields that form blocks
+        :return: tuple: (sorted candidate positions, bitmask of the phrase
+            fields and bitmask of the word fields that can match, set of
+            block positions)
+        """
+        positions: Set[int] = set(self.always)
+        block: Set[int] = set()
+        phrase_mask = self.always_mask
+        word_mask = 0
+
+        for phrase in self.phrases_in(description):
+            # Removed by a concurrent refresh since phrases_in
+            posting = self.phrases.get(phrase, ())
+            positions.update(posting)
+            mask = self.phrase_masks.get(phrase, 0)
+            phrase_mask |= mask
+            if mask & block_mask:
+                block.update(posting)
+
+        for word in description_words:
+            posting = self.words.get(word)
+            if posting:
+                positions.update(posting)
+                word_mask |= self.word_masks.get(word, 0)
+
+        return sorted(positions), phrase_mask, word_mask, block
+
+    def phrases_in(self, description: str) -> Set[str]:
+        """
+        Find the indexed phrases that occur as substrings of the description.
+
+        Only substrings with the length of some indexed phrase are looked up,
+        so the cost depends on the description rather than the catalogue.
+        Small vocabularies are cheaper to test phrase by phrase instead.
+
+        :param description: Lowercased description string
+        :return: Set of indexed phrases found in the description
+        """
+        phrases = self.phrases
+        size = len(description)
+        if len(phrases) <= size * len(self.phrase_lengths):
+            return {phrase for phrase in list(phrases)
+                    if phrase in description}
+
+        found = set()
+        for length in self.phrase_lengths:
+            if length > size:
+                break
+            for start in range(size - length + 1):
+                substring = description[start:start + length]
+                if substring in phrases:
+                    found.add(substring)
+        return found
@@ -1,31 +1,200 @@
-from typing import List, Dict
+import gc
+import time
+from heapq import heappush, heapreplace
+from typing import List, Dict, Iterable, Iterator, Set, Tuple
+from services.batch import BatchScorer
+from services.bitset import BitsetScorer
+from services.cache import LRUCache
+from services.features import FeatureTable, VehicleFeatures
+from services.fuzzy import FuzzyVocabulary
+from services.index import VehicleIndex
+from services.metrics import Metrics
 from services.normaliser import Normaliser
-from models import VehicleDatabase
+from services.scoring import ScoringPlan, WordExpander
+from models import CatalogueDelta, VehicleDatabase
 from models.vehicle import Vehicle
 
+# "heap" scores candidates from the index into a bounded heap; "bitset"
+# combines precomputed per-field bitsets of the catalogue
+SCORING_MODES = ("heap", "bitset")
+
 
 class Matcher:
     """A vehicle matching engine that finds the best database matches for vehicle descriptions."""
 
-    def __init__(self, db: VehicleDatabase, normaliser: Normaliser):
+    def __init__(self, db: VehicleDatabase, normaliser: Normaliser,
+                 cache_size: int = 10000, max_edit_distance: int = 0,
+                 scoring: str = "heap", plan: ScoringPlan = None):
         """
         Initialize the Matcher with database and text normalizer.
 
         :param db: Connected vehicle database instance
         :param normaliser: Text normalization service instance
+        :param cache_size: Maximum entries in each of the normalisation and
+            match result LRU caches; 0 disables caching
+        :param max_edit_distance: Correct misspelled description words to
+            catalogue words up to this many edits apart before scoring;
+            0 matches exactly
+        :param scoring: One of SCORING_MODES; both give identical results
+        :param plan: Scored fields, weights and match modes (default:
+            ScoringPlan(), make 3, model 2, badge 2 by whole word and the
+            type fields 1); may be replaced later, which rebuilds the index
         """
+        if scoring not in SCORING_MODES:
+            raise ValueError(f"Unknown scoring mode: {scoring}")
+        self.scoring = scoring
         self.normaliser = normaliser
         self.db = db
-        self.field_weights = {
-            'make': 3,
-            'model': 2,
-            'badge': 2,
-            'transmission_type': 1,
-            'fuel_type': 1,
-            'drive_type': 1
-        }
-        # Match for partial matches for the fields mentioned in this list
-        self.partial_match_fields = ['badge']
+        self.max_edit_distance = max_edit_distance
+        self.plan = plan if plan is not None else ScoringPlan()
+        # The plan's compiled scoring function of (VehicleFeatures,
+        # lowercased description, description words per word field)
+        self._score_features = self.plan.score
+        # Fields whose mentions narrow the candidates scored first
+        self.block_fields = ['make', 'model']
+        # Inverted index over db.vehicles, rebuilt whenever it is reloaded
+        self._index = None
+        self._index_source = None
+        self._index_plan = None
+        # Incremented before and after each apply_delta. The structures
+        # derived from the index below record the generation they were
+        # built at, so one built while an update ran is rebuilt on next use
+        self._generation = 0
+        # Description words per word field of the plan
+        self._expander = None
+        self._expander_generation = None
+        self._batch_scorer = None
+        self._batch_generation = None
+        self._bitset_scorer = None
+        self._bitset_generation = None
+        # Listing count of each index position, for tie-break ordering
+        self._position_counts: List[int] = None
+        self._counts_source = None
+        # Deletion dictionary over the index vocabulary, for fuzzy matching
+        self._vocabulary = None
+        self._vocabulary_source = None
+        self._vocabulary_generation = None
+        # Raw description -> normalised description
+        self._normalised_cache = LRUCache(cache_size)
+        # Normalised description -> match result, cleared on reload
+        self._match_cache = LRUCache(cache_size)
+        # Per-stage timers and counters; None disables instrumentation
+        self.metrics = None
+
+    @property
+    def field_weights(self) -> Dict[str, int]:
+        """Weight of each scored field, from the plan."""
+        return self.plan.field_weights
+
+    @property
+    def partial_match_fields(self) -> List[str]:
+        """Fields matched on words rather than as substrings."""
+        return list(self.plan.word_fields)
+
+    def instrument(self, metrics: Metrics):
+        """
+        Record per-stage timings and counters of this matcher, its
+        normaliser and its database into a Metrics set.
+
+        Stages: normalise, candidates (index lookup), scoring, resolve (tie
+        break and result), batch_scoring, index_build and db_load. Counters:
+        descriptions, no_match, descriptions_scored (match cache misses) and
+        ties. Histograms per scored description: candidates (sharing a
+        phrase or word) and candidates_scored.
+
+        :param metrics: Metrics to record into, or None to disable
+        """
+        self.metrics = metrics
+        self.normaliser.metrics = metrics
+        self.db.metrics = metrics
+
+    def prepare(self):
+        """
+        Build the derived matching structures for the loaded catalogue now
+        rather than on the first match, e.g. before forking workers.
+        """
+        self._get_index()
+        if self.scoring == "bitset":
+            self._get_bitset_scorer()
+        if self.max_edit_distance:
+            self._get_vocabulary()
+
+    @property
+    def index(self) -> VehicleIndex:
+        """The index over the loaded catalogue, built on first use."""
+        return self._get_index()
+
+    def refresh(self, delta: CatalogueDelta = None) -> CatalogueDelta:
+        """
+        Incrementally refresh the catalogue from the database and update the
+        derived matching structures in place.
+
+        :param delta: Changes already fetched with db.fetch_changes, so that
+            only the in-memory update runs here; fetched now if None
+        :return: CatalogueDelta of the applied changes
+        """
+        if delta is None:
+            delta = self.db.refresh()
+        else:
+            self.db.apply_changes(delta)
+        self.apply_delta(delta)
+        return delta
+
+    def apply_delta(self, delta: CatalogueDelta):
+        """
+        Update the feature table and index in place for vehicles changed by
+        VehicleDatabase.refresh, and drop results that may be stale.
+
+        Matching may run concurrently on other threads: every position is
+        given a listing count before the index publishes it, and structures
+        derived from the index during the update are rebuilt afterwards.
+        Calls to apply_delta itself must not overlap.
+
+        :param delta: CatalogueDelta returned by VehicleDatabase.refresh
+        """
+        if not delta:
+            return
+
+        self._generation += 1
+        try:
+            # Structures not built yet, or rebuilt from scratch after a full
+            # load, are already current
+            index = self._index
+            if index is not None and self._index_source is self.db.vehicles:
+                table = index.table
+                listing_counts = delta.listing_counts
+                counts = self._position_counts
+                if counts is not None:
+                    # New vehicles are appended in delta order
+                    counts.extend(
+                        listing_counts.get(vehicle_id, 0)
+                        for vehicle_id in delta.vehicles
+                        if table.position(vehicle_id) is None)
+                for vehicle_id in delta.removed:
+                    position, old = table.remove(vehicle_id)
+                    if position is not None:
+                        index.replace(position, old, None)
+                for vehicle_id, vehicle in delta.vehicles.items():
+                    position, old, new = table.upsert(vehicle_id, vehicle)
+                    index.replace(position, old, new)
+
+                if counts is not None:
+                    for vehicle_id, count in listing_counts.items():
+                        position = table.position(vehicle_id)
+                        if position is not None:
+                            counts[position] = count
+            # Sparse matrices and rank-ordered bitsets are cheaper to
+            # re-encode than to patch
+            self._batch_scorer = None
+            self._bitset_scorer = None
+            self._expander = None
+            self._vocabulary = None
+        finally:
+            # Cleared while the generation is odd, so a match computed
+            # before the delta is discarded whether it is cached before or
+            # after the clear (see _cache_match)
+            self._match_cache.clear()
+            self._generation += 1
 
     def match_descriptions(self, descriptions: List[str]) -> List[Dict]:
         """
@@ -38,40 +207,265 @@ class Matcher:
             - confidence: Confidence score (0-10)
             - listing_count: Number of listings for matched vehicle
         """
-        results = []
+        return list(self.iter_matches(descriptions))
+
+    def iter_matches(self, descriptions: Iterable[str]) -> Iterator[Dict]:
+        """
+        Lazily match vehicle descriptions, yielding each result as soon as
+        it is ready.
 
+        :param descriptions: Iterable of vehicle description strings
+        :return: Iterator of result dictionaries as from match_descriptions
+        """
         for description in descriptions:
-            # Standardise the string
+            yield self.match_description(description)
+
+    def match_description(self, description: str) -> Dict:
+        """
+        Match a single vehicle description to a database entry.
+
+        :param description: Vehicle description string to match
+        :return: Result dictionary as from match_descriptions
+        """
+        # Rebuild the index and drop cached results if the catalogue reloaded
+        self._get_index()
+
+        # Standardise the string
+        normalised_description = self.normalise(description)
+
+        match = self._match_cache.get(normalised_description)
+        if match is None:
+            generation = self._generation
+            match = self._match_normalised(normalised_description)
+            self._cache_match(normalised_description, match, generation)
+
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.increment('descriptions')
+            if match['vehicle_id'] is None:
+                metrics.increment('no_match')
+
+        result = {'input': description}
+        result.update(match)
+        return result
+
+    def _cache_match(self, description: str, match: Dict, generation: int):
+        """
+        Cache the match of a normalised description, unless apply_delta
+        ran since it was computed and it may be stale.
+
+        :param description: Normalised description
+        :param match: Match computed from it
+        :param generation: self._generation before it was computed
+        """
+        if generation != self._generation or generation & 1:
+            return
+        self._match_cache.put(description, match)
+        # A delta starting after the check may have cleared the cache before
+        # the put, so the entry would outlive the clear
+        if generation != self._generation:
+            self._match_cache.discard(description)
+
+    def normalise(self, description: str) -> str:
+        """
+        Normalise a description as it is matched, with fuzzy corrections
+        when enabled.
+
+        :param description: Vehicle description string
+        :return: The normalised description
+        """
+        normalised_description = self._normalised_cache.get(description)
+        if normalised_description is None:
             normalised_description = self.normaliser.preprocess(description)
+            self._normalised_cache.put(description, normalised_description)
+        return self._correct(normalised_description)
 
-            # Find all potential matches
-            potential_matches = self._find_potential_matches(
-                normalised_description)
+    def _match_normalised(self, description: str) -> Dict:
+        """
+        Match a normalised description to a database entry.
 
-            if not potential_matches:
-                results.append({
-                    'input': description,
-                    'vehicle_id': None,
-                    'confidence': 0
-                })
-                continue
+        :param description: Normalized vehicle description string
+        :return: Dictionary of vehicle_id, confidence and, for a match,
+            listing_count
+        """
+        # The runner-up is only needed to detect a tie for first place
+        top = self._top_candidates(description, 2, ties_only=True)
+
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+            metrics.increment('descriptions_scored')
+
+        if not top:
+            return {
+                'vehicle_id': None,
+                'confidence': 0
+            }
+
+        score, position = top[0]
+        has_tie = len(top) > 1 and top[1][0] == score
+        vehicle_id = self._index.table.vehicle_id(position)
+
+        # Deduct one point if 2 vehicles found with same score
+        confidence = self._calculate_confidence(score) - (1 if has_tie else 0)
+
+        match = {
+            'vehicle_id': vehicle_id,
+            'confidence': confidence,
+            'listing_count': self.db.listing_counts.get(vehicle_id, 0)
+        }
+        if metrics is not None:
+            if has_tie:
+                metrics.increment('ties')
+            metrics.observe_stage('resolve', time.perf_counter() - start)
+        return match
 
-            # Get the best match based on score and listing count
-            best_match, has_tie = self._resolve_best_match(potential_matches)
+    def top_matches(self, description: str, k: int = 5) -> List[Dict]:
+        """
+        Find the K best candidates for a description, best first, in the
+        order match_description ranks them: by score, then listing count,
+        then catalogue order.
 
-            # Deduct one point if 2 vehicles found with same score
-            confidence = self._calculate_confidence(best_match['score']) - (
-                1 if has_tie else 0)
+        :param description: Vehicle description string to match
+        :param k: Maximum number of candidates to return
+        :return: List of dictionaries containing:
+            - vehicle_id: Candidate vehicle ID
+            - score: Match score (sum of matched field weights)
+            - listing_count: Number of listings for the vehicle
+        """
+        if k <= 0:
+            return []
+        self._get_index()
+        normalised_description = self.normalise(description)
 
-            results.append({
-                'input': description,
-                'vehicle_id': best_match['id'],
-                'confidence': confidence,
-                'listing_count': self.db.listing_counts.get(best_match['id'], 0)
+        table = self._index.table
+        listing_counts = self.db.listing_counts
+        matches = []
+        for score, position in self._top_candidates(normalised_description, k):
+            vehicle_id = table.vehicle_id(position)
+            matches.append({
+                'vehicle_id': vehicle_id,
+                'score': score,
+                'listing_count': listing_counts.get(vehicle_id, 0)
             })
+        return matches
+
+    def cache_stats(self) -> Dict[str, Dict]:
+        """
+        Report the hit, miss and eviction counters of the caches.
+
+        :return: Dictionary with 'normalised' and 'match' cache statistics
+        """
+        return {
+            'normalised': self._normalised_cache.stats(),
+            'match': self._match_cache.stats()
+        }
+
+    def match_descriptions_batch(self, descriptions: List[str],
+                                 batch_size: int = 256) -> List[Dict]:
+        """
+        Match a list of vehicle descriptions using the vectorised batch
+        scorer. Results are identical to match_descriptions, and share its
+        normalisation and match caches: only the distinct descriptions of a
+        batch missing from the match cache are scored.
+
+        :param descriptions: List of vehicle description strings to match
+        :param batch_size: Number of descriptions scored per sparse product;
+            memory grows with batch_size times the number of candidates
+        :return: List of dictionaries as returned by match_descriptions
+        """
+        metrics = self.metrics
+        results = []
+
+        for start in range(0, len(descriptions), batch_size):
+            batch = descriptions[start:start + batch_size]
+            generation = self._generation
+            scorer = self._get_batch_scorer()
+            normalised = [self.normalise(d) for d in batch]
+            matches = {}
+            misses = []
+            for description in normalised:
+                if description in matches:
+                    continue
+                match = self._match_cache.get(description)
+                matches[description] = match
+                if match is None:
+                    misses.append(description)
+
+            if misses:
+                if metrics is not None:
+                    started = time.perf_counter()
+                positions, scores, has_tie = scorer.best_matches(misses)
+                confidences = scorer.confidences(scores, has_tie)
+                if metrics is not None:
+                    metrics.observe_stage('batch_scoring',
+                                          time.perf_counter() - started)
+                    metrics.increment('descriptions_scored', len(misses))
+                    metrics.increment('ties', int(has_tie.sum()))
+
+                for description, position, confidence in zip(
+                        misses, positions.tolist(), confidences.tolist()):
+                    if position < 0:
+                        match = {'vehicle_id': None, 'confidence': 0}
+                    else:
+                        vehicle_id = scorer.vehicle_ids[position]
+                        match = {
+                            'vehicle_id': vehicle_id,
+                            'confidence': confidence,
+                            'listing_count':
+                                self.db.listing_counts.get(vehicle_id, 0)
+                        }
+                    matches[description] = match
+                    self._cache_match(description, match, generation)
+
+            for description, key in zip(batch, normalised):
+                match = matches[key]
+                if metrics is not None and match['vehicle_id'] is None:
+                    metrics.increment('no_match')
+                result = {'input': description}
+                result.update(match)
+                results.append(result)
+            if metrics is not None:
+                metrics.increment('descriptions', len(batch))
 
         return results
 
+    def _correct(self, description: str) -> str:
+        """
+        Replace misspelled words of a normalised description with the
+        closest catalogue words, when fuzzy matching is enabled.
+
+        :param description: Normalized vehicle description string
+        :return: The corrected description
+        """
+        if not self.max_edit_distance:
+            return description
+        return self._get_vocabulary().correct_text(description.lower())
+
+    def _get_vocabulary(self) -> FuzzyVocabulary:
+        """
+        Return the fuzzy vocabulary of the catalogue's phrase and badge
+        words, rebuilding it after the index was rebuilt or updated.
+
+        :return: FuzzyVocabulary weighted by the number of vehicles per word
+        """
+        index = self._get_index()
+        generation = self._generation
+        if (self._vocabulary is None or self._vocabulary_source is not index
+                or self._vocabulary_generation != generation):
+            frequencies: Dict[str, int] = {}
+            for postings in (index.phrases, index.words):
+                # Snapshot, as a concurrent apply_delta may add keys
+                for key, posting in list(postings.items()):
+                    for word in key.split():
+                        frequencies[word] = (frequencies.get(word, 0)
+                                             + len(posting))
+            self._vocabulary = FuzzyVocabulary(frequencies,
+                                               self.max_edit_distance)
+            self._vocabulary_source = index
+            self._vocabulary_generation = generation
+        return self._vocabulary
+
     def _find_potential_matches(self, description: str) -> List[Dict]:
         """
         Find all vehicles that match the description with their scores
@@ -83,43 +477,303 @@ class Matcher:
             - listing_count: Number of listings
         """
         matches = []
+        listing_counts = self.db.listing_counts
+        index = self._get_index()
+        table = index.table
+        records = table.records
 
-        for vehicle_id, vehicle in self.db.vehicles.items():
-            score = self._calculate_score(vehicle, description)
+        # Tokenise once per description rather than once per vehicle
+        description = description.lower()
+        description_words = set(description.split())
+        field_words = self._get_expander().expand(description_words)
+
+        # Vehicles sharing no phrase or word with the description score 0
+        for position in index.candidate_positions(
+                description,
+                WordExpander.lookup_words(description_words, field_words)):
+            features = records[position]
+            if features is None:
+                # Removed by a concurrent refresh
+                continue
+            score = self._score_features(features, description, field_words)
             if score > 0:
+                vehicle_id = table.vehicle_id(position)
                 matches.append({
                     'id': vehicle_id,
                     'score': score,
-                    'listing_count': self.db.listing_counts.get(vehicle_id, 0)
+                    'listing_count': listing_counts.get(vehicle_id, 0)
                 })
 
         return matches
 
-    def _resolve_best_match(self, potential_matches: List[Dict]) -> Dict:
+    def _top_candidates(self, description: str, k: int,
+                        ties_only: bool = False) -> List[Tuple[int, int]]:
+        """
+        Find the K best scoring vehicles with a bounded heap.
+
+        Vehicles whose make or model (the block fields) occur in the
+        description are scored first. The other candidates cannot match a
+        block field, so they are only scored when their bound without those
+        weights could still reach the K kept. When the description mentions
+        no make or model, every candidate is scored as one block.
+
+        Within a block candidates are visited in tie-break order (most
+        listings first, then catalogue order), so a later one can only
+        displace one already kept with a strictly higher score, or one kept
+        from an earlier block that it outranks. Once the K kept all rank at
+        or above the block's score bound at the current candidate, the rest
+        of the block is skipped.
+
+        With scoring "bitset" the K best are read from BitsetScorer instead,
+        in the same order.
+
+        :param description: Normalized vehicle description string
+        :param k: Number of candidates to keep
+        :param ties_only: Candidates after the first only matter if they tie
+            with it, as when detecting a tie for first place
+        :return: List of (score, position) tuples, best first
         """
-        Determine the best match from potential candidates.
+        index = self._get_index()
 
-        :param potential_matches: List of candidate matches
-        :return: tuple: (best_match_dict, has_tie_flag)
-            - best_match_dict: The selected match with highest score/listings
-            - has_tie_flag: True if there was a score tie that was broken
+        # Tokenise once per description rather than once per vehicle
+        description = description.lower()
+        description_words = set(description.split())
+        field_words = self._get_expander().expand(description_words)
+
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+
+        if self.scoring == "bitset":
+            top = self._get_bitset_scorer().top(description, field_words, k)
+            if metrics is not None:
+                metrics.observe_stage('scoring', time.perf_counter() - start)
+            return top
+
+        # Vehicles sharing no phrase or word with the description score 0
+        positions, phrase_mask, word_mask, block = index.lookup(
+            description,
+            WordExpander.lookup_words(description_words, field_words),
+            self._block_mask)
+
+        if metrics is not None:
+            looked_up = time.perf_counter()
+            metrics.observe_stage('candidates', looked_up - start)
+            metrics.observe('candidates', len(positions))
+
+        # Min-heap of (score, listing count, -position): the root is the
+        # worst candidate kept
+        heap = []
+        if block:
+            scored = self._scan(sorted(block), description, field_words, k,
+                                self._score_bound(phrase_mask, word_mask),
+                                heap)
+            # Outside the block a make or model can still match when it is
+            # empty, as '' is a substring of every description
+            rest_bound = self._score_bound(
+                phrase_mask & ~(self._block_mask & ~index.always_mask),
+                word_mask)
+            if ties_only:
+                needed = not heap or max(heap)[0] <= rest_bound
+            else:
+                needed = len(heap) < k or heap[0][0] <= rest_bound
+            if needed:
+                scored += self._scan([position for position in positions
+                                      if position not in block],
+                                     description, field_words, k, rest_bound,
+                                     heap)
+        else:
+            scored = self._scan(positions, description, field_words, k,
+                                self._score_bound(phrase_mask, word_mask),
+                                heap)
+
+        if metrics is not None:
+            metrics.observe_stage('scoring', time.perf_counter() - looked_up)
+            metrics.observe('candidates_scored', scored)
+
+        heap.sort(reverse=True)
+        return [(score, -position) for score, _, position in heap]
+
+    def _scan(self, positions: List[int], description: str,
+              field_words: Tuple[Set[str], ...], k: int, bound: int,
+              heap: List[Tuple[int, int, int]]) -> int:
+        """
+        Score a block of candidates into the bounded heap.
+
+        :param positions: Sorted candidate positions of the block
+        :param description: Lowercased search description
+        :param field_words: Description words matched by each word field
+        :param k: Number of candidates to keep
+        :param bound: Highest score any candidate of the block can reach
+        :param heap: Heap of kept candidates, updated in place
+        :return: Number of candidates visited before stopping
+        """
+        records = self._index.table.records
+        counts = self._get_position_counts()
+        # Stable, so equal listing counts stay in catalogue order
+        positions.sort(key=counts.__getitem__, reverse=True)
+
+        for position in positions:
+            features = records[position]
+            if features is None:
+                # Removed by a concurrent refresh
+                continue
+            score = self._score_features(features, description, field_words)
+            if score <= 0:
+                continue
+            candidate = (score, counts[position], -position)
+            if len(heap) < k:
+                heappush(heap, candidate)
+            elif candidate > heap[0]:
+                heapreplace(heap, candidate)
+            else:
+                continue
+            # Later candidates rank below (bound, this count, this position),
+            # and the kept may include better-listed ones from earlier blocks
+            if len(heap) == k and heap[0] >= (bound, counts[position],
+                                              -position):
+                return positions.index(position) + 1
+        return len(positions)
+
+    def _score_bound(self, phrase_mask: int, word_mask: int) -> int:
+        """
+        Sum the weights of the fields set in the masks from
+        VehicleIndex.lookup: the most any candidate can score.
+        """
+        bound = 0
+        for field, weight in enumerate(self._phrase_weights):
+            if phrase_mask >> field & 1:
+                bound += weight
+        for field, weight in enumerate(self._word_weights):
+            if word_mask >> field & 1:
+                bound += weight
+        return bound
+
+    def _get_position_counts(self) -> List[int]:
+        """
+        Return the listing count of each position of the index, rebuilding
+        it when the index or the listing counts were reloaded.
         """
-        if not potential_matches:
-            return None
+        listing_counts = self.db.listing_counts
+        counts = self._position_counts
+        if counts is None or self._counts_source is not listing_counts:
+            generation = self._generation
+            table = self._get_index().table
+            counts = [
+                listing_counts.get(table.vehicle_id(position), 0)
+                if features else 0
+                for position, features in enumerate(table.records)]
+            # Counts read while apply_delta ran cover this caller's
+            # positions but miss the rest of the update, so are not kept
+            if generation == self._generation and not generation & 1:
+                self._position_counts = counts
+                self._counts_source = listing_counts
+                # A delta starting after the check would not extend them
+                if generation != self._generation:
+                    self._position_counts = None
+        return counts
+
+    def _get_index(self) -> VehicleIndex:
+        """
+        Return the index over the loaded catalogue, building it and its
+        feature table on first use after each VehicleDatabase.load_data or
+        change of scoring plan, or reading it from a snapshot that saved it.
 
-        # Find the highest score
-        max_score = max(match['score'] for match in potential_matches)
+        :return: VehicleIndex over db.vehicles
+        """
+        vehicles = self.db.vehicles
+        plan = self.plan
+        if (self._index is None or self._index_source is not vehicles
+                or self._index_plan is not plan):
+            phrase_fields = plan.phrase_fields
+            word_fields = plan.word_fields
+            self._phrase_weights = plan.phrase_weights
+            self._word_weights = plan.word_weights
+            self._score_features = plan.score
+            self._block_mask = sum(1 << field
+                                   for field, name in enumerate(phrase_fields)
+                                   if name in self.block_fields)
+            # The build allocates millions of acyclic tuples and sets, and
+            # cyclic collections during it only rescan them
+            start = time.perf_counter()
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                # A snapshot may hold the index for these fields already
+                saved_index = getattr(self.db, 'saved_index', None)
+                saved = (saved_index(phrase_fields, word_fields)
+                         if saved_index is not None else None)
+                self._index = (
+                    VehicleIndex.from_saved(saved, vehicles, phrase_fields,
+                                            word_fields)
+                    if saved is not None else VehicleIndex(
+                        FeatureTable(vehicles, phrase_fields, word_fields)))
+            finally:
+                if gc_enabled:
+                    gc.enable()
+            if self.metrics is not None:
+                self.metrics.observe_stage('index_build',
+                                           time.perf_counter() - start)
+            self._index_source = vehicles
+            self._index_plan = plan
+            # A saved index holds the counts in position order already
+            self._position_counts = (saved.listing_counts
+                                     if saved is not None else None)
+            self._counts_source = self.db.listing_counts
+            self._match_cache.clear()
+        return self._index
+
+    def _get_batch_scorer(self) -> BatchScorer:
+        """
+        Return the batch scorer over the current index, encoding the catalogue
+        on first use after each rebuild of the index.
 
-        # Filter matches with the highest score
-        best_scoring = [match for match in potential_matches
-                        if match['score'] == max_score]
+        :return: BatchScorer over db.vehicles
+        """
+        index = self._get_index()
+        generation = self._generation
+        if (self._batch_scorer is None or self._batch_scorer.index is not index
+                or self._batch_generation != generation):
+            self._batch_scorer = BatchScorer(
+                index, self._phrase_weights, self._word_weights,
+                self.db.listing_counts, self.plan.max_score,
+                self._get_expander())
+            self._batch_generation = generation
+        return self._batch_scorer
+
+    def _get_expander(self) -> WordExpander:
+        """
+        Return the word expander of the plan's word fields over the current
+        index, rebuilding it after the index was rebuilt or updated.
 
-        # If only one match with this score, return it
-        if len(best_scoring) == 1:
-            return best_scoring[0], False
+        :return: WordExpander over db.vehicles
+        """
+        index = self._get_index()
+        generation = self._generation
+        if (self._expander is None or self._expander.index is not index
+                or self._expander_generation != generation):
+            self._expander = WordExpander(self.plan, index)
+            self._expander_generation = generation
+        return self._expander
+
+    def _get_bitset_scorer(self) -> BitsetScorer:
+        """
+        Return the bitset scorer over the current index, building it on
+        first use after each rebuild or update of the index.
 
-        # Otherwise use listing count as tiebreaker
-        return max(best_scoring, key=lambda x: x['listing_count']), True
+        :return: BitsetScorer over db.vehicles
+        """
+        index = self._get_index()
+        generation = self._generation
+        counts = self._get_position_counts()
+        if (self._bitset_scorer is None
+                or self._bitset_scorer.index is not index
+                or self._bitset_scorer.position_counts is not counts
+                or self._bitset_generation != generation):
+            self._bitset_scorer = BitsetScorer(
+                index, self._phrase_weights, self._word_weights, counts)
+            self._bitset_generation = generation
+        return self._bitset_scorer
 
     def _calculate_score(self, vehicle: Vehicle, description: str) -> int:
         """
@@ -129,30 +783,12 @@ class Matcher:
         :param description: Normalized search description
         :return: int: Match score (sum of matched field weights)
         """
-        """Calculate match score for a vehicle against a description"""
-        score = 0
+        table = self._get_index().table
         description = description.lower()
-        for field, weight in self.field_weights.items():
-            value = getattr(vehicle, field, '').lower()
-            if field not in self.partial_match_fields and value in description:
-                score += weight
-
-            # Special handling for partial field only
-            elif field in self.partial_match_fields:
-                # Split description once for efficiency
-                desc_words = set(description.split())
-
-                # Split badge into words and check for whole word matches
-                badge_words = set(value.split())
-
-                # Check for any complete word matches (not substrings)
-                matched_words = [word for word in badge_words
-                                 if any(desc_word == word for desc_word in
-                                        desc_words)]
-
-                if matched_words:
-                    score += weight
-        return score
+        features = VehicleFeatures.from_vehicle(
+            vehicle, table.phrase_fields, table.word_fields)
+        field_words = self._get_expander().expand(set(description.split()))
+        return self._score_features(features, description, field_words)
 
     def _calculate_confidence(self, score: int) -> int:
         """
@@ -161,6 +797,5 @@ class Matcher:
         :param score: Raw matching score
         :return: int: Confidence score scaled to 0-10 range
         """
-        max_score = sum(self.field_weights.values())
-        return min(10, round((score / max_score) * 10)) if max_score > 0 else 0
+        return self.plan.confidence(score)
 
@@ -0,0 +1,306 @@
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Prefix of every exported metric name
+NAMESPACE = "vehicle_matcher"
+
+# Upper bounds of the stage latency buckets, in seconds
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4,
+                   5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Upper bounds of the buckets for per-description counts, e.g. candidates
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000,
+                 10000, 25000, 50000, 100000, 250000, 500000, 1000000)
+
+
+class Histogram:
+    """Counts of observations in fixed buckets, as Prometheus histograms."""
+
+    def __init__(self, buckets: Sequence[float]):
+        """
+        :param buckets: Ascending bucket upper bounds; larger observations
+            fall in an implicit +Inf bucket
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile as the upper bound of the bucket holding it.
+
+        :param q: Quantile between 0 and 1
+        :return: The bucket bound, inf above the last bucket, 0 when empty
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """Per-stage timers, counters and histograms of the matching pipeline.
+
+    Matcher, Normaliser and VehicleDatabase record into the Metrics set as
+    their metrics attribute. It is None by default, and every recording
+    site is guarded by a single check of it, so instrumentation costs
+    nothing measurable when disabled.
+
+    Not locked: recording happens on one matching thread, and readers only
+    copy the containers.
+    """
+
+    def __init__(self, sinks: Iterable = ()):
+        """
+        :param sinks: Objects with an export(metrics) method, called by
+            export, e.g. LogSink or TextfileSink
+        """
+        self.sinks = list(sinks)
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        # Stage name -> latency histogram in seconds
+        self.stages: Dict[str, Histogram] = {}
+        # Name -> histogram of other per-description observations
+        self.histograms: Dict[str, Histogram] = {}
+
+    def increment(self, name: str, value: float = 1):
+        """Add to a counter, e.g. 'descriptions' or 'ties'."""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        """Set a value that can go up and down, e.g. 'vehicles'."""
+        self.gauges[name] = value
+
+    def observe(self, name: str, value: float,
+                buckets: Sequence[float] = COUNT_BUCKETS):
+        """
+        Record an observation, e.g. the candidates of one description.
+
+        :param name: Histogram name
+        :param value: Observed value
+        :param buckets: Bucket upper bounds, used when the histogram is new
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(buckets)
+        histogram.observe(value)
+
+    def observe_stage(self, stage: str, seconds: float):
+        """
+        Record the time spent in one run of a pipeline stage.
+
+        :param stage: Stage name, e.g. 'normalise' or 'scoring'
+        :param seconds: Elapsed time
+        """
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(seconds)
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Time the enclosed block as one run of a pipeline stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def export(self):
+        """Hand the current values to every sink."""
+        for sink in self.sinks:
+            sink.export(self)
+
+    def prometheus_text(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Counters are exported as <namespace>_<name>_total, gauges as
+        <namespace>_<name>, stage timers as one
+        <namespace>_stage_seconds histogram labelled by stage, and other
+        histograms as <namespace>_<name>.
+
+        :return: The exposition text
+        """
+        lines = []
+        for name, value in sorted(list(self.counters.items())):
+            metric = f"{NAMESPACE}_{name}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, value in sorted(list(self.gauges.items())):
+            metric = f"{NAMESPACE}_{name}"
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+
+        stages = sorted(list(self.stages.items()))
+        if stages:
+            metric = f"{NAMESPACE}_stage_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for stage, histogram in stages:
+                lines += _histogram_lines(metric, histogram,
+                                          f'stage="{stage}"')
+        for name, histogram in sorted(list(self.histograms.items())):
+            metric = f"{NAMESPACE}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            lines += _histogram_lines(metric, histogram)
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> List[str]:
+        """
+        Summarise every metric in one human-readable line each.
+
+        :return: List of lines
+        """
+        lines = [f"{name}: {value:g}"
+                 for name, value in sorted(list(self.counters.items()))]
+        lines += [f"{name}: {value:g}"
+                  for name, value in sorted(list(self.gauges.items()))]
+        for stage, histogram in sorted(list(self.stages.items())):
+            if histogram.count:
+                lines.append(
+                    f"stage {stage}: n={histogram.count} "
+                    f"total={histogram.sum:.3f}s "
+                    f"mean={histogram.sum / histogram.count * 1e6:.1f}us "
+                    f"p50<={histogram.quantile(0.5) * 1e6:g}us "
+                    f"p99<={histogram.quantile(0.99) * 1e6:g}us")
+        for name, histogram in sorted(list(self.histograms.items())):
+            if histogram.count:
+                lines.append(
+                    f"{name}: n={histogram.count} "
+                    f"mean={histogram.sum / histogram.count:.1f} "
+                    f"p50<={histogram.quantile(0.5):g} "
+                    f"p99<={histogram.quantile(0.99):g}")
+        return lines
+
+
+def _histogram_lines(metric: str, histogram: Histogram,
+                     labels: str = "") -> List[str]:
+    prefix = labels + "," if labels else ""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{metric}_sum{suffix} {histogram.sum}")
+    lines.append(f"{metric}_count{suffix} {histogram.count}")
+    return lines
+
+
+class LogSink:
+    """Logs the metrics summary, one line per metric."""
+
+    def __init__(self, logger: logging.Logger = None,
+                 level: int = logging.INFO):
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+
+    def export(self, metrics: Metrics):
+        for line in metrics.summary():
+            self.logger.log(self.level, "%s", line)
+
+
+class TextfileSink:
+    """Writes the Prometheus exposition text to a file, e.g. for the node
+    exporter textfile collector. The file is replaced atomically."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, metrics: Metrics):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(metrics.prometheus_text())
+            os.replace(temporary, self.path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+
+class SamplingProfiler:
+    """A statistical profiler for hot-path analysis.
+
+    A background thread samples the Python stack of every other thread at
+    a fixed interval and counts each distinct stack. The counts are written
+    in the collapsed format read by flamegraph.pl and speedscope. Sampling
+    costs the profiled threads only the GIL hand-offs, unlike cProfile,
+    which slows every call.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        """
+        :param interval: Seconds between samples
+        """
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread = None
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="sampling-profiler")
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+
+    def __enter__(self) -> 'SamplingProfiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stopping.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    self.samples[self._stack(frame)] += 1
+
+    @staticmethod
+    def _stack(frame) -> Tuple[str, ...]:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:"
+                         f"{code.co_name}")
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def collapsed(self) -> List[str]:
+        """
+        :return: Lines of semicolon-joined stacks, outermost frame first,
+            followed by their sample count, most sampled first
+        """
+        return [f"{';'.join(stack)} {count}"
+                for stack, count in self.samples.most_common()]
+
+    def write(self, path: str):
+        """Write the collapsed stacks to a file."""
+        with open(path, "w") as f:
+            for line in self.collapsed():
+                f.write(line + "\n")
@@ -0,0 +1,166 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+from services.matcher import Matcher
+
+# Above this many vehicles the blocked per-description path outpaces the
+# sparse products of the batch scorer (python benchmarks/bench_batch.py)
+BATCH_SCORING_LIMIT = 10000
+
+
+class MicroBatcher:
+    """Coalesces concurrent match requests into batches for the matcher.
+
+    Requests are queued on the event loop and a single consumer collects
+    them into batches of up to max_batch_size, waiting at most max_wait
+    seconds after the first request of a batch for more to arrive. Batches
+    are scored on one dedicated thread, so the loop keeps accepting requests
+    while a batch is scored and the matcher is never used from two threads
+    at once. Catalogues of up to batch_scoring_limit vehicles are scored
+    with the vectorised Matcher.match_descriptions_batch; larger ones with
+    the blocked, bounded-heap Matcher.match_descriptions, which outpaces the
+    sparse products there and needs no memory per batch.
+    """
+
+    def __init__(self, matcher: Matcher, max_batch_size: int = 64,
+                 max_wait: float = 0.002,
+                 batch_scoring_limit: int = BATCH_SCORING_LIMIT):
+        """
+        :param matcher: Matcher over a loaded catalogue
+        :param max_batch_size: Most descriptions scored together
+        :param max_wait: Seconds to hold a partial batch open for more
+            requests; 0 scores whatever is queued immediately
+        :param batch_scoring_limit: Largest catalogue scored with the
+            vectorised batch scorer
+        """
+        self.matcher = matcher
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batch_scoring_limit = batch_scoring_limit
+        self.batches = 0
+        self.descriptions = 0
+        self._queue: asyncio.Queue = None
+        # Set once enough requests are queued to fill the open batch
+        self._full: asyncio.Event = None
+        self._consumer: asyncio.Task = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="matcher")
+
+    async def start(self):
+        """Start consuming requests on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._full = asyncio.Event()
+        self._consumer = asyncio.get_running_loop().create_task(
+            self._consume())
+
+    async def stop(self):
+        """Score the requests already queued, then stop."""
+        await self._queue.join()
+        self._consumer.cancel()
+        try:
+            await self._consumer
+        except asyncio.CancelledError:
+            pass
+        self._executor.shutdown()
+
+    async def match(self, description: str) -> Dict:
+        """
+        Match one description as part of the next batch.
+
+        :param description: Vehicle description string
+        :return: Result dictionary as from Matcher.match_descriptions
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((description, future))
+        if self._queue.qsize() >= self.max_batch_size - 1:
+            self._full.set()
+        return await future
+
+    async def match_many(self, descriptions: List[str]) -> List[Dict]:
+        """
+        Match several descriptions, batched with any concurrent requests.
+
+        :param descriptions: Vehicle description strings
+        :return: Result dictionaries in input order
+        """
+        return list(await asyncio.gather(
+            *(self.match(description) for description in descriptions)))
+
+    async def run_exclusive(self, function: Callable, *args):
+        """
+        Run a function on the matching thread between two batches, e.g. an
+        incremental Matcher.refresh, so it never overlaps with scoring.
+
+        :param function: Callable to run
+        :return: The function's return value
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, function, *args)
+
+    def swap(self, matcher: Matcher) -> Matcher:
+        """
+        Serve the next batch from another matcher, e.g. one built over a
+        freshly loaded catalogue. Batches in flight finish on the old one.
+
+        :param matcher: Replacement Matcher
+        :return: The previous Matcher
+        """
+        previous, self.matcher = self.matcher, matcher
+        return previous
+
+    def stats(self) -> Dict:
+        """
+        :return: Dictionary of batches, descriptions and mean batch_size
+        """
+        return {
+            'batches': self.batches,
+            'descriptions': self.descriptions,
+            'batch_size': (self.descriptions / self.batches
+                           if self.batches else 0.0)
+        }
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            descriptions = [description for description, _ in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self._score, self.matcher, descriptions)
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for (_, future), result in zip(batch, results):
+                    # The requester may have disconnected and cancelled
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            self.batches += 1
+            self.descriptions += len(batch)
+
+    def _score(self, matcher: Matcher, descriptions: List[str]) -> List[Dict]:
+        if len(matcher.db.vehicles) <= self.batch_scoring_limit:
+            return matcher.match_descriptions_batch(descriptions,
+                                                    self.max_batch_size)
+        return matcher.match_descriptions(descriptions)
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        """
+        Wait for a request, then hold the batch open until it is full or
+        max_wait has passed since the first.
+        """
+        queue = self._queue
+        batch = [await queue.get()]
+        if self.max_wait > 0 and queue.qsize() < self.max_batch_size - 1:
+            self._full.clear()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+        while len(batch) < self.max_batch_size and not queue.empty():
+            batch.append(queue.get_nowait())
+        return batch
@@ -1,4 +1,71 @@
+import json
 import re
+import time
+from typing import Dict, Iterable
+
+# Abbreviations and common typos expanded by default, keyed by their
+# normalised form
+DEFAULT_ABBREVIATIONS = {
+    # Make
+    'vw': 'volkswagen',
+
+    # Drive Type
+    'fwd': 'front wheel drive',
+    'rwd': 'rear wheel drive',
+    'awd': 'all wheel drive',
+    '4wd': 'four wheel drive',
+    '4x4': 'four wheel drive',
+
+    # Transmission Type
+    'quto': 'automatic'
+}
+
+# Runs of the characters kept by normalisation; anything else separates them
+_TOKEN = re.compile(r'[a-z0-9-]+')
+
+
+def load_abbreviations(path: str) -> Dict[str, str]:
+    """
+    Load an abbreviation table from a JSON file mapping each abbreviation to
+    its expansion, e.g. {"h/line": "highline", "auto": "automatic"}.
+
+    :param path: Path of the JSON file
+    :return: Dictionary of abbreviation to expansion
+    """
+    with open(path, 'r') as f:
+        table = json.load(f)
+    if not isinstance(table, dict):
+        raise ValueError(f"Abbreviation table must be a JSON object: {path}")
+    return {str(k): str(v) for k, v in table.items()}
+
+
+def _trie_pattern(keys: Iterable[str]) -> str:
+    """
+    Build a regex alternation factored by common prefixes, so matching costs
+    roughly the length of the key rather than the number of keys. Longer
+    keys are preferred where one key is a prefix of another.
+
+    :param keys: Literal strings to match
+    :return: Regex pattern source
+    """
+    trie = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = (branches[0] if len(branches) == 1
+                   else '(?:' + '|'.join(branches) + ')')
+        return '(?:' + pattern + ')?' if '' in node else pattern
+
+    return build(trie)
+
 
 class Normaliser:
     """Text normalization service for vehicle descriptions.
@@ -10,6 +77,55 @@ class Normaliser:
         - Normalizing whitespace
     """
 
+    def __init__(self, abbreviations: Dict[str, str] = None):
+        """
+        Compile the abbreviation table into a single regex.
+
+        :param abbreviations: Dictionary of abbreviation to expansion, e.g.
+            from load_abbreviations (default: DEFAULT_ABBREVIATIONS). Both
+            sides are normalised like descriptions, so "h/line" matches the
+            "h line" left by special character removal.
+        """
+        if abbreviations is None:
+            abbreviations = DEFAULT_ABBREVIATIONS
+
+        self.abbreviations = {}
+        for abbreviation, expansion in abbreviations.items():
+            abbreviation = self._clean(abbreviation)
+            if abbreviation:
+                self.abbreviations[abbreviation] = self._clean(expansion)
+
+        # '\b \b' ensures we only match "pet" as a whole word (not "petrol")
+        self._pattern = (
+            re.compile(r'\b' + _trie_pattern(self.abbreviations) + r'\b')
+            if self.abbreviations else None)
+        # Removing a word would leave a double space behind
+        self._collapse = '' in self.abbreviations.values()
+        # services.metrics.Metrics recording the 'normalise' stage; None
+        # disables instrumentation
+        self.metrics = None
+
+    @classmethod
+    def from_file(cls, path: str) -> 'Normaliser':
+        """
+        Create a Normaliser with the abbreviation table in a JSON file.
+
+        :param path: Path of the JSON file
+        :return: Normaliser using that table
+        """
+        return cls(load_abbreviations(path))
+
+    @staticmethod
+    def _clean(text: str) -> str:
+        """
+        Lowercase the text, turn special characters into spaces and collapse
+        whitespace, in one pass over the tokens that are kept.
+
+        :param text: Raw text
+        :return: Cleaned text
+        """
+        return ' '.join(_TOKEN.findall(text.lower()))
+
     def preprocess(self, description: str) -> str:
         """
         Normalize and clean a vehicle description string.
@@ -17,45 +133,33 @@ class Normaliser:
         :param description: Raw vehicle description string to normalize
         :return: Cleaned and normalized description
         """
-        # Convert to lowercase
-        desc = description.lower()
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
 
-        # Remove special characters except spaces and dashes
-        desc = re.sub(r'[^a-z0-9\s-]', ' ', desc)
+        # Lowercase, remove special characters except dashes and collapse
+        # whitespace
+        desc = self._clean(description)
 
         # Replace common abbreviations
         desc = self._replace_abbreviations(desc)
 
-        # Collapse multiple spaces into single space
-        desc = re.sub(r'\s+', ' ', desc).strip()
-
+        if metrics is not None:
+            metrics.observe_stage('normalise', time.perf_counter() - start)
         return desc
 
     def _replace_abbreviations(self, text: str) -> str:
         """
-        Replace common abbreviations with full terms.
+        Replace common abbreviations with full terms in a single pass.
 
         :param text: Partially processed description string
         :return: Description with abbreviations expanded
         """
-        """Replace common abbreviations with full terms"""
-        # '\b \b' ensures we only match "pet" as a whole word (not "petrol")
-        replacements = {
-            # Make
-            r'\bvw\b': 'volkswagen',
-
-            # Drive Type
-            r'\bfwd\b': 'front wheel drive',
-            r'\brwd\b': 'rear wheel drive',
-            r'\bawd\b': 'all wheel drive',
-            r'\b4wd\b': 'four wheel drive',
-            r'\b4x4\b': 'four wheel drive',
-
-            # Transmission Type
-            r'\bquto\b': 'automatic'
-        }
-
-        for pattern, replacement in replacements.items():
-            text = re.sub(pattern, replacement, text)
+        if self._pattern is None:
+            return text
 
-        return text
\ No newline at end of file
+        abbreviations = self.abbreviations
+        text = self._pattern.sub(lambda m: abbreviations[m.group()], text)
+        if self._collapse:
+            text = ' '.join(text.split())
+        return text
@@ -0,0 +1,104 @@
+import multiprocessing
+import multiprocessing.pool
+import os
+from collections import deque
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+from services.matcher import Matcher
+
+# The matcher inherited by each forked worker process
+_worker_matcher = None
+
+
+def _init_worker(matcher: Matcher):
+    global _worker_matcher
+    _worker_matcher = matcher
+
+
+def _match_chunk(descriptions: List[str]) -> List[Dict]:
+    return _worker_matcher.match_descriptions(descriptions)
+
+
+def _match_normalised_chunk(descriptions: List[str]) -> List[Dict]:
+    return [_worker_matcher._match_normalised(description)
+            for description in descriptions]
+
+
+class ParallelMatcher:
+    """Shards descriptions across a pool of forked worker processes.
+
+    Workers are forked after the catalogue has been loaded and prepared, so
+    each one inherits the matcher, its index and the listing counts through
+    copy-on-write memory instead of re-querying the database or unpickling
+    the catalogue.
+    """
+
+    def __init__(self, matcher: Matcher, workers: int = None,
+                 chunk_size: int = 1000):
+        """
+        Initialize the parallel matcher.
+
+        :param matcher: Matcher over a loaded VehicleDatabase
+        :param workers: Number of worker processes (default: CPU count)
+        :param chunk_size: Number of descriptions sent to a worker per task
+        """
+        self.matcher = matcher
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def pool(self) -> multiprocessing.pool.Pool:
+        """
+        Fork a pool of workers over the matcher as it is now. The caller
+        prepares the matcher first and terminates the pool, e.g. with a
+        with statement.
+
+        :return: Pool for match_normalised
+        """
+        context = multiprocessing.get_context('fork')
+        return context.Pool(self.workers, initializer=_init_worker,
+                            initargs=(self.matcher,))
+
+    def match_descriptions(self, descriptions: Iterable[str]) -> Iterator[Dict]:
+        """
+        Match vehicle descriptions in parallel, yielding results in input
+        order.
+
+        At most two chunks per worker are in flight at a time, so the input
+        is consumed lazily and memory stays bounded for long inputs.
+
+        :param descriptions: Iterable of vehicle description strings
+        :return: Iterator of result dictionaries as from
+            Matcher.match_descriptions
+        """
+        # Build the index in the parent so every worker inherits it
+        self.matcher.prepare()
+        with self.pool() as pool:
+            yield from self._map(pool, _match_chunk, descriptions)
+
+    def match_normalised(self, pool: multiprocessing.pool.Pool,
+                         descriptions: Iterable[str]) -> Iterator[Dict]:
+        """
+        Match already normalised descriptions on a pool from pool(),
+        bypassing the workers' caches, yielding results in input order.
+
+        :param pool: Worker pool returned by pool()
+        :param descriptions: Iterable of normalised descriptions
+        :return: Iterator of dictionaries of vehicle_id, confidence and,
+            for a match, listing_count
+        """
+        return self._map(pool, _match_normalised_chunk, descriptions)
+
+    def _map(self, pool: multiprocessing.pool.Pool, function,
+             descriptions: Iterable[str]) -> Iterator[Dict]:
+        descriptions = iter(descriptions)
+        pending = deque()
+        while True:
+            while len(pending) < self.workers * 2:
+                chunk = list(islice(descriptions, self.chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.apply_async(function, (chunk,)))
+            if not pending:
+                break
+            yield from pending.popleft().get()
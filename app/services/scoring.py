@@ -0,0 +1,239 @@
+import json
+from bisect import bisect_left
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from services.fuzzy import FuzzyVocabulary
+from services.index import VehicleIndex
+from models.vehicle import VehicleRow
+
+# How a field's value matches a description:
+# - substring: the whole value occurs anywhere in the description
+# - word: a word of the value is a word of the description
+# - prefix: as word, or a description word of at least min_prefix_length
+#   characters starts a word of the value ("ulti" matches "ultimate")
+# - fuzzy: as word, or a description word is within max_edit_distance edits
+#   of a word of the value, under the FuzzyVocabulary length rules
+MATCH_MODES = ("substring", "word", "prefix", "fuzzy")
+
+# A scored field, its weight and its match mode
+FieldRule = namedtuple("FieldRule", ["field", "weight", "mode"])
+
+DEFAULT_RULES = (
+    FieldRule("make", 3, "substring"),
+    FieldRule("model", 2, "substring"),
+    FieldRule("badge", 2, "word"),
+    FieldRule("transmission_type", 1, "substring"),
+    FieldRule("fuel_type", 1, "substring"),
+    FieldRule("drive_type", 1, "substring"),
+)
+
+
+class ScoringPlan:
+    """The fields a vehicle is scored on, their weights and match modes.
+
+    Substring fields become the phrase fields of the feature table and every
+    other mode a word field. The plan is compiled once into a scoring
+    function with the field positions and weights inlined, and the maximum
+    score behind the confidence is summed once.
+    """
+
+    def __init__(self, rules: Iterable[FieldRule] = DEFAULT_RULES,
+                 min_prefix_length: int = 3, max_edit_distance: int = 1):
+        """
+        :param rules: FieldRule per scored field, in scoring order
+        :param min_prefix_length: Shortest description word matched as a
+            prefix by prefix fields
+        :param max_edit_distance: Most edits tolerated by fuzzy fields
+        """
+        self.rules = tuple(FieldRule(*rule) for rule in rules)
+        self.min_prefix_length = min_prefix_length
+        self.max_edit_distance = max_edit_distance
+
+        seen = set()
+        for rule in self.rules:
+            if rule.field not in VehicleRow._fields[1:]:
+                raise ValueError(f"Unknown vehicle field: {rule.field}")
+            if rule.field in seen:
+                raise ValueError(f"Field scored twice: {rule.field}")
+            if rule.mode not in MATCH_MODES:
+                raise ValueError(f"Unknown match mode: {rule.mode}")
+            if not isinstance(rule.weight, int) or rule.weight < 0:
+                raise ValueError(f"Weight must be a non-negative integer: "
+                                 f"{rule.field}")
+            seen.add(rule.field)
+
+        phrase_rules = [rule for rule in self.rules
+                        if rule.mode == "substring"]
+        word_rules = [rule for rule in self.rules if rule.mode != "substring"]
+        self.phrase_fields = tuple(rule.field for rule in phrase_rules)
+        self.phrase_weights = tuple(rule.weight for rule in phrase_rules)
+        self.word_fields = tuple(rule.field for rule in word_rules)
+        self.word_weights = tuple(rule.weight for rule in word_rules)
+        self.word_modes = tuple(rule.mode for rule in word_rules)
+        self.max_score = sum(rule.weight for rule in self.rules)
+        self.score = self._compile()
+
+    @classmethod
+    def from_dict(cls, config: Dict) -> 'ScoringPlan':
+        """
+        Create a plan from its configuration, e.g.
+        {"fields": {"make": {"weight": 3, "mode": "substring"},
+                    "badge": {"weight": 2, "mode": "prefix"}},
+         "min_prefix_length": 3, "max_edit_distance": 1}.
+        Fields are scored in the order given.
+
+        :param config: Configuration dictionary
+        :return: ScoringPlan for the configuration
+        """
+        fields = config.get("fields")
+        if not isinstance(fields, dict) or not fields:
+            raise ValueError("Scoring plan needs a non-empty \"fields\" object")
+        return cls([FieldRule(field, rule.get("weight", 1),
+                              rule.get("mode", "substring"))
+                    for field, rule in fields.items()],
+                   config.get("min_prefix_length", 3),
+                   config.get("max_edit_distance", 1))
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ScoringPlan':
+        """
+        Create a plan from a JSON configuration file, as for from_dict.
+
+        :param path: Path of the JSON file
+        :return: ScoringPlan for the configuration
+        """
+        with open(path, 'r') as f:
+            config = json.load(f)
+        if not isinstance(config, dict):
+            raise ValueError(f"Scoring plan must be a JSON object: {path}")
+        return cls.from_dict(config)
+
+    @property
+    def field_weights(self) -> Dict[str, int]:
+        return {rule.field: rule.weight for rule in self.rules}
+
+    def _compile(self) -> Callable:
+        """
+        Generate the scoring function, one inlined test per weighted field:
+
+            def score(features, description, field_words):
+                phrases = features.phrases
+                words = features.words
+                score = 0
+                if phrases[0] in description:
+                    score += 3
+                ...
+                if not field_words[0].isdisjoint(words[0]):
+                    score += 2
+                return score
+
+        :return: Function of (VehicleFeatures, lowercased description,
+            description words per word field) returning the score
+        """
+        lines = ["def score(features, description, field_words):",
+                 "    phrases = features.phrases",
+                 "    words = features.words",
+                 "    score = 0"]
+        for field, weight in enumerate(self.phrase_weights):
+            if weight:
+                lines += [f"    if phrases[{field}] in description:",
+                          f"        score += {weight}"]
+        for field, weight in enumerate(self.word_weights):
+            if weight:
+                lines += [f"    if not field_words[{field}].isdisjoint("
+                          f"words[{field}]):",
+                          f"        score += {weight}"]
+        lines.append("    return score")
+        namespace = {}
+        exec(compile("\n".join(lines), "<scoring plan>", "exec"), namespace)
+        return namespace["score"]
+
+    def confidence(self, score: int) -> int:
+        """
+        Convert a raw match score to a confidence from 0 to 10.
+
+        :param score: Raw matching score
+        :return: int: Confidence score scaled to 0-10 range
+        """
+        max_score = self.max_score
+        return min(10, round((score / max_score) * 10)) if max_score > 0 else 0
+
+
+class WordExpander:
+    """Resolves the description words each word field of a plan matches.
+
+    Word fields test the description's own words. Prefix and fuzzy fields
+    test the catalogue words of that field the description words reach,
+    found through a sorted vocabulary or a deletion dictionary, so scoring
+    stays a set intersection.
+    """
+
+    def __init__(self, plan: ScoringPlan, index: VehicleIndex):
+        """
+        Build the vocabulary of each prefix and fuzzy field.
+
+        :param plan: ScoringPlan the index was built for
+        :param index: VehicleIndex over the loaded catalogue
+        """
+        self.plan = plan
+        self.index = index
+        self.sorted_words: List[List[str]] = []
+        self.fuzzy: List[FuzzyVocabulary] = []
+        self.expands = any(mode != "word" for mode in plan.word_modes)
+        # Snapshots, as a concurrent refresh may add and remove words; plans
+        # of whole words only need neither, nor to read every posting list
+        word_masks = list(index.word_masks.items()) if self.expands else []
+        postings = dict(index.words) if self.expands else {}
+        for field, mode in enumerate(plan.word_modes):
+            words = ({} if mode == "word" else
+                     {word: len(postings[word]) for word, mask in word_masks
+                      if mask >> field & 1 and word in postings})
+            self.sorted_words.append(sorted(words) if mode == "prefix" else [])
+            self.fuzzy.append(FuzzyVocabulary(words, plan.max_edit_distance)
+                              if mode == "fuzzy" else None)
+
+    def expand(self, description_words: Set[str]) -> Tuple[Set[str], ...]:
+        """
+        :param description_words: Whitespace-separated words of the
+            lowercased description
+        :return: The set of words each word field matches against
+        """
+        if not self.expands:
+            return (description_words,) * len(self.plan.word_modes)
+        return tuple(self._expand(field, mode, description_words)
+                     for field, mode in enumerate(self.plan.word_modes))
+
+    def _expand(self, field: int, mode: str,
+                description_words: Set[str]) -> Set[str]:
+        if mode == "word":
+            return description_words
+        if mode == "fuzzy":
+            vocabulary = self.fuzzy[field]
+            found = set()
+            for word in description_words:
+                found |= vocabulary.matches(word)
+            return found
+
+        found = set(description_words)
+        vocabulary = self.sorted_words[field]
+        for word in description_words:
+            if len(word) < self.plan.min_prefix_length:
+                continue
+            at = bisect_left(vocabulary, word)
+            while at < len(vocabulary) and vocabulary[at].startswith(word):
+                found.add(vocabulary[at])
+                at += 1
+        return found
+
+    @staticmethod
+    def lookup_words(description_words: Set[str],
+                     field_words: Tuple[Set[str], ...]) -> Set[str]:
+        """
+        :return: Every word any field matches, for the index lookup
+        """
+        words = description_words
+        for expanded in field_words:
+            if expanded is not description_words:
+                words = words | expanded
+        return words
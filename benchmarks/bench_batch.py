@@ -0,0 +1,45 @@
+"""Throughput of the vectorised batch scorer against per-description matching.
+
+Usage: python benchmarks/bench_batch.py [--sizes 59 10000] [--descriptions 20000]
+"""
+import argparse
+import time
+
+from synthetic import (SyntheticDatabase, sample_listing_counts,
+                       synthetic_descriptions, synthetic_listing_counts,
+                       synthetic_vehicles)
+from services.matcher import Matcher
+from services.normaliser import Normaliser
+
+
+def run(size: int, count: int, batch_size: int):
+    vehicles = synthetic_vehicles(size)
+    listing_counts = (sample_listing_counts() if size <= 59
+                      else synthetic_listing_counts(vehicles))
+    matcher = Matcher(SyntheticDatabase(vehicles, listing_counts), Normaliser(),
+                      cache_size=0)
+    descriptions = synthetic_descriptions(count)
+    matcher._get_batch_scorer()
+
+    start = time.perf_counter()
+    expected = matcher.match_descriptions(descriptions)
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = matcher.match_descriptions_batch(descriptions, batch_size)
+    batch = time.perf_counter() - start
+
+    assert results == expected
+    print(f"{size:>8} vehicles x {count} descriptions  "
+          f"per-description {count / serial:9.0f}/s  "
+          f"batch {count / batch:9.0f}/s  speedup {serial / batch:5.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[59, 10000])
+    parser.add_argument('--descriptions', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.descriptions, args.batch_size)
@@ -0,0 +1,73 @@
+"""Make/model blocking: vehicles scored per description and latency, with and
+without blocking, on the bundled data and on a synthetic catalogue.
+
+Results are asserted identical to the unblocked matcher.
+
+Usage: python benchmarks/bench_blocking.py [--vehicles 100000]
+           [--descriptions 500]
+"""
+import argparse
+import time
+
+from synthetic import (SyntheticDatabase, sample_descriptions,
+                       sample_listing_counts, sample_vehicles,
+                       synthetic_descriptions, synthetic_listing_counts,
+                       synthetic_vehicles)
+from services.matcher import Matcher
+from services.normaliser import Normaliser
+
+
+def run(db: SyntheticDatabase, descriptions: list, block_fields: list):
+    matcher = Matcher(db, Normaliser(), cache_size=0)
+    matcher.block_fields = block_fields
+    matcher.prepare()
+    matcher._get_position_counts()
+
+    start = time.perf_counter()
+    results = matcher.match_descriptions(descriptions)
+    elapsed = time.perf_counter() - start
+
+    scored = 0
+    score_features = matcher._score_features
+
+    def counting(*args):
+        nonlocal scored
+        scored += 1
+        return score_features(*args)
+
+    matcher._score_features = counting
+    matcher.match_descriptions(descriptions)
+    return results, elapsed, scored
+
+
+def compare(name: str, db: SyntheticDatabase, descriptions: list):
+    unblocked, unblocked_time, unblocked_scored = run(db, descriptions, [])
+    blocked, blocked_time, blocked_scored = run(db, descriptions,
+                                                ['make', 'model'])
+    assert blocked == unblocked
+    count = len(descriptions)
+    print(f"{name:<28} scored/desc {unblocked_scored / count:9.1f} -> "
+          f"{blocked_scored / count:9.1f} "
+          f"({1 - blocked_scored / unblocked_scored:5.1%} fewer), "
+          f"{unblocked_time / count * 1e3:7.2f} -> "
+          f"{blocked_time / count * 1e3:7.2f} ms/desc")
+
+
+def main(vehicles: int, count: int):
+    sample = {v.id: v for v in sample_vehicles()}
+    compare(f"bundled ({len(sample)} vehicles)",
+            SyntheticDatabase(sample, sample_listing_counts()),
+            sample_descriptions())
+
+    catalogue = synthetic_vehicles(vehicles)
+    compare(f"synthetic ({vehicles} vehicles)",
+            SyntheticDatabase(catalogue, synthetic_listing_counts(catalogue)),
+            synthetic_descriptions(count))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=100000)
+    parser.add_argument('--descriptions', type=int, default=500)
+    args = parser.parse_args()
+    main(args.vehicles, args.descriptions)
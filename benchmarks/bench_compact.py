@@ -0,0 +1,164 @@
+"""Catalogue memory per vehicle: ORM instances, dict of VehicleRow and
+compact dictionary-encoded columns, loaded from a SQLite stand-in for
+Postgres.
+
+Each vehicle gets up to two listings, to keep the database small. Each
+representation is loaded in its own process. Retained memory is
+measured with tracemalloc and peak RSS growth with getrusage, for the
+catalogue alone and for the whole process once the matcher's feature table
+and index are prepared over it, as they are before serving. Matching
+results over the compact catalogue are asserted identical.
+
+Usage: python benchmarks/bench_compact.py [--vehicles 1000000]
+           [--descriptions 500]
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from synthetic import (synthetic_descriptions, synthetic_listing_counts,
+                       synthetic_vehicles)
+from db.connector import Base
+from models import Listing, Vehicle, VehicleDatabase
+from services.matcher import Matcher
+from services.normaliser import Normaliser
+
+
+def build(path: str, count: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    vehicles = synthetic_vehicles(count)
+    with engine.begin() as connection:
+        connection.execute(insert(Vehicle), [
+            v._asdict() for v in vehicles.values()])
+        connection.execute(insert(Listing), [
+            {'id': f"{vehicle_id}-{i}", 'vehicle_id': vehicle_id,
+             'url': "", 'price': "0", 'kms': "0"}
+            for vehicle_id, listings in
+            synthetic_listing_counts(vehicles).items()
+            for i in range(min(listings, 2))])
+
+
+def session(path: str):
+    return sessionmaker(bind=create_engine(f"sqlite:///{path}"))()
+
+
+def load(path: str, representation: str):
+    if representation == "orm":
+        vehicles = {v.id: v for v in session(path).query(Vehicle).all()}
+        return SimpleNamespace(vehicles=vehicles, listing_counts={})
+    db = VehicleDatabase(compact=representation == "compact")
+    db.session = session(path)
+    db.load_data(release_connection=True)
+    return db
+
+
+def prepare(db) -> Matcher:
+    matcher = Matcher(db, Normaliser(), cache_size=0)
+    matcher.prepare()
+    return matcher
+
+
+def measure(path: str, representation: str, queue):
+    """Retained memory and peak RSS growth of the catalogue alone, then of
+    the whole process once the matcher is prepared over it."""
+    gc.collect()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    db = load(path, representation)
+    elapsed = time.perf_counter() - start
+    grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+    matcher = prepare(db)
+    prepared_grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+    del db, matcher
+    gc.collect()
+
+    tracemalloc.start()
+    db = load(path, representation)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    matcher = prepare(db)
+    gc.collect()
+    prepared = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    queue.put((len(db.vehicles), elapsed, retained, grown * 1024,
+               prepared, prepared_grown * 1024))
+
+
+def in_process(target, *args):
+    queue = multiprocessing.get_context('fork').Queue()
+    process = multiprocessing.get_context('fork').Process(
+        target=target, args=args + (queue,))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def check_matches(path: str, count: int):
+    """Match over both representations and time the ID lookups."""
+    descriptions = synthetic_descriptions(count)
+    results = {}
+    for compact in (False, True):
+        db = VehicleDatabase(compact=compact)
+        db.session = session(path)
+        db.load_data(release_connection=True)
+        matcher = Matcher(db, Normaliser(), cache_size=0)
+        start = time.perf_counter()
+        matcher.prepare()
+        prepare = time.perf_counter() - start
+        results[compact] = matcher.match_descriptions(descriptions)
+        matching = []
+        for _ in range(3):
+            start = time.perf_counter()
+            matcher.match_descriptions(descriptions)
+            matching.append((time.perf_counter() - start) / count)
+        matching = min(matching)
+        ids = list(db.vehicles)[::97]
+        start = time.perf_counter()
+        for vehicle_id in ids:
+            db.vehicles[vehicle_id]
+            db.listing_counts.get(vehicle_id, 0)
+        lookup = (time.perf_counter() - start) / len(ids)
+        print(f"{'compact' if compact else 'rows':<8} prepare {prepare:6.2f}s, "
+              f"match {matching * 1e3:.2f} ms/desc, "
+              f"lookup {lookup * 1e6:.2f} us/vehicle")
+    assert results[True] == results[False]
+
+
+def main(count: int, descriptions: int):
+    path = os.path.join(tempfile.mkdtemp(), "catalogue.db")
+    build(path, count)
+    baseline = prepared_baseline = None
+    for representation in ("orm", "rows", "compact"):
+        vehicles, elapsed, retained, grown, prepared, prepared_grown = (
+            in_process(measure, path, representation))
+        baseline = baseline or retained
+        prepared_baseline = prepared_baseline or prepared
+        print(f"{representation:<8} {vehicles} vehicles: load {elapsed:6.2f}s, "
+              f"retained {retained / vehicles:7.1f} B/vehicle "
+              f"({baseline / retained:5.1f}x less than orm), "
+              f"peak RSS +{grown / 2 ** 20:.0f} MB")
+        print(f"{'':<8} prepared: retained {prepared / vehicles:7.1f} "
+              f"B/vehicle ({prepared_baseline / prepared:5.1f}x less than "
+              f"orm), matcher {(prepared - retained) / vehicles:7.1f} "
+              f"B/vehicle, peak RSS +{prepared_grown / 2 ** 20:.0f} MB")
+    check_matches(path, descriptions)
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=1000000)
+    parser.add_argument('--descriptions', type=int, default=500)
+    args = parser.parse_args()
+    main(args.vehicles, args.descriptions)
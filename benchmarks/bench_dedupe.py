@@ -0,0 +1,85 @@
+"""Deduplicate-then-fan-out matching against matching every line, on a
+skewed feed where a few descriptions account for most lines.
+
+Lines are drawn with Zipf weights from distinct descriptions of catalogue
+vehicles, and half are re-cased so that equal descriptions differ before
+normalisation.
+
+Usage: python benchmarks/bench_dedupe.py [--vehicles 10000] [--lines 100000]
+    [--distinct 20000] [--skew 1.1]
+"""
+import argparse
+import random
+import time
+
+from synthetic import (SyntheticDatabase, synthetic_listing_counts,
+                       synthetic_vehicles)
+from services.dedupe import DeduplicatingMatcher
+from services.matcher import Matcher
+from services.normaliser import Normaliser
+
+
+def distinct_descriptions(catalogue, count: int, seed: int = 0):
+    """Descriptions naming a random vehicle's make, model and a subset of
+    its other fields, all distinct."""
+    rng = random.Random(seed)
+    vehicles = list(catalogue.values())
+    descriptions = set()
+    while len(descriptions) < count:
+        vehicle = rng.choice(vehicles)
+        extra = [value for value in (vehicle.badge, vehicle.transmission_type,
+                                     vehicle.fuel_type, vehicle.drive_type)
+                 if rng.random() < 0.5]
+        descriptions.add(' '.join([vehicle.make, vehicle.model] + extra))
+    return sorted(descriptions)
+
+
+def skewed_feed(catalogue, lines: int, distinct: int, skew: float,
+                seed: int = 0):
+    rng = random.Random(seed)
+    descriptions = distinct_descriptions(catalogue, distinct, seed)
+    rng.shuffle(descriptions)
+    weights = [1 / rank ** skew for rank in range(1, distinct + 1)]
+    feed = rng.choices(descriptions, weights, k=lines)
+    return [line.upper() if rng.random() < 0.5 else line for line in feed]
+
+
+def main(vehicles: int, lines: int, distinct: int, skew: float):
+    catalogue = synthetic_vehicles(vehicles)
+    db = SyntheticDatabase(catalogue, synthetic_listing_counts(catalogue))
+    feed = skewed_feed(catalogue, lines, distinct, skew)
+
+    timings = {}
+    results = {}
+    for name, cache_size in (("per line, no cache", 0),
+                             ("per line, LRU 10000", 10000)):
+        matcher = Matcher(db, Normaliser(), cache_size)
+        matcher.prepare()
+        start = time.perf_counter()
+        results[name] = matcher.match_descriptions(feed)
+        timings[name] = time.perf_counter() - start
+
+    deduplicator = DeduplicatingMatcher(Matcher(db, Normaliser(), 0))
+    deduplicator.matcher.prepare()
+    start = time.perf_counter()
+    results["dedupe"] = list(deduplicator.match_descriptions(feed))
+    timings["dedupe"] = time.perf_counter() - start
+
+    assert results["dedupe"] == results["per line, no cache"]
+    assert results["dedupe"] == results["per line, LRU 10000"]
+    print(f"{lines} lines of {distinct} descriptions (skew {skew}) x "
+          f"{vehicles} vehicles")
+    for name, elapsed in timings.items():
+        print(f"{name:20} {elapsed:7.2f}s  {elapsed / lines * 1e6:7.1f} "
+              f"us/line")
+    print(deduplicator.stats.summary())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=10000)
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--distinct', type=int, default=20000)
+    parser.add_argument('--skew', type=float, default=1.1)
+    args = parser.parse_args()
+    main(args.vehicles, args.lines, args.distinct, args.skew)
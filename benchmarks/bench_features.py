@@ -0,0 +1,74 @@
+"""Scoring over the precomputed feature table against per-call ORM attribute
+access, on the bundled catalogue and input.txt scaled up.
+
+Usage: python benchmarks/bench_features.py [--descriptions 100000]
+"""
+import argparse
+import time
+
+from synthetic import (SyntheticDatabase, sample_descriptions,
+                       sample_listing_counts, sample_vehicles)
+from models.vehicle import Vehicle
+from services.matcher import Matcher
+from services.normaliser import Normaliser
+
+
+def legacy_score(matcher: Matcher, vehicle: Vehicle, description: str) -> int:
+    """_calculate_score as it was before the feature table."""
+    score = 0
+    description = description.lower()
+    for field, weight in matcher.field_weights.items():
+        value = getattr(vehicle, field, '').lower()
+        if field not in matcher.partial_match_fields and value in description:
+            score += weight
+        elif field in matcher.partial_match_fields:
+            desc_words = set(description.split())
+            badge_words = set(value.split())
+            matched_words = [word for word in badge_words
+                             if any(desc_word == word for desc_word in
+                                    desc_words)]
+            if matched_words:
+                score += weight
+    return score
+
+
+def legacy_find(matcher: Matcher, description: str) -> list:
+    matches = []
+    vehicles = matcher.db.vehicles
+    for vehicle_id in matcher._get_index().candidates(description):
+        score = legacy_score(matcher, vehicles[vehicle_id], description)
+        if score > 0:
+            matches.append({
+                'id': vehicle_id,
+                'score': score,
+                'listing_count': matcher.db.listing_counts.get(vehicle_id, 0)
+            })
+    return matches
+
+
+def main(count: int):
+    vehicles = {v.id: Vehicle(**v._asdict()) for v in sample_vehicles()}
+    matcher = Matcher(SyntheticDatabase(vehicles, sample_listing_counts()),
+                      Normaliser())
+    sample = [matcher.normaliser.preprocess(d) for d in sample_descriptions()]
+    descriptions = (sample * (count // len(sample) + 1))[:count]
+    matcher._get_index()
+
+    start = time.perf_counter()
+    legacy = [legacy_find(matcher, d) for d in descriptions]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    current = [matcher._find_potential_matches(d) for d in descriptions]
+    current_time = time.perf_counter() - start
+
+    assert legacy == current
+    print(f"{count} descriptions x {len(vehicles)} vehicles: "
+          f"ORM getattr {legacy_time:.2f}s, feature table {current_time:.2f}s, "
+          f"speedup {legacy_time / current_time:.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--descriptions', type=int, default=100000)
+    main(parser.parse_args().descriptions)
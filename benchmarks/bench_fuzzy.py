@@ -0,0 +1,108 @@
+"""Recall and latency of fuzzy matching on descriptions with injected typos.
+
+Each description gets one random edit (deletion, insertion, substitution or
+transposition) in one of its alphabetic words of five or more letters.
+Recall is the share of typo'd descriptions matched to the vehicle their
+clean form matches exactly. The share of clean descriptions whose match
+fuzzy matching changes is reported too; input.txt itself holds typos such as
+"Amrok", so some change is expected.
+
+Usage: python benchmarks/bench_fuzzy.py [--vehicles 100000]
+           [--descriptions 2000] [--distance 2]
+"""
+import argparse
+import random
+import string
+import time
+
+from synthetic import (SyntheticDatabase, sample_descriptions,
+                       sample_listing_counts, sample_vehicles,
+                       synthetic_descriptions, synthetic_listing_counts,
+                       synthetic_vehicles)
+from services.matcher import Matcher
+from services.normaliser import Normaliser
+
+
+def add_typo(description: str, rng: random.Random) -> str:
+    words = description.split()
+    eligible = [i for i, word in enumerate(words)
+                if len(word) >= 5 and word.isalpha()]
+    if not eligible:
+        return description
+    i = rng.choice(eligible)
+    word = words[i]
+    at = rng.randrange(len(word) - 1)
+    edit = rng.choice(("delete", "insert", "substitute", "transpose"))
+    if edit == "delete":
+        word = word[:at] + word[at + 1:]
+    elif edit == "insert":
+        word = word[:at] + rng.choice(string.ascii_lowercase) + word[at:]
+    elif edit == "substitute":
+        word = word[:at] + rng.choice(string.ascii_lowercase) + word[at + 1:]
+    else:
+        word = word[:at] + word[at + 1] + word[at] + word[at + 2:]
+    words[i] = word
+    return ' '.join(words)
+
+
+def ids(results: list) -> list:
+    return [result['vehicle_id'] for result in results]
+
+
+def compare(name: str, db: SyntheticDatabase, descriptions: list,
+            distance: int):
+    rng = random.Random(0)
+    typos = [add_typo(d, rng) for d in descriptions]
+    exact = Matcher(db, Normaliser(), cache_size=0)
+    fuzzy = Matcher(db, Normaliser(), cache_size=0,
+                    max_edit_distance=distance)
+    fuzzy._get_vocabulary()
+
+    truth = ids(exact.match_descriptions(descriptions))
+    start = time.perf_counter()
+    exact_typos = ids(exact.match_descriptions(typos))
+    exact_time = time.perf_counter() - start
+    start = time.perf_counter()
+    fuzzy_typos = ids(fuzzy.match_descriptions(typos))
+    fuzzy_time = time.perf_counter() - start
+    fuzzy_clean = ids(fuzzy.match_descriptions(descriptions))
+
+    words = [word for description in typos
+             for word in fuzzy.normaliser.preprocess(description).split()]
+    vocabulary = fuzzy._get_vocabulary()
+    start = time.perf_counter()
+    for word in words:
+        vocabulary.correct(word)
+    per_word = (time.perf_counter() - start) / len(words)
+
+    def recall(found):
+        return sum(a == b for a, b in zip(found, truth)) / len(truth)
+
+    count = len(descriptions)
+    print(f"{name}: recall exact {recall(exact_typos):6.1%} -> "
+          f"fuzzy {recall(fuzzy_typos):6.1%}, clean changed "
+          f"{1 - recall(fuzzy_clean):5.1%}; "
+          f"{exact_time / count * 1e3:.2f} -> {fuzzy_time / count * 1e3:.2f} "
+          f"ms/desc, correction {per_word * 1e6:.1f} us/word "
+          f"({len(vocabulary.frequencies)} words)")
+
+
+def main(vehicles: int, count: int, distance: int):
+    sample = {v.id: v for v in sample_vehicles()}
+    compare(f"bundled ({len(sample)} vehicles)",
+            SyntheticDatabase(sample, sample_listing_counts()),
+            sample_descriptions() * 20, distance)
+
+    catalogue = synthetic_vehicles(vehicles)
+    compare(f"synthetic ({vehicles} vehicles)",
+            SyntheticDatabase(catalogue, synthetic_listing_counts(catalogue)),
+            synthetic_descriptions(count), distance)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=100000)
+    parser.add_argument('--descriptions', type=int, default=2000)
+    parser.add_argument('--distance', type=int, default=2)
+    args = parser.parse_args()
+    main(args.vehicles, args.descriptions, args.distance)
@@ -0,0 +1,68 @@
+"""Per-description latency of the indexed matcher against a full catalogue scan.
+
+Usage: python benchmarks/bench_index.py [--sizes 1000 100000 1000000]
+"""
+import argparse
+import time
+
+from synthetic import (SyntheticDatabase, sample_descriptions,
+                       synthetic_listing_counts, synthetic_vehicles)
+from services.matcher import Matcher
+from services.normaliser import Normaliser
+
+
+def full_scan(matcher: Matcher, description: str) -> list:
+    """Score every vehicle, as _find_potential_matches did before the index."""
+    matches = []
+    for vehicle_id, vehicle in matcher.db.vehicles.items():
+        score = matcher._calculate_score(vehicle, description)
+        if score > 0:
+            matches.append({
+                'id': vehicle_id,
+                'score': score,
+                'listing_count': matcher.db.listing_counts.get(vehicle_id, 0)
+            })
+    return matches
+
+
+def run(size: int, scan_limit: int):
+    vehicles = synthetic_vehicles(size)
+    db = SyntheticDatabase(vehicles, synthetic_listing_counts(vehicles))
+    matcher = Matcher(db, Normaliser())
+    descriptions = [matcher.normaliser.preprocess(d)
+                    for d in sample_descriptions()]
+
+    start = time.perf_counter()
+    index = matcher._get_index()
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    candidates = 0
+    indexed = []
+    for description in descriptions:
+        candidates += len(index.candidates(description))
+        indexed.append(matcher._find_potential_matches(description))
+    per_indexed = (time.perf_counter() - start) / len(descriptions)
+
+    scanned = descriptions[:scan_limit]
+    start = time.perf_counter()
+    for description, expected in zip(scanned, indexed):
+        assert full_scan(matcher, description) == expected, description
+    per_scan = (time.perf_counter() - start) / max(1, len(scanned))
+
+    print(f"{size:>9} vehicles  build {build:7.2f}s  "
+          f"candidates {candidates / len(descriptions) / size:6.1%}  "
+          f"indexed {per_indexed * 1000:9.2f} ms/desc  "
+          f"full scan {per_scan * 1000:9.2f} ms/desc  "
+          f"speedup {per_scan / per_indexed:5.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 100000, 1000000])
+    parser.add_argument('--scan-limit', type=int, default=4,
+                        help='descriptions timed (and checked) on the full scan')
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.scan_limit)
@@ -0,0 +1,70 @@
+"""Cold-start catalogue load: ORM instances against column-projected rows,
+on a SQLite stand-in for Postgres.
+
+Each step runs in its own process so peak memory is measured separately.
+
+Usage: python benchmarks/bench_load.py [--vehicles 1000000]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from synthetic import synthetic_vehicles
+from db.connector import Base
+from models import Vehicle, VehicleDatabase
+
+
+def build(path: str, count: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Vehicle), [
+            v._asdict() for v in synthetic_vehicles(count).values()])
+
+
+def load_rows(path: str):
+    db = VehicleDatabase()
+    db.session = sessionmaker(bind=create_engine(f"sqlite:///{path}"))()
+    db.load_data(release_connection=True)
+    return len(db.vehicles)
+
+
+def load_orm(path: str):
+    session = sessionmaker(bind=create_engine(f"sqlite:///{path}"))()
+    return len({v.id: v for v in session.query(Vehicle).all()})
+
+
+def measure(name: str, loader, path: str):
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    count = loader(path)
+    elapsed = time.perf_counter() - start
+    grown = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) / 1024
+    print(f"{name:<5} {count} vehicles: {elapsed:6.2f}s, +{grown:.0f} MB peak")
+
+
+def in_process(target, *args):
+    process = multiprocessing.get_context('fork').Process(
+        target=target, args=args)
+    process.start()
+    process.join()
+
+
+def main(count: int):
+    path = os.path.join(tempfile.mkdtemp(), "catalogue.db")
+    in_process(build, path, count)
+    in_process(measure, "rows", load_rows, path)
+    in_process(measure, "ORM", load_orm, path)
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=1000000)
+    main(parser.parse_args().vehicles)
@@ -0,0 +1,59 @@
+"""Instrumentation overhead: matching with metrics disabled, enabled, and
+enabled under the sampling profiler.
+
+Usage: python benchmarks/bench_metrics.py [--vehicles 100000]
+           [--descriptions 2000] [--repeat 5]
+"""
+import argparse
+import time
+
+from synthetic import (SyntheticDatabase, synthetic_descriptions,
+                       synthetic_listing_counts, synthetic_vehicles)
+from services.matcher import Matcher
+from services.metrics import Metrics, SamplingProfiler
+from services.normaliser import Normaliser
+
+
+def best_time(matcher: Matcher, descriptions: list, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        matcher.match_descriptions(descriptions)
+        times.append(time.perf_counter() - start)
+    return min(times) / len(descriptions)
+
+
+def main(vehicles: int, count: int, repeat: int):
+    catalogue = synthetic_vehicles(vehicles)
+    matcher = Matcher(SyntheticDatabase(
+        catalogue, synthetic_listing_counts(catalogue)), Normaliser(),
+        cache_size=0)
+    descriptions = synthetic_descriptions(count)
+    matcher.prepare()
+    matcher.match_descriptions(descriptions)
+
+    disabled = best_time(matcher, descriptions, repeat)
+    metrics = Metrics()
+    matcher.instrument(metrics)
+    enabled = best_time(matcher, descriptions, repeat)
+    with SamplingProfiler() as profiler:
+        profiled = best_time(matcher, descriptions, repeat)
+
+    print(f"{count} descriptions x {vehicles} vehicles: "
+          f"disabled {disabled * 1e3:.3f} ms/desc, "
+          f"enabled {enabled * 1e3:.3f} ms/desc "
+          f"({enabled / disabled - 1:+.1%}), "
+          f"profiled {profiled * 1e3:.3f} ms/desc "
+          f"({profiled / disabled - 1:+.1%}, "
+          f"{sum(profiler.samples.values())} samples)")
+    for line in metrics.summary():
+        print(f"  {line}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=100000)
+    parser.add_argument('--descriptions', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    main(args.vehicles, args.descriptions, args.repeat)
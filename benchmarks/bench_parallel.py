@@ -0,0 +1,52 @@
+"""Scaling of ParallelMatcher from one worker to every core.
+
+Prints throughput, speedup over one worker and per-worker efficiency.
+Rows with more workers than cores measure scheduling overhead, not
+scaling, and are marked as oversubscribed.
+
+Usage: python benchmarks/bench_parallel.py [--descriptions 2000000] [--workers 1 2 4 8]
+"""
+import argparse
+import os
+import time
+
+from synthetic import (SyntheticDatabase, synthetic_descriptions,
+                       synthetic_listing_counts, synthetic_vehicles)
+from services.matcher import Matcher
+from services.normaliser import Normaliser
+from services.parallel import ParallelMatcher
+
+
+def main(size: int, count: int, workers: list, chunk_size: int):
+    vehicles = synthetic_vehicles(size)
+    matcher = Matcher(SyntheticDatabase(vehicles,
+                                        synthetic_listing_counts(vehicles)),
+                      Normaliser())
+    descriptions = synthetic_descriptions(count)
+    matcher.prepare()
+
+    cores = os.cpu_count() or 1
+    print(f"{count} descriptions, {size} vehicles, {cores} cores")
+    baseline = None
+    for worker_count in workers:
+        parallel = ParallelMatcher(matcher, worker_count, chunk_size)
+        start = time.perf_counter()
+        matched = sum(1 for _ in parallel.match_descriptions(descriptions))
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        speedup = baseline / elapsed
+        print(f"{worker_count:>3} workers  {elapsed:7.2f}s  "
+              f"{matched / elapsed:9.0f}/s  speedup {speedup:4.2f}x  "
+              f"efficiency {speedup / worker_count:4.0%}"
+              + ("  oversubscribed" if worker_count > cores else ""))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=1000)
+    parser.add_argument('--descriptions', type=int, default=2000000)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+    main(args.vehicles, args.descriptions, args.workers, args.chunk_size)
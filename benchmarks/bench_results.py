@@ -0,0 +1,80 @@
+"""Result persistence: per-row ORM merges vs batched upserts, into a SQLite
+stand-in for Postgres.
+
+Each method writes the same results into a fresh table, then writes them
+again to time the all-conflict rerun.
+
+Usage: python benchmarks/bench_results.py [--results 200000]
+           [--batch-sizes 100 1000 5000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from synthetic import synthetic_vehicles
+from db.connector import Base
+from models import MatchResult, MatchResultWriter
+
+
+def synthetic_results(count: int) -> list:
+    vehicle_ids = list(synthetic_vehicles(5000))
+    return [{'input': f"description {i}",
+             'vehicle_id': vehicle_ids[i % len(vehicle_ids)],
+             'confidence': i % 11, 'listing_count': i % 7}
+            for i in range(count)]
+
+
+def new_session(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def orm_merge(session, results: list):
+    for result in results:
+        session.merge(MatchResult(**result))
+    session.commit()
+
+
+def timed(write, session, results: list) -> tuple:
+    times = []
+    for _ in range(2):
+        start = time.perf_counter()
+        write(session, results)
+        times.append(time.perf_counter() - start)
+    assert session.query(MatchResult).count() == len(results)
+    return tuple(times)
+
+
+def main(count: int, batch_sizes: list):
+    path = os.path.join(tempfile.mkdtemp(), "results.db")
+    results = synthetic_results(count)
+    methods = [("orm merge", orm_merge)] + [
+        (f"upsert {batch_size}",
+         lambda session, rows, batch_size=batch_size:
+         MatchResultWriter(session, batch_size).write_all(rows))
+        for batch_size in batch_sizes]
+    baseline = None
+    for name, write in methods:
+        session = new_session(path)
+        first, rerun = timed(write, session, results)
+        session.close()
+        baseline = baseline or first
+        print(f"{name:<12} {count} results: insert {count / first:9.0f}/s "
+              f"({baseline / first:5.1f}x), rerun {count / rerun:9.0f}/s")
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--results', type=int, default=200000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+',
+                        default=[100, 1000, 5000])
+    args = parser.parse_args()
+    main(args.results, args.batch_sizes)
@@ -0,0 +1,107 @@
+"""The compiled scoring plan against the interpreted field loop it replaced,
+and the end-to-end cost of prefix and fuzzy match modes.
+
+Usage: python benchmarks/bench_scoring.py [--descriptions 20000]
+"""
+import argparse
+import time
+
+from synthetic import (SyntheticDatabase, sample_descriptions,
+                       sample_listing_counts, sample_vehicles)
+from services.matcher import Matcher
+from services.normaliser import Normaliser
+from services.scoring import FieldRule, ScoringPlan
+
+
+def legacy_score(matcher: Matcher, features, description: str,
+                 field_words) -> int:
+    """_score_features as it was before scoring plans: a loop over the
+    fields and weights of every vehicle."""
+    score = 0
+    for value, weight in zip(features.phrases, matcher._phrase_weights):
+        if value in description:
+            score += weight
+    for words, weight in zip(features.words, matcher._word_weights):
+        if not words.isdisjoint(field_words[0]):
+            score += weight
+    return score
+
+
+def legacy_confidence(matcher: Matcher, score: int) -> int:
+    """_calculate_confidence as it was, summing the weights per call."""
+    max_score = sum(matcher.field_weights.values())
+    return min(10, round((score / max_score) * 10)) if max_score > 0 else 0
+
+
+def score_pairs(matcher: Matcher, descriptions):
+    """Every (features, description, field words) the heap path scores."""
+    index = matcher._get_index()
+    expander = matcher._get_expander()
+    pairs = []
+    for description in descriptions:
+        field_words = expander.expand(set(description.split()))
+        positions = index.lookup(description, field_words[0], 0)[0]
+        pairs += [(index.table.records[position], description, field_words)
+                  for position in positions]
+    return pairs
+
+
+def time_matching(matcher: Matcher, descriptions) -> float:
+    matcher.prepare()
+    start = time.perf_counter()
+    for description in descriptions:
+        matcher._top_candidates(description, 2)
+    return time.perf_counter() - start
+
+
+def main(count: int):
+    db = SyntheticDatabase({v.id: v for v in sample_vehicles()},
+                           sample_listing_counts())
+    normaliser = Normaliser()
+    sample = [normaliser.preprocess(d) for d in sample_descriptions()]
+    descriptions = (sample * (count // len(sample) + 1))[:count]
+
+    matcher = Matcher(db, normaliser)
+    pairs = score_pairs(matcher, descriptions)
+    start = time.perf_counter()
+    legacy = [legacy_confidence(matcher, legacy_score(matcher, *pair))
+              for pair in pairs]
+    legacy_time = time.perf_counter() - start
+    score = matcher.plan.score
+    confidence = matcher.plan.confidence
+    start = time.perf_counter()
+    compiled = [confidence(score(*pair)) for pair in pairs]
+    compiled_time = time.perf_counter() - start
+    assert legacy == compiled
+    print(f"{len(pairs)} vehicle scores: interpreted "
+          f"{legacy_time / len(pairs) * 1e9:.0f} ns, compiled "
+          f"{compiled_time / len(pairs) * 1e9:.0f} ns, speedup "
+          f"{legacy_time / compiled_time:.2f}x")
+
+    plans = {
+        "default": ScoringPlan(),
+        "prefix badge": ScoringPlan([
+            FieldRule("make", 3, "substring"),
+            FieldRule("model", 2, "substring"),
+            FieldRule("badge", 2, "prefix"),
+            FieldRule("transmission_type", 1, "substring"),
+            FieldRule("fuel_type", 1, "substring"),
+            FieldRule("drive_type", 1, "substring")]),
+        "fuzzy model+badge": ScoringPlan([
+            FieldRule("make", 3, "substring"),
+            FieldRule("model", 2, "fuzzy"),
+            FieldRule("badge", 2, "fuzzy"),
+            FieldRule("transmission_type", 1, "substring"),
+            FieldRule("fuel_type", 1, "substring"),
+            FieldRule("drive_type", 1, "substring")]),
+    }
+    for name, plan in plans.items():
+        elapsed = time_matching(Matcher(db, normaliser, plan=plan),
+                                descriptions)
+        print(f"{name:18} {elapsed / count * 1e6:7.1f} us/description")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--descriptions', type=int, default=20000)
+    main(parser.parse_args().descriptions)
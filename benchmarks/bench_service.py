@@ -0,0 +1,118 @@
+"""Latency and throughput of the HTTP matching service under a local load
+generator, with and without micro-batching.
+
+The server runs in a forked process over a synthetic catalogue. Clients are
+keep-alive connections on one event loop, each sending its next single-match
+request as soon as the previous response arrives. Batches are scored with the
+path the service picks for the catalogue size ("batch 64, 2 ms") and with the
+vectorised batch scorer forced ("... vectorised").
+
+Usage: python benchmarks/bench_service.py [--vehicles 10000]
+           [--clients 1 16 64] [--requests 2000]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import statistics
+import time
+
+from synthetic import (SyntheticDatabase, synthetic_descriptions,
+                       synthetic_listing_counts, synthetic_vehicles)
+from server import MatchServer
+from services.matcher import Matcher, Normaliser
+from services.microbatch import BATCH_SCORING_LIMIT, MicroBatcher
+
+VECTORISED = float('inf')
+CONFIGURATIONS = [
+    ("unbatched", 1, 0.0, BATCH_SCORING_LIMIT),
+    ("batch 64, 2 ms", 64, 0.002, BATCH_SCORING_LIMIT),
+    ("... vectorised", 64, 0.002, VECTORISED),
+]
+
+
+def run_server(vehicles: int, max_batch_size: int, max_wait: float,
+               batch_scoring_limit: float, port: int, ready):
+    catalogue = synthetic_vehicles(vehicles)
+    matcher = Matcher(SyntheticDatabase(
+        catalogue, synthetic_listing_counts(catalogue)), Normaliser(),
+        cache_size=0)
+    matcher.prepare()
+    if vehicles <= batch_scoring_limit:
+        matcher._get_batch_scorer()
+
+    async def serve():
+        server = MatchServer(MicroBatcher(matcher, max_batch_size, max_wait,
+                                          batch_scoring_limit))
+        await server.start("127.0.0.1", port)
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+async def client(port: int, requests: list, latencies: list):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for body in requests:
+        start = time.perf_counter()
+        writer.write(b"POST /match HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s"
+                     % (len(body), body))
+        length = 0
+        await reader.readline()
+        while (line := await reader.readline()) != b"\r\n":
+            if line.lower().startswith(b"content-length"):
+                length = int(line.split(b":")[1])
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def load(port: int, clients: int, bodies: list) -> tuple:
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, bodies[i::clients], latencies)
+                           for i in range(clients)))
+    return latencies, time.perf_counter() - start
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main(vehicles: int, client_counts: list, requests: int):
+    bodies = [json.dumps({'description': d}).encode()
+              for d in synthetic_descriptions(requests)]
+    context = multiprocessing.get_context('fork')
+    print(f"{vehicles} vehicles, {requests} requests per run")
+    for name, max_batch_size, max_wait, limit in CONFIGURATIONS:
+        if limit == VECTORISED and vehicles <= BATCH_SCORING_LIMIT:
+            continue
+        port = free_port()
+        ready = context.Event()
+        server = context.Process(target=run_server, args=(
+            vehicles, max_batch_size, max_wait, limit, port, ready))
+        server.start()
+        ready.wait()
+        try:
+            for clients in client_counts:
+                latencies, elapsed = asyncio.run(load(port, clients, bodies))
+                quantiles = statistics.quantiles(latencies, n=100)
+                print(f"{name:<15} {clients:>3} clients: "
+                      f"p50 {quantiles[49] * 1e3:7.2f} ms, "
+                      f"p99 {quantiles[98] * 1e3:7.2f} ms, "
+                      f"{len(latencies) / elapsed:7.0f} req/s")
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=10000)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    main(args.vehicles, args.clients, args.requests)
@@ -0,0 +1,97 @@
+"""Cold start from the database against cold start from a snapshot, with
+and without the saved match index, on a SQLite stand-in for Postgres.
+
+Each step runs in its own process so nothing is shared between them. After
+the first match, the mean latency of further matches shows the cost of
+slicing the saved postings from the file on each lookup. "verified" also
+checksums the whole snapshot on load.
+
+Usage: python benchmarks/bench_snapshot.py [--vehicles 1000000]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from synthetic import synthetic_descriptions, synthetic_vehicles
+from db.connector import Base
+from models import Vehicle, VehicleDatabase
+from models.snapshot import SnapshotDatabase, write_snapshot
+from services.matcher import Matcher, Normaliser
+
+
+def build(path: str, snapshot_path: str, index_snapshot_path: str,
+          count: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Vehicle), [
+            v._asdict() for v in synthetic_vehicles(count).values()])
+    db = database(path)
+    db.load_data(release_connection=True)
+    start = time.perf_counter()
+    write_snapshot(db, snapshot_path)
+    print(f"write snapshot: {time.perf_counter() - start:6.2f}s, "
+          f"{os.path.getsize(snapshot_path) / 2 ** 20:.0f} MB")
+    index = Matcher(db, Normaliser()).index
+    start = time.perf_counter()
+    write_snapshot(db, index_snapshot_path, index)
+    print(f"write snapshot with index: {time.perf_counter() - start:6.2f}s, "
+          f"{os.path.getsize(index_snapshot_path) / 2 ** 20:.0f} MB")
+
+
+def database(path: str) -> VehicleDatabase:
+    db = VehicleDatabase()
+    db.session = sessionmaker(bind=create_engine(f"sqlite:///{path}"))()
+    return db
+
+
+def measure(name: str, db, descriptions: list):
+    start = time.perf_counter()
+    db.load_data(release_connection=True)
+    loaded = time.perf_counter()
+    matcher = Matcher(db, Normaliser(), cache_size=0)
+    matcher.match_description(descriptions[0])
+    matched = time.perf_counter()
+    matcher.match_descriptions(descriptions[1:])
+    latency = (time.perf_counter() - matched) / (len(descriptions) - 1)
+    print(f"{name:<8} load {loaded - start:6.2f}s, "
+          f"first match {matched - start:6.2f}s, "
+          f"then {latency * 1e3:6.2f} ms/match")
+
+
+def in_process(target, *args):
+    process = multiprocessing.get_context('fork').Process(
+        target=target, args=args)
+    process.start()
+    process.join()
+
+
+def main(count: int):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "catalogue.db")
+    snapshot_path = os.path.join(directory, "catalogue.snap")
+    index_snapshot_path = os.path.join(directory, "indexed.snap")
+    descriptions = synthetic_descriptions(201)
+    in_process(build, path, snapshot_path, index_snapshot_path, count)
+    in_process(lambda: measure("database", database(path), descriptions))
+    in_process(lambda: measure("snapshot", SnapshotDatabase(snapshot_path),
+                               descriptions))
+    in_process(lambda: measure(
+        "indexed", SnapshotDatabase(index_snapshot_path), descriptions))
+    in_process(lambda: measure(
+        "verified", SnapshotDatabase(index_snapshot_path, verify=True),
+        descriptions))
+    os.remove(path)
+    os.remove(snapshot_path)
+    os.remove(index_snapshot_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=1000000)
+    main(parser.parse_args().vehicles)
@@ -0,0 +1,81 @@
+"""Best-match resolution: scoring every candidate into dicts against the
+bounded heap with early termination.
+
+Usage: python benchmarks/bench_topk.py [--vehicles 100000] [--descriptions 500]
+"""
+import argparse
+import time
+
+from synthetic import (SyntheticDatabase, synthetic_descriptions,
+                       synthetic_listing_counts, synthetic_vehicles)
+from services.matcher import Matcher
+from services.normaliser import Normaliser
+
+
+def resolve_all(matcher: Matcher, description: str):
+    """Build every candidate and pick the winner, as before the heap."""
+    matches = matcher._find_potential_matches(description)
+    if not matches:
+        return None
+    best = max(match['score'] for match in matches)
+    best_scoring = [match for match in matches if match['score'] == best]
+    winner = max(best_scoring, key=lambda match: match['listing_count'])
+    return winner['id'], best, len(best_scoring) > 1
+
+
+def resolve_top(matcher: Matcher, description: str):
+    top = matcher._top_candidates(description, 2, ties_only=True)
+    if not top:
+        return None
+    score, position = top[0]
+    return (matcher._index.table.vehicle_id(position), score,
+            len(top) > 1 and top[1][0] == score)
+
+
+def main(vehicles: int, count: int):
+    catalogue = synthetic_vehicles(vehicles)
+    matcher = Matcher(SyntheticDatabase(
+        catalogue, synthetic_listing_counts(catalogue)), Normaliser())
+    descriptions = [matcher.normaliser.preprocess(d)
+                    for d in synthetic_descriptions(count)]
+    matcher.prepare()
+    matcher._get_position_counts()
+
+    start = time.perf_counter()
+    expected = [resolve_all(matcher, d) for d in descriptions]
+    all_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [resolve_top(matcher, d) for d in descriptions]
+    top_time = time.perf_counter() - start
+    assert actual == expected
+
+    candidates = scored = 0
+    score_features = matcher._score_features
+
+    def counting(*args):
+        nonlocal scored
+        scored += 1
+        return score_features(*args)
+
+    matcher._score_features = counting
+    index = matcher._index
+    for description in descriptions:
+        lowered = description.lower()
+        candidates += len(index.candidate_positions(lowered,
+                                                    set(lowered.split())))
+        resolve_top(matcher, description)
+
+    print(f"{count} descriptions x {vehicles} vehicles: "
+          f"all candidates {all_time / count * 1e3:.2f} ms/desc, "
+          f"bounded heap {top_time / count * 1e3:.2f} ms/desc, "
+          f"speedup {all_time / top_time:.1f}x, "
+          f"scored {scored / candidates:.1%} of candidates")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=100000)
+    parser.add_argument('--descriptions', type=int, default=500)
+    args = parser.parse_args()
+    main(args.vehicles, args.descriptions)
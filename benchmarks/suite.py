@@ -0,0 +1,275 @@
+"""Benchmark and regression suite for the matching pipeline.
+
+Times each stage on a synthetic catalogue and workload shaped like
+db/data.sql and input.txt, and writes the results as JSON. Given a baseline
+written by an earlier run, flags every case whose time per operation grew
+by more than the threshold and exits with status 1. The fastest run is
+compared by default, as it is the least disturbed by other load.
+
+Usage: python benchmarks/suite.py [--vehicles 10000] [--descriptions 1000]
+           [--repeat 5] [--output results.json] [--baseline baseline.json]
+           [--threshold 0.1] [--statistic min|median]
+           [--cases preprocess match_descriptions ...]
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from synthetic import (SyntheticDatabase, synthetic_descriptions,
+                       synthetic_listing_counts, synthetic_vehicles)
+from db.connector import Base
+from models import Listing, Vehicle, VehicleDatabase
+from services.matcher import Matcher
+from services.normaliser import Normaliser
+
+FORMAT = 1
+
+# Name -> setup(workload) returning (operations per run, run callable)
+CASES: Dict[str, Callable] = {}
+
+
+def case(name: str):
+    def register(setup: Callable) -> Callable:
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class Workload:
+    """The synthetic catalogue and descriptions shared by every case."""
+
+    def __init__(self, vehicles: int, descriptions: int, seed: int = 0):
+        self.vehicles = synthetic_vehicles(vehicles, seed)
+        self.listing_counts = synthetic_listing_counts(self.vehicles, seed)
+        self.descriptions = synthetic_descriptions(descriptions, seed)
+        self.normalised = [Normaliser().preprocess(d)
+                           for d in self.descriptions]
+
+        # Resources of the case being measured, released after it
+        self.cleanup = contextlib.ExitStack()
+
+    def database(self) -> SyntheticDatabase:
+        return SyntheticDatabase(self.vehicles, self.listing_counts)
+
+    def temporary_directory(self) -> str:
+        """A directory removed once the current case has been measured."""
+        return self.cleanup.enter_context(tempfile.TemporaryDirectory())
+
+    def matcher(self, **kwargs) -> Matcher:
+        matcher = Matcher(self.database(), Normaliser(), **kwargs)
+        matcher.prepare()
+        return matcher
+
+
+@case("preprocess")
+def preprocess(workload: Workload) -> Tuple[int, Callable]:
+    normaliser = Normaliser()
+    descriptions = workload.descriptions
+
+    def run():
+        for description in descriptions:
+            normaliser.preprocess(description)
+    return len(descriptions), run
+
+
+@case("calculate_score")
+def calculate_score(workload: Workload) -> Tuple[int, Callable]:
+    """The compiled scoring plan over prepared feature records."""
+    matcher = workload.matcher()
+    records = matcher._get_index().table.records[:100]
+    expander = matcher._get_expander()
+    descriptions = [(description, expander.expand(set(description.split())))
+                    for description in workload.normalised[:100]]
+    score = matcher.plan.score
+
+    def run():
+        for description, field_words in descriptions:
+            for features in records:
+                score(features, description, field_words)
+    return len(records) * len(descriptions), run
+
+
+@case("match_descriptions")
+def match_descriptions(workload: Workload) -> Tuple[int, Callable]:
+    matcher = workload.matcher(cache_size=0)
+    descriptions = workload.descriptions
+
+    def run():
+        matcher.match_descriptions(descriptions)
+    return len(descriptions), run
+
+
+@case("match_descriptions_cached")
+def match_descriptions_cached(workload: Workload) -> Tuple[int, Callable]:
+    matcher = workload.matcher()
+    descriptions = workload.descriptions
+
+    def run():
+        matcher.match_descriptions(descriptions)
+    return len(descriptions), run
+
+
+@case("match_descriptions_batch")
+def match_descriptions_batch(workload: Workload) -> Tuple[int, Callable]:
+    matcher = workload.matcher(cache_size=0)
+    matcher._get_batch_scorer()
+    descriptions = workload.descriptions
+
+    def run():
+        matcher.match_descriptions_batch(descriptions)
+    return len(descriptions), run
+
+
+@case("prepare")
+def prepare(workload: Workload) -> Tuple[int, Callable]:
+    database = workload.database()
+
+    def run():
+        Matcher(database, Normaliser()).prepare()
+    return 1, run
+
+
+@case("load_data")
+def load_data(workload: Workload) -> Tuple[int, Callable]:
+    """load_data against a SQLite file standing in for Postgres."""
+    path = os.path.join(workload.temporary_directory(), "catalogue.db")
+    engine = create_engine(f"sqlite:///{path}")
+    workload.cleanup.callback(engine.dispose)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Vehicle), [
+            v._asdict() for v in workload.vehicles.values()])
+        connection.execute(insert(Listing), [
+            {'id': f"{vehicle_id}-{i}", 'vehicle_id': vehicle_id,
+             'url': "", 'price': "0", 'kms': "0"}
+            for vehicle_id, count in workload.listing_counts.items()
+            for i in range(count)])
+    session_factory = sessionmaker(bind=engine)
+
+    def run():
+        db = VehicleDatabase()
+        db.session = session_factory()
+        db.load_data(release_connection=True)
+    return 1, run
+
+
+def measure(setup: Callable, workload: Workload, repeat: int) -> Dict:
+    """
+    Time a case, one warm-up run then repeat timed runs.
+
+    :return: Dictionary of operations per run and the median, minimum and
+        per-run seconds per operation
+    """
+    with workload.cleanup:
+        operations, run = setup(workload)
+        run()
+        runs = []
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            run()
+            runs.append((time.perf_counter() - start) / operations)
+    return {
+        'operations': operations,
+        'median': statistics.median(runs),
+        'min': min(runs),
+        'runs': runs,
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float,
+            statistic: str = 'min') -> List[str]:
+    """
+    Compare results with a baseline.
+
+    :param results: Output of this run
+    :param baseline: Output of an earlier run
+    :param threshold: Largest tolerated relative slowdown
+    :param statistic: Compare the 'min' or the 'median' seconds per operation
+    :return: Names of the regressed cases
+    """
+    if baseline['parameters'] != results['parameters']:
+        print(f"warning: baseline parameters {baseline['parameters']} differ "
+              f"from {results['parameters']}", file=sys.stderr)
+    regressions = []
+    print(f"{'case':<28} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, current in results['cases'].items():
+        previous = baseline['cases'].get(name)
+        if previous is None:
+            print(f"{name:<28} {'-':>12} {current[statistic]:12.3e}   new")
+            continue
+        change = current[statistic] / previous[statistic] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<28} {previous[statistic]:12.3e} "
+              f"{current[statistic]:12.3e} {change:+8.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(args: argparse.Namespace) -> int:
+    names = args.cases or list(CASES)
+    unknown = set(names) - set(CASES)
+    if unknown:
+        raise SystemExit(f"Unknown cases: {', '.join(sorted(unknown))}")
+
+    workload = Workload(args.vehicles, args.descriptions, args.seed)
+    results = {
+        'format': FORMAT,
+        'parameters': {'vehicles': args.vehicles,
+                       'descriptions': args.descriptions,
+                       'seed': args.seed},
+        'environment': {'python': platform.python_version(),
+                        'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'cases': {},
+    }
+    for name in names:
+        results['cases'][name] = measure(CASES[name], workload, args.repeat)
+        print(f"{name:<28} {results['cases'][name]['min']:12.3e} s/op",
+              file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold, args.statistic):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=10000)
+    parser.add_argument('--descriptions', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timed runs per case')
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES),
+                        help='cases to run (default: all)')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--baseline',
+                        help='results JSON of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='tolerated relative slowdown (default: 0.1)')
+    parser.add_argument('--statistic', choices=('min', 'median'),
+                        default='min', help='timing compared with the baseline')
+    sys.exit(main(parser.parse_args()))
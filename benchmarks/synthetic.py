@@ -0,0 +1,122 @@
+"""Synthetic catalogues and workloads shaped like db/data.sql and input.txt."""
+import os
+import random
+import re
+import sys
+from collections import Counter, namedtuple
+from typing import Dict, List, Tuple
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+DATA_SQL = os.path.join(ROOT, 'db', 'data.sql')
+INPUT_TXT = os.path.join(ROOT, 'input.txt')
+
+SyntheticVehicle = namedtuple('SyntheticVehicle', [
+    'id', 'make', 'model', 'badge', 'transmission_type', 'fuel_type',
+    'drive_type'])
+
+_ROW = re.compile(r"^\s*(?:VALUES\s*)?\((.*)\)[,;]\s*$")
+_VALUE = re.compile(r"'((?:[^']|'')*)'|(-?\d+)")
+
+
+def _rows(table: str) -> List[Tuple]:
+    """Parse the literal rows inserted into a table by db/data.sql."""
+    rows = []
+    in_table = False
+    with open(DATA_SQL) as f:
+        for line in f:
+            if line.startswith('INSERT INTO'):
+                in_table = line.split()[2] == table
+            match = _ROW.match(line) if in_table else None
+            if match:
+                rows.append(tuple(
+                    quoted.replace("''", "'") if number == '' else int(number)
+                    for quoted, number in _VALUE.findall(match.group(1))))
+    return rows
+
+
+def sample_vehicles() -> List[SyntheticVehicle]:
+    """Return the vehicles bundled in db/data.sql."""
+    return [SyntheticVehicle(*row) for row in _rows('vehicle')]
+
+
+def sample_listing_counts() -> Dict[str, int]:
+    """Return the listing count per vehicle bundled in db/data.sql."""
+    return Counter(row[1] for row in _rows('listing'))
+
+
+def sample_descriptions() -> List[str]:
+    """Return the descriptions in input.txt."""
+    with open(INPUT_TXT) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def synthetic_vehicles(count: int, seed: int = 0) -> Dict[str, SyntheticVehicle]:
+    """
+    Generate a catalogue of the given size from the bundled vehicles.
+
+    The first rows are the bundled vehicles themselves; later rows reuse their
+    transmission, fuel and drive types but introduce new makes, models and
+    badge words so the vocabulary grows with the catalogue.
+
+    :param count: Number of vehicles to generate
+    :param seed: Random seed
+    :return: Mapping of vehicle ID to vehicle, in catalogue order
+    """
+    rng = random.Random(seed)
+    sample = sample_vehicles()
+    badge_words = sorted({word for v in sample for word in v.badge.split()})
+
+    vehicles = {}
+    for i in range(count):
+        base = sample[i % len(sample)]
+        group = i // len(sample)
+        if group == 0:
+            vehicle = base
+        else:
+            badge = [rng.choice(badge_words)] + rng.sample(
+                base.badge.split(), k=min(1, len(base.badge.split())))
+            vehicle = base._replace(
+                id=str(10 ** 15 + i),
+                make=f"{base.make}{group % 200}",
+                model=f"{base.model}{group}",
+                badge=' '.join(badge + [f"s{group % 1000}"]))
+        vehicles[vehicle.id] = vehicle
+    return vehicles
+
+
+def synthetic_listing_counts(vehicles: Dict, seed: int = 0) -> Dict[str, int]:
+    """Assign a random listing count to every vehicle."""
+    rng = random.Random(seed)
+    return {vehicle_id: rng.randint(0, 50) for vehicle_id in vehicles}
+
+
+def synthetic_descriptions(count: int, seed: int = 0) -> List[str]:
+    """
+    Generate descriptions by shuffling and truncating the input.txt lines.
+
+    :param count: Number of descriptions to generate
+    :param seed: Random seed
+    :return: List of raw description strings
+    """
+    rng = random.Random(seed)
+    sample = sample_descriptions()
+    descriptions = []
+    for _ in range(count):
+        words = rng.choice(sample).split()
+        if len(words) > 2 and rng.random() < 0.3:
+            del words[rng.randrange(len(words))]
+        descriptions.append(' '.join(words))
+    return descriptions
+
+
+class SyntheticDatabase:
+    """An in-memory stand-in exposing the VehicleDatabase attributes the
+    Matcher reads."""
+
+    def __init__(self, vehicles: Dict, listing_counts: Dict[str, int]):
+        self.vehicles = vehicles
+        self.listing_counts = listing_counts
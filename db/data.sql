@@ -16,6 +16,26 @@ CREATE TABLE listing (
   kms INT NOT NULL
 );
 
+-- Serves the per-vehicle listing count GROUP BY and refresh lookups
+CREATE INDEX listing_vehicle_id_idx ON listing (vehicle_id);
+
+-- One row per change to a vehicle or to its listings, so a running matcher
+-- can refresh only the vehicles changed since its last load
+CREATE TABLE catalogue_change (
+  id BIGSERIAL PRIMARY KEY,
+  vehicle_id TEXT NOT NULL,
+  changed_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Latest match for each input description, upserted by app.py --format table
+CREATE TABLE match_result (
+  input TEXT NOT NULL PRIMARY KEY,
+  vehicle_id TEXT,
+  confidence INT NOT NULL,
+  listing_count INT,
+  matched_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
 INSERT INTO vehicle (id, make, model, badge, transmission_type, fuel_type, drive_type)
 VALUES  ('6434473696559104', 'Toyota', '86', 'GT', 'Automatic', 'Petrol', 'Rear Wheel Drive'),
         ('5027098813005824', 'Toyota', '86', 'GT', 'Manual', 'Petrol', 'Rear Wheel Drive'),
@@ -1077,4 +1097,34 @@ VALUES  ('c0537597', '4506798421704704', 'https://www.carsales.com.au/cars/detai
         ('fd4184e3', '6512924294119424', 'https://www.gumtree.com.au/s-ad/1317337311/', 40999, 75328),
         ('23992de4', '6512924294119424', 'https://www.carsales.com.au/cars/details/2019-toyota-kluger-black-edition-auto-2wd/OAG-AD-22483967', 40999, 75328),
         ('2f0d91bd', '6512924294119424', 'https://www.gumtree.com.au/s-ad/1321905673/', 39999, 95426),
-        ('64735f8b', '6512924294119424', 'https://www.tonywhitegroup.au/cars/used-black-2019-toyota-kluger-u55725', 39999, 95426);
\ No newline at end of file
+        ('64735f8b', '6512924294119424', 'https://www.tonywhitegroup.au/cars/used-black-2019-toyota-kluger-u55725', 39999, 95426);
+
+CREATE FUNCTION log_vehicle_change() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP <> 'INSERT' THEN
+    INSERT INTO catalogue_change (vehicle_id) VALUES (OLD.id);
+  END IF;
+  IF TG_OP <> 'DELETE' THEN
+    INSERT INTO catalogue_change (vehicle_id) VALUES (NEW.id);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION log_listing_change() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP <> 'INSERT' THEN
+    INSERT INTO catalogue_change (vehicle_id) VALUES (OLD.vehicle_id);
+  END IF;
+  IF TG_OP <> 'DELETE' THEN
+    INSERT INTO catalogue_change (vehicle_id) VALUES (NEW.vehicle_id);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER vehicle_change AFTER INSERT OR UPDATE OR DELETE ON vehicle
+  FOR EACH ROW EXECUTE FUNCTION log_vehicle_change();
+
+CREATE TRIGGER listing_change AFTER INSERT OR UPDATE OR DELETE ON listing
+  FOR EACH ROW EXECUTE FUNCTION log_listing_change();
@@ -0,0 +1,24 @@
+import os, sys
+from unittest.mock import MagicMock
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from models import VehicleDatabase
+
+
+def sample_database() -> MagicMock:
+    """A mock VehicleDatabase of three vehicles, two of them Golfs."""
+    db = MagicMock(spec=VehicleDatabase)
+    db.vehicles = {
+        "1": MagicMock(make="toyota", model="86", badge="gt",
+                       transmission_type="automatic", fuel_type="petrol",
+                       drive_type="rear wheel drive"),
+        "2": MagicMock(make="volkswagen", model="golf", badge="r",
+                       transmission_type="automatic", fuel_type="petrol",
+                       drive_type="four wheel drive"),
+        "3": MagicMock(make="volkswagen", model="golf", badge="gti",
+                       transmission_type="manual", fuel_type="petrol",
+                       drive_type="front wheel drive"),
+    }
+    db.listing_counts = {"1": 10, "2": 18, "3": 16}
+    return db
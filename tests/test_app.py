@@ -0,0 +1,131 @@
+import unittest, sys, os, io, json, tempfile
+from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from app import VehicleMatcherApp
+from db.connector import Base
+from models import MatchResult
+from services.metrics import Metrics, TextfileSink
+
+
+class TestVehicleMatcherApp(unittest.TestCase):
+    def setUp(self):
+        self.app = VehicleMatcherApp()
+        self.app.db.load_data = MagicMock()
+        self.app.db.vehicles = {
+            "1": MagicMock(make="Toyota", model="86", badge="GT",
+                           transmission_type="Automatic", fuel_type="Petrol",
+                           drive_type="Rear Wheel Drive"),
+        }
+        self.app.db.listing_counts = {"1": 10}
+        self.results = [
+            {'input': 'Toyota 86', 'vehicle_id': '1', 'confidence': 5,
+             'listing_count': 10},
+            {'input': 'unknown', 'vehicle_id': None, 'confidence': 0},
+        ]
+
+    def run_app(self, lines, output_format):
+        output = io.StringIO()
+        with patch('sys.stdin', io.StringIO(lines)):
+            self.app.run("-", output_format, output)
+        return output.getvalue()
+
+    def test_read_descriptions_skips_blank_lines(self):
+        lines = iter(["Toyota 86\n", "  \n", " unknown \n"])
+        self.assertEqual(list(self.app._read_descriptions(lines)),
+                         ["Toyota 86", "unknown"])
+
+    def test_text_output(self):
+        output = self.run_app("Toyota 86\n\nunknown\n", "text")
+        self.assertEqual(output,
+                         "Input: Toyota 86\nVehicle ID: 1\nConfidence: 5\n\n"
+                         "Input: unknown\nVehicle ID: None\nConfidence: 0\n\n")
+
+    def test_jsonl_output(self):
+        output = self.run_app("Toyota 86\nunknown\n", "jsonl")
+        self.assertEqual([json.loads(line) for line in output.splitlines()],
+                         self.results)
+
+    def test_csv_output(self):
+        output = self.run_app("Toyota 86\nunknown\n", "csv")
+        self.assertEqual(output.splitlines(), [
+            "input,vehicle_id,confidence,listing_count",
+            "Toyota 86,1,5,10",
+            "unknown,,0,",
+        ])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            self.run_app("Toyota 86\n", "xml")
+
+    def test_results_streamed(self):
+        """The first result is written before later input is read"""
+        output = io.StringIO()
+
+        def lines():
+            yield "Toyota 86\n"
+            self.assertIn("Vehicle ID: 1", output.getvalue())
+            yield "unknown\n"
+
+        self.app._write_results(
+            self.app._match(self.app._read_descriptions(lines())),
+            "text", output)
+
+    def test_snapshot_round_trip(self):
+        path = os.path.join(tempfile.mkdtemp(), "catalogue.snap")
+        self.app.db.change_watermark = None
+        self.app.write_snapshot_path = path
+        expected = self.run_app("Toyota 86\nunknown\n", "jsonl")
+
+        self.app = VehicleMatcherApp(snapshot_path=path)
+        self.assertEqual(self.run_app("Toyota 86\nunknown\n", "jsonl"),
+                         expected)
+        # The matcher's index was saved with the catalogue
+        plan = self.app.matcher.plan
+        self.assertIsNotNone(self.app.db.saved_index(plan.phrase_fields,
+                                                     plan.word_fields))
+        os.remove(path)
+
+    def test_metrics_and_profile_written_after_run(self):
+        directory = tempfile.mkdtemp()
+        metrics_path = os.path.join(directory, "matcher.prom")
+        profile_path = os.path.join(directory, "stacks.txt")
+        self.app.metrics = Metrics([TextfileSink(metrics_path)])
+        self.app.matcher.instrument(self.app.metrics)
+        self.app.profile_path = profile_path
+        self.run_app("Toyota 86\nunknown\n", "jsonl")
+
+        with open(metrics_path) as f:
+            text = f.read()
+        self.assertIn("vehicle_matcher_descriptions_total 2\n", text)
+        self.assertIn("vehicle_matcher_no_match_total 1\n", text)
+        self.assertTrue(os.path.exists(profile_path))
+
+    def test_dedupe_output_and_report(self):
+        # The repeat falls in the second window, so it is matched again
+        self.app.dedupe_window = 2
+        stderr = io.StringIO()
+        with patch('sys.stderr', stderr):
+            output = self.run_app("Toyota 86\nunknown\nToyota 86\n",
+                                  "jsonl")
+        self.assertEqual([json.loads(line) for line in output.splitlines()],
+                         self.results + self.results[:1])
+        self.assertIn("3 descriptions to 3 unique", stderr.getvalue())
+
+    def test_table_output(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.app.result_writer.session = sessionmaker(bind=engine)()
+        output = self.run_app("Toyota 86\nunknown\nToyota 86\n", "table")
+        self.assertEqual(output, "Wrote 2 results to match_result\n")
+        rows = self.app.result_writer.session.query(MatchResult).all()
+        self.assertEqual(
+            sorted((row.input, row.vehicle_id, row.confidence,
+                    row.listing_count) for row in rows),
+            [('Toyota 86', '1', 5, 10), ('unknown', None, 0, None)])
+
+if __name__ == '__main__':
+    unittest.main()
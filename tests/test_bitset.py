@@ -0,0 +1,71 @@
+import unittest, sys, os
+from unittest.mock import MagicMock
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from services.bitset import BitsetScorer, FieldBitsets
+from services.features import FeatureTable
+from services.index import VehicleIndex
+
+
+def make_vehicle(make, model, badge, transmission_type="automatic",
+                 fuel_type="petrol", drive_type="front wheel drive"):
+    return MagicMock(make=make, model=model, badge=badge,
+                     transmission_type=transmission_type,
+                     fuel_type=fuel_type, drive_type=drive_type)
+
+
+class TestFieldBitsets(unittest.TestCase):
+    def test_dense_and_sparse_values(self):
+        bitsets = FieldBitsets({"automatic": list(range(0, 200, 2)),
+                                "gti": [3, 130]}, 200)
+        self.assertIn("automatic", bitsets.dense)
+        self.assertIn("gti", bitsets.sparse)
+        self.assertEqual(bitsets.union(["gti"]), 1 << 3 | 1 << 130)
+        self.assertEqual(bitsets.union(["gti", "automatic", "unknown"]),
+                         sum(1 << r for r in range(0, 200, 2))
+                         | 1 << 3 | 1 << 130)
+        self.assertEqual(bitsets.union([]), 0)
+
+
+class TestBitsetScorer(unittest.TestCase):
+    def setUp(self):
+        vehicles = {
+            "1": make_vehicle("Toyota", "86", "GT", "Manual"),
+            "2": make_vehicle("Volkswagen", "Golf", "GTI"),
+            "3": make_vehicle("Volkswagen", "Golf", "R"),
+            "4": make_vehicle("Toyota", "Camry", "Ascent Sport"),
+            "5": make_vehicle("Toyota", "", "GT"),
+        }
+        table = FeatureTable(
+            vehicles,
+            phrase_fields=["make", "model", "transmission_type", "fuel_type",
+                           "drive_type"],
+            word_fields=["badge"])
+        table.remove("4")
+        self.scorer = BitsetScorer(VehicleIndex(table), (3, 2, 1, 1, 1), (2,),
+                                   [5, 0, 9, 7, 0])
+
+    def top(self, description, k=10):
+        description = description.lower()
+        return self.scorer.top(description, (set(description.split()),), k)
+
+    def test_ranks_in_tie_break_order(self):
+        # Most listings first, then catalogue order; removed vehicles skipped
+        self.assertEqual(self.scorer.positions, [2, 0, 1, 4])
+
+    def test_scores_and_order(self):
+        # Vehicle 5 has no model, and an empty phrase matches everything
+        self.assertEqual(self.top("toyota 86 gt manual"), [(8, 0), (7, 4)])
+        self.assertEqual(self.top("volkswagen golf automatic", k=2),
+                         [(6, 2), (6, 1)])
+
+    def test_badge_matches_whole_words(self):
+        self.assertEqual(self.top("gti"), [(2, 1), (2, 4)])
+        self.assertEqual(self.top("gtir"), [(2, 4)])
+
+    def test_only_empty_phrases_match(self):
+        self.assertEqual(self.top("unknown"), [(2, 4)])
+
+if __name__ == '__main__':
+    unittest.main()
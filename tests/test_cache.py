@@ -0,0 +1,61 @@
+import unittest, sys, os
+from collections import OrderedDict
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from services.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = LRUCache(2)
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.put("a", 1)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put("a", 1)
+        self.cache.put("b", 2)
+        self.cache.get("a")
+        self.cache.put("c", 3)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_disabled(self):
+        cache = LRUCache(0)
+        cache.put("a", 1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_concurrent_clear_tolerated(self):
+        class ClearedAfterWrite(OrderedDict):
+            """Entries cleared by another thread right after each write."""
+            def __setitem__(self, key, value):
+                super().__setitem__(key, value)
+                self.clear()
+
+        self.cache._entries = ClearedAfterWrite()
+        self.cache.put("a", 1)
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_discard(self):
+        self.cache.put("a", 1)
+        self.cache.discard("a")
+        self.cache.discard("b")
+        self.assertEqual(len(self.cache), 0)
+
+    def test_clear_keeps_counters(self):
+        self.cache.put("a", 1)
+        self.cache.get("a")
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['hit_rate'], 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest, sys, os
+from unittest.mock import patch
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from models import VehicleRow
+from models.compact import CompactListingCounts, CompactVehicles
+
+
+def rows():
+    return [
+        VehicleRow("6434473696559104", "Toyota", "86", "GT", "Automatic",
+                   "Petrol", "Rear Wheel Drive"),
+        VehicleRow("4951649860714496", "Volkswagen", "Amarok",
+                   "TDI580  Ultimate", "Automatic", "Diesel",
+                   "Four Wheel Drive"),
+        VehicleRow("5824662093168640", "Volkswagen", "Golf", "", "Manual",
+                   "Petrol", "Four Wheel Drive"),
+    ]
+
+
+class TestCompactVehicles(unittest.TestCase):
+    def setUp(self):
+        self.expected = {row.id: row for row in rows()}
+        self.vehicles = CompactVehicles(rows())
+
+    def test_round_trip(self):
+        self.assertEqual(dict(self.vehicles.items()), self.expected)
+        self.assertEqual(list(self.vehicles), list(self.expected))
+        self.assertEqual(self.vehicles["4951649860714496"].badge,
+                         "TDI580  Ultimate")
+        self.assertEqual(len(self.vehicles), 3)
+
+    def test_missing_ids(self):
+        for vehicle_id in ("1", "06434473696559104", "golf", 6434473696559104):
+            self.assertNotIn(vehicle_id, self.vehicles)
+        with self.assertRaises(KeyError):
+            self.vehicles["1"]
+
+    def test_shared_values_stored_once(self):
+        transmission = self.vehicles.columns[
+            self.vehicles.fields.index('transmission_type')]
+        self.assertEqual(transmission.table.values, ["Automatic", "Manual"])
+        self.assertEqual(transmission.codes.itemsize, 2)
+
+    def test_updates_behave_like_dict(self):
+        updated = self.expected["6434473696559104"]._replace(badge="GTS")
+        added = updated._replace(id="7", make="Mazda")
+        for catalogue in (self.vehicles, self.expected):
+            catalogue["6434473696559104"] = updated
+            del catalogue["4951649860714496"]
+            catalogue["7"] = added
+            catalogue.pop("5824662093168640")
+            catalogue["5824662093168640"] = added._replace(
+                id="5824662093168640")
+        self.assertEqual(list(self.vehicles.items()),
+                         list(self.expected.items()))
+
+    def test_lookups_survive_resort(self):
+        with patch('models.compact._MAX_UNSORTED', 2):
+            for i in range(10):
+                vehicle = self.expected["6434473696559104"]._replace(
+                    id=str(i + 1))
+                self.vehicles[vehicle.id] = vehicle
+                self.expected[vehicle.id] = vehicle
+        self.assertEqual(dict(self.vehicles.items()), self.expected)
+        for vehicle_id, row in self.expected.items():
+            self.assertEqual(self.vehicles[vehicle_id], row)
+
+    def test_string_ids(self):
+        vehicles = CompactVehicles(
+            rows() + [rows()[0]._replace(id="abc-1")])
+        self.assertEqual(list(vehicles), list(self.expected) + ["abc-1"])
+        self.assertEqual(vehicles["abc-1"].make, "Toyota")
+        self.assertEqual(vehicles["6434473696559104"].model, "86")
+
+    def test_codes_widen(self):
+        with patch('models.compact._MAX_SHORT_CODE', 3):
+            vehicles = CompactVehicles(
+                rows()[0]._replace(id=str(i), model=f"model{i}",
+                                   badge=f"gt {i}")
+                for i in range(10))
+        model = vehicles.columns[vehicles.fields.index('model')]
+        self.assertEqual(model.codes.typecode, 'I')
+        self.assertEqual(vehicles["9"].model, "model9")
+        self.assertEqual(vehicles["9"].badge, "gt 9")
+        self.assertEqual(vehicles["1"].model, "model1")
+
+
+class TestCompactListingCounts(unittest.TestCase):
+    def setUp(self):
+        self.vehicles = CompactVehicles(rows())
+        self.counts = CompactListingCounts(
+            self.vehicles, {"6434473696559104": 10, "5824662093168640": 18,
+                            "9": 1})
+
+    def test_reads_like_counter(self):
+        self.assertEqual(self.counts, {"6434473696559104": 10,
+                                       "5824662093168640": 18, "9": 1})
+        self.assertEqual(self.counts["4951649860714496"], 0)
+        self.assertIsNone(self.counts.get("4951649860714496"))
+        self.assertEqual(self.counts.get("6434473696559104", 0), 10)
+
+    def test_updates(self):
+        self.counts["4951649860714496"] = 3
+        self.assertEqual(self.counts.pop("6434473696559104", None), 10)
+        self.assertIsNone(self.counts.pop("6434473696559104", None))
+        self.assertEqual(self.counts, {"4951649860714496": 3,
+                                       "5824662093168640": 18, "9": 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import unittest, sys, os
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from db.connector import Base
+from models import VehicleDatabase, Vehicle, VehicleRow, Listing, CatalogueChange
+from models.compact import CompactListingCounts, CompactVehicles
+from services.matcher import Matcher, Normaliser
+
+
+def make_vehicle(vehicle_id, make, model, badge):
+    return Vehicle(id=vehicle_id, make=make, model=model, badge=badge,
+                   transmission_type="Automatic", fuel_type="Petrol",
+                   drive_type="Front Wheel Drive")
+
+
+class TestVehicleDatabase(unittest.TestCase):
+    """Runs VehicleDatabase against an in-memory SQLite stand-in"""
+    compact = False
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.session.add_all([
+            make_vehicle("1", "Toyota", "86", "GT"),
+            make_vehicle("2", "Volkswagen", "Golf", "GTI"),
+            make_vehicle("3", "Volkswagen", "Golf", "R"),
+            Listing(id="a", vehicle_id="1", url="u", price="1", kms="1"),
+            Listing(id="b", vehicle_id="2", url="u", price="1", kms="1"),
+            Listing(id="c", vehicle_id="2", url="u", price="1", kms="1"),
+            CatalogueChange(id=1, vehicle_id="1"),
+        ])
+        self.session.commit()
+
+        self.db = VehicleDatabase(compact=self.compact)
+        self.db.session = self.session
+        self.db.load_data()
+
+    def change(self, *vehicle_ids):
+        start = self.session.query(CatalogueChange).count() + 1
+        self.session.add_all([CatalogueChange(id=start + i, vehicle_id=v)
+                              for i, v in enumerate(vehicle_ids)])
+        self.session.commit()
+
+    def test_load_data(self):
+        self.assertEqual(list(self.db.vehicles), ["1", "2", "3"])
+        self.assertEqual(self.db.listing_counts, {"1": 1, "2": 2})
+        self.assertEqual(self.db.listing_counts["3"], 0)
+        self.assertEqual(self.db.change_watermark, 1)
+
+    def test_vehicles_loaded_as_rows(self):
+        self.assertEqual(self.db.vehicles["1"], VehicleRow(
+            "1", "Toyota", "86", "GT", "Automatic", "Petrol",
+            "Front Wheel Drive"))
+
+    def test_release_connection(self):
+        self.db.load_data(release_connection=True)
+        self.assertFalse(self.session.in_transaction())
+        self.change("1")
+        self.assertEqual(set(self.db.refresh().vehicles), {"1"})
+
+    def test_listings_not_materialised_by_default(self):
+        self.assertEqual(self.db.listings, [])
+
+    def test_load_listings(self):
+        self.db.load_data(load_listings=True)
+        self.assertEqual(sorted(l.id for l in self.db.listings),
+                         ["a", "b", "c"])
+        self.assertEqual(self.db.listing_counts, {"1": 1, "2": 2})
+
+    def test_refresh_keeps_loaded_listings_current(self):
+        self.db.load_data(load_listings=True)
+        self.session.query(Listing).filter_by(id="a").delete()
+        self.session.add(Listing(id="d", vehicle_id="2", url="u", price="1",
+                                 kms="1"))
+        self.session.commit()
+        self.change("1", "2")
+        self.db.refresh()
+        self.assertEqual(sorted(l.id for l in self.db.listings),
+                         ["b", "c", "d"])
+        self.assertEqual(self.db.listing_counts, {"2": 3})
+
+    def test_fetch_changes_leaves_memory_untouched(self):
+        self.session.query(Vehicle).filter_by(id="3").update({"badge": "GTD"})
+        self.session.commit()
+        self.change("3")
+        delta = self.db.fetch_changes()
+        self.assertEqual(self.db.vehicles["3"].badge, "R")
+        self.assertEqual(self.db.change_watermark, 1)
+
+        self.db.apply_changes(delta)
+        self.assertEqual(self.db.vehicles["3"].badge, "GTD")
+        self.assertEqual(self.db.change_watermark, 2)
+
+    def test_refresh_without_changes(self):
+        self.assertFalse(self.db.refresh())
+
+    def test_refresh_applies_changes_in_place(self):
+        vehicles = self.db.vehicles
+        self.session.add(make_vehicle("4", "Toyota", "Camry", "Ascent"))
+        self.session.query(Vehicle).filter_by(id="3").update({"badge": "GTD"})
+        self.session.query(Listing).filter_by(id="a").delete()
+        self.session.add(Listing(id="d", vehicle_id="3", url="u", price="1",
+                                 kms="1"))
+        self.session.query(Listing).filter_by(vehicle_id="2").delete()
+        self.session.query(Vehicle).filter_by(id="2").delete()
+        self.session.commit()
+        self.change("4", "3", "1", "3", "2")
+
+        delta = self.db.refresh()
+
+        self.assertEqual(set(delta.vehicles), {"1", "3", "4"})
+        self.assertEqual(delta.removed, {"2"})
+        self.assertIs(self.db.vehicles, vehicles)
+        self.assertEqual(list(self.db.vehicles), ["1", "3", "4"])
+        self.assertEqual(self.db.vehicles["3"].badge, "GTD")
+        self.assertEqual(self.db.listing_counts, {"3": 1})
+        self.assertEqual(self.db.change_watermark, 6)
+        self.assertFalse(self.db.refresh())
+
+    def test_matcher_refresh_matches_full_rebuild(self):
+        matcher = Matcher(self.db, Normaliser())
+        descriptions = ["Toyota 86 GT", "VW Golf GTI", "Golf GTD",
+                        "Toyota Camry Ascent", "Golf"]
+        matcher.match_descriptions(descriptions)
+
+        self.session.add(make_vehicle("4", "Toyota", "Camry", "Ascent"))
+        self.session.query(Vehicle).filter_by(id="3").update({"badge": "GTD"})
+        self.session.query(Vehicle).filter_by(id="2").delete()
+        self.session.commit()
+        self.change("4", "3", "2")
+        matcher.refresh()
+
+        fresh = Matcher(self.db, Normaliser())
+        self.assertEqual(matcher.match_descriptions(descriptions),
+                         fresh.match_descriptions(descriptions))
+        self.assertEqual(matcher.match_descriptions_batch(descriptions),
+                         fresh.match_descriptions(descriptions))
+
+    def test_matcher_refresh_readds_removed_vehicle(self):
+        matcher = Matcher(self.db, Normaliser())
+        descriptions = ["VW Golf GTI", "Golf", "Toyota 86 GT"]
+        matcher.match_descriptions(descriptions)
+
+        self.session.query(Vehicle).filter_by(id="2").delete()
+        self.session.commit()
+        self.change("2")
+        matcher.refresh()
+        self.session.add(make_vehicle("2", "Volkswagen", "Golf", "GTI"))
+        self.session.commit()
+        self.change("2")
+        matcher.refresh()
+
+        self.assertEqual(matcher.top_matches("VW Golf GTI", 3),
+                         Matcher(self.db, Normaliser()).top_matches(
+                             "VW Golf GTI", 3))
+        self.assertEqual(matcher.match_descriptions(descriptions)[0]
+                         ['vehicle_id'], "2")
+
+
+class TestCompactVehicleDatabase(TestVehicleDatabase):
+    """The same behaviour with the catalogue held in compact columns"""
+    compact = True
+
+    def test_vehicles_held_compact(self):
+        self.assertIsInstance(self.db.vehicles, CompactVehicles)
+        self.assertIsInstance(self.db.listing_counts, CompactListingCounts)
+
+if __name__ == '__main__':
+    unittest.main()
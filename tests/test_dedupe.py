@@ -0,0 +1,82 @@
+import unittest, sys, os
+from unittest.mock import MagicMock, patch
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from tests.fixtures import sample_database
+from services.dedupe import DedupeStats, DeduplicatingMatcher
+from services.matcher import Matcher, Normaliser
+from services.metrics import Metrics
+from services.parallel import ParallelMatcher
+
+
+class TestDeduplicatingMatcher(unittest.TestCase):
+    def setUp(self):
+        self.mock_db = sample_database()
+        self.matcher = Matcher(self.mock_db, Normaliser(), cache_size=0)
+        # "VW Golf" and "Volkswagen golf!" normalise alike
+        self.descriptions = ["Toyota 86 GT", "VW Golf", "Volkswagen golf!",
+                             "unknown", "Toyota 86 GT", "VW Golf"] * 5
+
+    def test_results_identical_in_input_order(self):
+        deduplicator = DeduplicatingMatcher(self.matcher, window=4)
+        self.assertEqual(
+            list(deduplicator.match_descriptions(iter(self.descriptions))),
+            self.matcher.match_descriptions(self.descriptions))
+
+    def test_each_unique_matched_once_per_window(self):
+        self.matcher._match_normalised = MagicMock(
+            wraps=self.matcher._match_normalised)
+        deduplicator = DeduplicatingMatcher(self.matcher)
+        results = list(deduplicator.match_descriptions(self.descriptions))
+        self.assertEqual(self.matcher._match_normalised.call_count, 3)
+        self.assertEqual([result['input'] for result in results],
+                         self.descriptions)
+
+        stats = deduplicator.stats
+        self.assertEqual((stats.descriptions, stats.unique), (30, 3))
+        self.assertEqual(stats.ratio, 10.0)
+        self.assertAlmostEqual(stats.seconds_saved, stats.match_seconds * 9)
+        self.assertIn("30 descriptions to 3 unique (10.0x)", stats.summary())
+
+    def test_fan_out_results_independent(self):
+        results = list(DeduplicatingMatcher(self.matcher).match_descriptions(
+            ["VW Golf", "VW Golf"]))
+        results[0]['confidence'] = -1
+        self.assertNotEqual(results[1]['confidence'], -1)
+
+    def test_parallel_workers(self):
+        deduplicator = DeduplicatingMatcher(self.matcher, window=7,
+                                            workers=2, chunk_size=1)
+        with patch.object(ParallelMatcher, 'pool', autospec=True,
+                          side_effect=ParallelMatcher.pool) as pool:
+            self.assertEqual(
+                list(deduplicator.match_descriptions(self.descriptions)),
+                self.matcher.match_descriptions(self.descriptions))
+        # Forked once for the run, not once per window
+        pool.assert_called_once()
+
+    def test_metrics(self):
+        metrics = Metrics()
+        self.matcher.instrument(metrics)
+        list(DeduplicatingMatcher(self.matcher).match_descriptions(
+            self.descriptions))
+        self.assertEqual(metrics.counters['descriptions'], 30)
+        self.assertEqual(metrics.counters['descriptions_scored'], 3)
+        self.assertEqual(metrics.counters['no_match'], 5)
+        self.assertEqual(metrics.counters['descriptions_deduplicated'], 27)
+        self.assertIn('dedupe', metrics.stages)
+
+    def test_empty_input(self):
+        deduplicator = DeduplicatingMatcher(self.matcher)
+        self.assertEqual(list(deduplicator.match_descriptions([])), [])
+        self.assertEqual(deduplicator.stats.ratio, 0.0)
+        self.assertEqual(DedupeStats().seconds_saved, 0.0)
+
+    def test_invalid_window(self):
+        with self.assertRaises(ValueError):
+            DeduplicatingMatcher(self.matcher, window=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest, sys, os
+from unittest.mock import MagicMock
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from models import VehicleRow
+from models.compact import CompactVehicles
+from services.features import FeatureTable, VehicleFeatures
+
+
+class TestFeatureTable(unittest.TestCase):
+    def setUp(self):
+        self.vehicles = {
+            "1": MagicMock(make="Toyota", model="86", badge="GTS Apollo Blue"),
+            "2": MagicMock(make="Toyota", model="Camry", badge="Ascent Sport"),
+        }
+        self.table = FeatureTable(self.vehicles, ["make", "model"], ["badge"])
+
+    def test_records_in_catalogue_order(self):
+        self.assertEqual([self.table.vehicle_id(position)
+                          for position in range(len(self.table))], ["1", "2"])
+        self.assertEqual(self.table.position("2"), 1)
+
+    def test_phrases_lowered(self):
+        self.assertEqual(self.table[0].phrases, ("toyota", "86"))
+
+    def test_words_split(self):
+        self.assertEqual(self.table[0].words, (("apollo", "blue", "gts"),))
+
+    def test_repeated_values_interned(self):
+        self.assertIs(self.table[0].phrases[0], self.table[1].phrases[0])
+
+    def test_equal_features_shared(self):
+        vehicles = dict(self.vehicles, **{
+            "3": MagicMock(make="Toyota", model="86", badge="Blue Apollo GTS"),
+            "4": MagicMock(make="Toyota", model="Supra", badge="GTS Apollo Blue"),
+        })
+        table = FeatureTable(vehicles, ["make", "model"], ["badge"])
+        self.assertIs(table[2], table[0])
+        self.assertIs(table[3].words, table[0].words)
+
+    def test_from_vehicle_missing_field(self):
+        features = VehicleFeatures.from_vehicle(object(), ["make"], ["badge"])
+        self.assertEqual(features.phrases, ("",))
+        self.assertEqual(features.words, ((),))
+
+    def test_positions_from_compact_catalogue(self):
+        rows = [VehicleRow(str(i), "Toyota", f"Model{i}", "GT", "Automatic",
+                           "Petrol", "Rear Wheel Drive") for i in range(1, 4)]
+        vehicles = CompactVehicles(rows)
+        del vehicles["2"]
+        table = FeatureTable(vehicles, ["make", "model"], ["badge"])
+        self.assertIsNone(table[1])
+        self.assertEqual(table.position("3"), 2)
+        self.assertEqual(table.vehicle_id(2), "3")
+
+        # Updated like the matcher: the catalogue first, then the table
+        del vehicles["1"]
+        vehicles["2"] = rows[1]
+        vehicles["3"] = rows[2]._replace(badge="GTS")
+        self.assertEqual(table.remove("1")[0], 0)
+        self.assertEqual(table.upsert("2", rows[1])[:2], (3, None))
+        self.assertEqual(table.upsert("3", vehicles["3"])[0], 2)
+        self.assertEqual([table.position(vehicle_id)
+                          for vehicle_id in ("1", "2", "3")], [None, 3, 2])
+        self.assertEqual(table[2].words, (("gts",),))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest, sys, os
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from services.fuzzy import FuzzyVocabulary, edit_distance
+
+
+class TestEditDistance(unittest.TestCase):
+    def test_distances(self):
+        self.assertEqual(edit_distance("amarok", "amarok", 2), 0)
+        self.assertEqual(edit_distance("amrok", "amarok", 2), 1)
+        self.assertEqual(edit_distance("golf", "glof", 2), 1)  # transposition
+        self.assertEqual(edit_distance("tiguan", "tigaun", 2), 1)
+        self.assertEqual(edit_distance("kluger", "klugre", 2), 1)
+        self.assertEqual(edit_distance("camry", "carmy", 2), 1)
+        self.assertEqual(edit_distance("corolla", "carola", 2), 2)
+
+    def test_limit(self):
+        self.assertEqual(edit_distance("volkswagen", "toyota", 2), 3)
+        self.assertEqual(edit_distance("a", "abcdef", 1), 2)
+
+
+class TestFuzzyVocabulary(unittest.TestCase):
+    def setUp(self):
+        self.vocabulary = FuzzyVocabulary({
+            "volkswagen": 30, "amarok": 10, "toyota": 20, "sport": 5,
+            "spirit": 1, "gt": 4, "gts": 3, "110tsi": 2, "comfortline": 2,
+            "camry": 2, "carry": 1})
+
+    def test_known_words_kept(self):
+        for word in ("amarok", "gt", "110tsi"):
+            self.assertEqual(self.vocabulary.correct(word), word)
+
+    def test_misspellings_resolved(self):
+        self.assertEqual(self.vocabulary.correct("amrok"), "amarok")
+        self.assertEqual(self.vocabulary.correct("sports"), "sport")
+        self.assertEqual(self.vocabulary.correct("volkswagon"), "volkswagen")
+        # Long words tolerate two edits
+        self.assertEqual(self.vocabulary.correct("comfrtlne"), "comfortline")
+
+    def test_bounded_distance(self):
+        # Two edits are too many for a word under eight letters
+        self.assertEqual(self.vocabulary.correct("tyota"), "toyota")
+        self.assertEqual(self.vocabulary.correct("tyoto"), "tyoto")
+        self.assertEqual(self.vocabulary.correct("unrelated"), "unrelated")
+
+    def test_short_and_numeric_words_untouched(self):
+        self.assertEqual(self.vocabulary.correct("gtx"), "gtx")
+        self.assertEqual(self.vocabulary.correct("118tsi"), "118tsi")
+
+    def test_frequency_breaks_ties(self):
+        # "camry" and "carry" are both one edit from "carmy" (transposition
+        # and substitution); the more frequent one wins
+        self.assertEqual(self.vocabulary.correct("carmy"), "camry")
+
+    def test_matches(self):
+        self.assertEqual(self.vocabulary.matches("carmy"), {"camry", "carry"})
+        self.assertEqual(self.vocabulary.matches("gt"), {"gt"})
+        self.assertEqual(self.vocabulary.matches("tyoto"), set())
+
+    def test_correct_text(self):
+        text = "vw amrok h line"
+        self.assertEqual(self.vocabulary.correct_text(text), "vw amarok h line")
+        unchanged = "toyota 86 gt"
+        self.assertIs(self.vocabulary.correct_text(unchanged), unchanged)
+
+    def test_from_tokens(self):
+        vocabulary = FuzzyVocabulary.from_tokens(
+            ["golf", "golf", "gold"], max_distance=1)
+        self.assertEqual(vocabulary.frequencies, {"golf": 2, "gold": 1})
+        self.assertEqual(vocabulary.correct("gole"), "golf")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest, sys, os
+from unittest.mock import MagicMock
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from services.features import FeatureTable
+from services.index import VehicleIndex
+
+
+def make_vehicle(make, model, badge, transmission_type="automatic",
+                 fuel_type="petrol", drive_type="front wheel drive"):
+    return MagicMock(make=make, model=model, badge=badge,
+                     transmission_type=transmission_type,
+                     fuel_type=fuel_type, drive_type=drive_type)
+
+
+class TestVehicleIndex(unittest.TestCase):
+    def setUp(self):
+        self.vehicles = {
+            "1": make_vehicle("Toyota", "86", "GTS Apollo Blue",
+                              "Manual", "Petrol", "Rear Wheel Drive"),
+            "2": make_vehicle("Volkswagen", "Amarok", "TDI580 Ultimate",
+                              "Automatic", "Diesel", "Four Wheel Drive"),
+            "3": make_vehicle("Volkswagen", "Golf", "GTI"),
+            "4": make_vehicle("Toyota", "Camry", "Ascent Sport",
+                              "Automatic", "Hybrid-Petrol", "Front Wheel Drive"),
+        }
+        self.index = VehicleIndex(FeatureTable(
+            self.vehicles,
+            phrase_fields=["make", "model", "transmission_type", "fuel_type",
+                           "drive_type"],
+            word_fields=["badge"]))
+
+    def test_phrase_candidates(self):
+        self.assertEqual(self.index.candidates("volkswagen"), ["2", "3"])
+
+    def test_substring_phrase_candidates(self):
+        """Phrases match inside longer words, like the scorer's `in` check"""
+        self.assertEqual(self.index.candidates("toyota 1986"), ["1", "4"])
+
+    def test_badge_word_candidates(self):
+        self.assertEqual(self.index.candidates("blue"), ["1"])
+        self.assertEqual(self.index.candidates("ultim"), [])
+
+    def test_candidates_in_catalogue_order(self):
+        self.assertEqual(self.index.candidates("gti diesel manual"),
+                         ["1", "2", "3"])
+
+    def test_empty_phrase_matches_everything(self):
+        vehicles = {"1": make_vehicle("Toyota", "", "GT"),
+                    "2": make_vehicle("Mazda", "3", "Touring")}
+        index = VehicleIndex(FeatureTable(
+            vehicles, phrase_fields=["make", "model"], word_fields=["badge"]))
+        self.assertEqual(index.candidates("unknown"), ["1"])
+
+    def test_replace_in_place(self):
+        table = self.index.table
+        position, old, new = table.upsert(
+            "3", make_vehicle("Volkswagen", "Polo", "GTI"))
+        self.index.replace(position, old, new)
+        position, old = table.remove("1")
+        self.index.replace(position, old, None)
+        position, old, new = table.upsert("5", make_vehicle("Mazda", "3", "GT"))
+        self.index.replace(position, old, new)
+
+        self.assertEqual(self.index.candidates("golf"), [])
+        self.assertEqual(self.index.candidates("polo"), ["3"])
+        self.assertEqual(self.index.candidates("86 manual"), [])
+        self.assertEqual(self.index.candidates("mazda"), ["5"])
+        self.assertNotIn("golf", self.index.phrases)
+
+    def test_no_candidates(self):
+        self.assertEqual(self.index.candidates("unknown make model"), [])
+
+if __name__ == '__main__':
+    unittest.main()
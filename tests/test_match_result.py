@@ -0,0 +1,70 @@
+import unittest, sys, os
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from db.connector import Base
+from models import MatchResult, MatchResultWriter
+
+
+def result(description, vehicle_id="1", confidence=5, listing_count=10):
+    if vehicle_id is None:
+        return {'input': description, 'vehicle_id': None, 'confidence': 0}
+    return {'input': description, 'vehicle_id': vehicle_id,
+            'confidence': confidence, 'listing_count': listing_count}
+
+
+class TestMatchResultWriter(unittest.TestCase):
+    """Runs MatchResultWriter against an in-memory SQLite stand-in"""
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.writer = MatchResultWriter(self.session, batch_size=2,
+                                        commit_every=2)
+
+    def stored(self):
+        return {row.input: (row.vehicle_id, row.confidence, row.listing_count)
+                for row in self.session.query(MatchResult)}
+
+    def test_write_all(self):
+        written = self.writer.write_all([result("Toyota 86"),
+                                         result("unknown", None)])
+        self.assertEqual(written, 2)
+        self.assertEqual(self.stored(), {"Toyota 86": ("1", 5, 10),
+                                         "unknown": (None, 0, None)})
+
+    def test_rerun_upserts(self):
+        self.writer.write_all([result("Toyota 86"), result("Golf GTI")])
+        MatchResultWriter(self.session).write_all(
+            [result("Toyota 86", "2", 7, 3)])
+        self.assertEqual(self.stored(), {"Toyota 86": ("2", 7, 3),
+                                         "Golf GTI": ("1", 5, 10)})
+
+    def test_repeated_input_within_batch(self):
+        self.writer.write_all([result("Toyota 86"),
+                               result("Toyota 86", "2", 7, 3)])
+        self.assertEqual(self.writer.written, 1)
+        self.assertEqual(self.stored(), {"Toyota 86": ("2", 7, 3)})
+
+    def test_batches_and_periodic_commits(self):
+        with patch.object(self.session, 'execute',
+                          wraps=self.session.execute) as execute, \
+                patch.object(self.session, 'commit',
+                             wraps=self.session.commit) as commit:
+            for i in range(5):
+                self.writer.write(result(f"car {i}"))
+            self.assertEqual((execute.call_count, commit.call_count), (2, 1))
+            self.writer.close()
+            self.assertEqual((execute.call_count, commit.call_count), (3, 2))
+        self.assertEqual(len(self.stored()), 5)
+
+    def test_invalid_batch_size(self):
+        with self.assertRaises(ValueError):
+            MatchResultWriter(self.session, batch_size=0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,12 @@
-import unittest, sys, os
+import unittest, sys, os, threading
 from unittest.mock import MagicMock
 
 # Add the app directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
 from services.matcher import Matcher, Normaliser
-from models import VehicleDatabase
+from models import CatalogueDelta, VehicleDatabase
+from services.metrics import Metrics
+from services.scoring import FieldRule, ScoringPlan
 
 
 class TestMatcher(unittest.TestCase):
@@ -136,6 +138,350 @@ class TestMatcher(unittest.TestCase):
         self.assertEqual(results[0]['vehicle_id'], "5824662093168640")
         self.assertIsNone(results[1]['vehicle_id'])
 
+    # Batch engine
+    def test_batch_matches_per_description(self):
+        descriptions = [
+            "toyota", "86", "ultimate", "automatic", "diesel",
+            "rear wheel drive", "tdi580 ultimate",
+            "toyota 86 gt automatic petrol rear wheel drive",
+            "volkswagen golf", "volkswagen golf r", "unknown make model"
+        ]
+        self.assertEqual(
+            self.matcher.match_descriptions_batch(descriptions, batch_size=4),
+            self.matcher.match_descriptions(descriptions))
+
+    def test_batch_uses_caches(self):
+        descriptions = ["toyota 86", "volkswagen golf", "toyota 86"]
+        expected = self.matcher.match_descriptions_batch(descriptions)
+        stats = self.matcher.cache_stats()
+        self.assertEqual(stats['normalised']['size'], 2)
+        self.assertEqual(stats['match']['size'], 2)
+        self.assertEqual(self.matcher.match_descriptions(descriptions),
+                         expected)
+        self.assertEqual(self.matcher.match_descriptions_batch(descriptions),
+                         expected)
+        self.assertEqual(self.matcher.cache_stats()['match']['hits'],
+                         stats["match"]["hits"] + 5)
+
+    def test_batch_empty(self):
+        self.assertEqual(self.matcher.match_descriptions_batch([]), [])
+
+    # Result caching
+    def test_repeated_description_cached(self):
+        first, second = self.matcher.match_descriptions(["toyota 86"] * 2)
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+        self.assertEqual(self.matcher.cache_stats()['match']['hits'], 1)
+        self.assertEqual(self.mock_normaliser.preprocess.call_count, 1)
+
+    def test_cache_invalidated_on_reload(self):
+        self.matcher.match_descriptions(["toyota 86"])
+        self.mock_db.vehicles = {}
+        results = self.matcher.match_descriptions(["toyota 86"])
+        self.assertIsNone(results[0]['vehicle_id'])
+
+    # Top-K candidates
+    def test_top_matches_ranked(self):
+        top = self.matcher.top_matches("volkswagen golf automatic", k=3)
+        self.assertEqual(top, [
+            {'vehicle_id': "5824662093168640", 'score': 6, 'listing_count': 18},
+            {'vehicle_id': "4628393442148352", 'score': 6, 'listing_count': 16},
+            {'vehicle_id': "4951649860714496", 'score': 4, 'listing_count': 15},
+        ])
+
+    def test_top_matches_agree_with_full_ranking(self):
+        for description in ["toyota", "automatic", "volkswagen golf r",
+                            "toyota 86 gt automatic petrol rear wheel drive",
+                            "four wheel drive petrol", "unknown make model"]:
+            ranked = sorted(
+                self.matcher._find_potential_matches(description),
+                key=lambda m: (-m['score'], -m['listing_count']))
+            for k in (1, 2, 10):
+                with self.subTest(description=description, k=k):
+                    self.assertEqual(
+                        [(m['vehicle_id'], m['score'])
+                         for m in self.matcher.top_matches(description, k)],
+                        [(m['id'], m['score']) for m in ranked[:k]])
+
+    def test_top_matches_stop_at_ceiling(self):
+        """Perfect candidates end the scan before lower-listed vehicles"""
+        self.matcher.prepare()
+        self.matcher._score_features = MagicMock(
+            wraps=self.matcher._score_features)
+        self.matcher.top_matches("volkswagen automatic", k=1)
+        # Golf R (most listings) reaches the ceiling of make + transmission
+        self.assertEqual(self.matcher._score_features.call_count, 1)
+
+    def test_top_matches_outside_block_outrank_block(self):
+        """Candidates after the block still displace worse-listed ones kept
+        from it"""
+        self.mock_db.vehicles["1"] = MagicMock(
+            id="1", make="ford", model="ranger", badge="ultimate",
+            transmission_type="manual", fuel_type="diesel",
+            drive_type="four wheel drive")
+        self.mock_db.listing_counts.update({"4951649860714496": 30, "1": 25})
+        top = self.matcher.top_matches("golf ultimate", k=2)
+        self.assertEqual([match['vehicle_id'] for match in top],
+                         ["4951649860714496", "1"])
+
+    def test_top_matches_follow_listing_refresh(self):
+        self.matcher.top_matches("volkswagen golf", k=2)
+        self.mock_db.listing_counts["4628393442148352"] = 20
+        self.matcher.apply_delta(CatalogueDelta(
+            {}, set(), {"4628393442148352": 20}))
+        self.assertEqual(
+            self.matcher.top_matches("volkswagen golf", k=1)[0]['vehicle_id'],
+            "4628393442148352")
+
+    # Make/model blocking
+    def test_blocking_identical_to_unblocked(self):
+        descriptions = [
+            "toyota", "volkswagen golf", "golf gti automatic",
+            "toyota 86 gt automatic petrol rear wheel drive",
+            # The Amarok outside the Toyota block scores higher
+            "toyota ultimate diesel four wheel drive automatic",
+            # A tie between a block vehicle and one outside it
+            "toyota rear wheel drive automatic petrol gti",
+            "automatic petrol", "unknown make model"]
+        unblocked = Matcher(self.mock_db, self.mock_normaliser)
+        unblocked.block_fields = []
+        self.assertEqual(self.matcher.match_descriptions(descriptions),
+                         unblocked.match_descriptions(descriptions))
+        self.assertEqual(
+            self.matcher.match_descriptions(descriptions[4:5])[0]['vehicle_id'],
+            "4951649860714496")
+
+    def test_blocking_keeps_empty_make(self):
+        """An empty make matches every description, outside the block"""
+        self.mock_db.vehicles["1"] = MagicMock(
+            id="1", make="", model="x", badge="", transmission_type="",
+            fuel_type="", drive_type="")
+        self.mock_db.listing_counts["1"] = 1
+        result = self.matcher.match_descriptions(["volkswagen golf"])[0]
+        # make, transmission, fuel and drive type all match as ''
+        self.assertEqual(result['vehicle_id'], "1")
+        self.assertEqual(result['confidence'], 6)
+        bitset = Matcher(self.mock_db, self.mock_normaliser, scoring="bitset")
+        self.assertEqual(bitset.match_descriptions(["volkswagen golf"]),
+                         self.matcher.match_descriptions(["volkswagen golf"]))
+
+    def test_blocking_skips_unmentioned_makes(self):
+        self.matcher.prepare()
+        self.matcher._score_features = MagicMock(
+            wraps=self.matcher._score_features)
+        self.matcher.match_descriptions(["toyota 86 automatic"])
+        # The Volkswagens share the transmission but cannot outscore the 86
+        self.assertEqual(self.matcher._score_features.call_count, 1)
+
+    # Bitset scoring
+    def test_bitset_scoring_identical(self):
+        descriptions = [
+            "toyota", "86", "ultimate", "automatic", "diesel",
+            "rear wheel drive", "tdi580 ultimate", "golf gti automatic",
+            "toyota 86 gt automatic petrol rear wheel drive",
+            "toyota ultimate diesel four wheel drive automatic",
+            "toyota rear wheel drive automatic petrol gti",
+            "volkswagen golf", "volkswagen golf r", "gtir", "unknown make model"]
+        bitset = Matcher(self.mock_db, self.mock_normaliser, scoring="bitset")
+        self.assertEqual(bitset.match_descriptions(descriptions),
+                         self.matcher.match_descriptions(descriptions))
+        for description in descriptions:
+            for k in (1, 3, 10):
+                with self.subTest(description=description, k=k):
+                    self.assertEqual(bitset.top_matches(description, k),
+                                     self.matcher.top_matches(description, k))
+
+    def test_bitset_scoring_follows_refresh(self):
+        matcher = Matcher(self.mock_db, self.mock_normaliser, scoring="bitset")
+        matcher.match_descriptions(["volkswagen golf"])
+        self.mock_db.listing_counts["4628393442148352"] = 20
+        matcher.apply_delta(CatalogueDelta({}, set(),
+                                           {"4628393442148352": 20}))
+        self.assertEqual(
+            matcher.match_descriptions(["volkswagen golf"])[0]['vehicle_id'],
+            "4628393442148352")
+
+    def test_unknown_scoring_mode(self):
+        with self.assertRaises(ValueError):
+            Matcher(self.mock_db, self.mock_normaliser, scoring="scan")
+
+    # Scoring plans
+    def test_plan_weights_change_ranking(self):
+        plan = ScoringPlan([FieldRule("make", 1, "substring"),
+                            FieldRule("fuel_type", 5, "substring")])
+        matcher = Matcher(self.mock_db, self.mock_normaliser, plan=plan)
+        result = matcher.match_descriptions(["toyota diesel"])[0]
+        self.assertEqual(result['vehicle_id'], "4951649860714496")
+        self.assertEqual(result['confidence'], 8)  # round(5 / 6 * 10)
+
+    def test_prefix_and_fuzzy_plans_identical_across_paths(self):
+        plan = ScoringPlan([FieldRule("make", 3, "fuzzy"),
+                            FieldRule("model", 2, "fuzzy"),
+                            FieldRule("badge", 2, "prefix"),
+                            FieldRule("transmission_type", 1, "substring"),
+                            FieldRule("drive_type", 1, "word")])
+        descriptions = ["volkswagen amrok ulti", "toyta 86", "golf gt",
+                        "volkswagen four automatic", "tdi", "unknown"]
+        matcher = Matcher(self.mock_db, self.mock_normaliser, plan=plan)
+        results = matcher.match_descriptions(descriptions)
+        self.assertEqual(results[0]['vehicle_id'], "4951649860714496")
+        self.assertEqual(results[0]['confidence'], 8)  # (3 + 2 + 2) / 9
+        self.assertEqual(results[1]['vehicle_id'], "6434473696559104")
+        self.assertEqual(results[1]['confidence'], 6)  # (3 + 2) / 9
+        self.assertEqual(matcher.match_descriptions_batch(descriptions),
+                         results)
+        bitset = Matcher(self.mock_db, self.mock_normaliser,
+                         scoring="bitset", plan=plan)
+        self.assertEqual(bitset.match_descriptions(descriptions), results)
+
+    def test_plan_change_rebuilds_index(self):
+        self.assertEqual(
+            self.matcher.match_descriptions(["ulti"])[0]['vehicle_id'], None)
+        self.matcher.plan = ScoringPlan([FieldRule("badge", 2, "prefix")])
+        self.assertEqual(
+            self.matcher.match_descriptions(["ulti"])[0]['vehicle_id'],
+            "4951649860714496")
+
+    # Fuzzy matching
+    def test_fuzzy_resolves_misspelling(self):
+        fuzzy = Matcher(self.mock_db, self.mock_normaliser,
+                        max_edit_distance=2)
+        self.assertEqual(
+            self.matcher.match_descriptions(["volkswagen amrok"])[0]
+            ['vehicle_id'], "5824662093168640")
+        self.assertEqual(
+            fuzzy.match_descriptions(["volkswagen amrok"])[0]['vehicle_id'],
+            "4951649860714496")
+        self.assertEqual(
+            fuzzy.match_descriptions_batch(["volkswagen amrok"]),
+            fuzzy.match_descriptions(["volkswagen amrok"]))
+
+    def test_fuzzy_vocabulary_follows_refresh(self):
+        fuzzy = Matcher(self.mock_db, self.mock_normaliser,
+                        max_edit_distance=1)
+        fuzzy.match_descriptions(["toyota"])
+        self.mock_db.vehicles["1"] = MagicMock(
+            make="mazda", model="cx-5", badge="maxx", transmission_type="",
+            fuel_type="", drive_type="")
+        fuzzy.apply_delta(CatalogueDelta(
+            {"1": self.mock_db.vehicles["1"]}, set(), {"1": 1}))
+        self.assertEqual(fuzzy.match_descriptions(["madza"])[0]['vehicle_id'],
+                         "1")
+
+    def test_fuzzy_vocabulary_follows_full_reload(self):
+        def catalogue(model):
+            return {"1": MagicMock(
+                make="toyota", model=model, badge="", transmission_type="",
+                fuel_type="", drive_type="")}
+
+        self.mock_db.vehicles = catalogue("carry")
+        self.mock_db.listing_counts = {"1": 1}
+        fuzzy = Matcher(self.mock_db, self.mock_normaliser,
+                        max_edit_distance=1)
+        self.assertEqual(fuzzy.normalise("toyota camry"), "toyota carry")
+        self.mock_db.vehicles = catalogue("camry")
+        self.assertEqual(fuzzy.normalise("toyota camry"), "toyota camry")
+        self.assertEqual(
+            fuzzy.match_descriptions(["toyota camry"]),
+            Matcher(self.mock_db, self.mock_normaliser,
+                    max_edit_distance=1).match_descriptions(["toyota camry"]))
+
+    def test_match_not_cached_across_concurrent_delta(self):
+        put = self.matcher._match_cache.put
+
+        def delta_then_put(key, value):
+            # apply_delta starts, and clears the cache, on another thread
+            # between the generation check and the put
+            self.matcher._generation += 1
+            self.matcher._match_cache.clear()
+            put(key, value)
+
+        self.matcher._match_cache.put = delta_then_put
+        self.matcher.match_descriptions(["toyota 86"])
+        self.matcher.match_descriptions_batch(["volkswagen golf"])
+        self.assertEqual(len(self.matcher._match_cache), 0)
+
+    def test_matching_concurrent_with_apply_delta(self):
+        """Deltas applied on one thread neither break nor leave stale
+        structures behind for matching on another"""
+        descriptions = ["volkswagen golf", "toyota 86", "ultimate", "gtx",
+                        "golf gtx 4 automatic", "amrok"]
+        for scoring in ("heap", "bitset"):
+            matcher = Matcher(self.mock_db, self.mock_normaliser,
+                              max_edit_distance=1, scoring=scoring)
+            matcher.prepare()
+            errors = []
+            done = threading.Event()
+
+            def match():
+                try:
+                    while not done.is_set():
+                        matcher.match_descriptions(descriptions)
+                        matcher.match_descriptions_batch(descriptions)
+                except Exception as error:
+                    errors.append(error)
+
+            interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+            thread = threading.Thread(target=match)
+            thread.start()
+            try:
+                for i in range(100):
+                    vehicle_id = f"{scoring}{i}"
+                    vehicle = MagicMock(
+                        id=vehicle_id, make="volkswagen", model=f"golf{i}",
+                        badge=f"gtx {i}", transmission_type="automatic",
+                        fuel_type="petrol", drive_type="four wheel drive")
+                    self.mock_db.vehicles[vehicle_id] = vehicle
+                    self.mock_db.listing_counts[vehicle_id] = i
+                    matcher.apply_delta(CatalogueDelta(
+                        {vehicle_id: vehicle}, set(), {vehicle_id: i}))
+            finally:
+                done.set()
+                thread.join()
+                sys.setswitchinterval(interval)
+
+            self.assertEqual(errors, [])
+            fresh = Matcher(self.mock_db, self.mock_normaliser,
+                            max_edit_distance=1, scoring=scoring)
+            self.assertEqual(matcher.match_descriptions(descriptions),
+                             fresh.match_descriptions(descriptions))
+            self.assertEqual(matcher.match_descriptions_batch(descriptions),
+                             fresh.match_descriptions_batch(descriptions))
+
+    def test_instrumented_stages_and_counters(self):
+        descriptions = ["volkswagen golf r", "automatic", "volkswagen golf r",
+                        "ferrari"]
+        expected = self.matcher.match_descriptions(descriptions)
+        metrics = Metrics()
+        matcher = Matcher(self.mock_db, self.mock_normaliser)
+        matcher.instrument(metrics)
+        self.assertIs(self.mock_db.metrics, metrics)
+        self.assertEqual(matcher.match_descriptions(descriptions), expected)
+        self.assertEqual(metrics.counters, {
+            'descriptions': 4, 'descriptions_scored': 3, 'ties': 1,
+            'no_match': 1})
+        self.assertEqual(set(metrics.stages),
+                         {'index_build', 'candidates', 'scoring', 'resolve'})
+        self.assertEqual(metrics.stages['candidates'].count, 3)
+        self.assertEqual(metrics.histograms['candidates'].count, 3)
+
+        # Served from the match cache, so nothing is scored again
+        matcher.match_descriptions_batch(descriptions)
+        self.assertEqual(metrics.counters['descriptions'], 8)
+        self.assertEqual(metrics.counters['descriptions_scored'], 3)
+        self.assertNotIn('batch_scoring', metrics.stages)
+
+        metrics = Metrics()
+        matcher = Matcher(self.mock_db, self.mock_normaliser)
+        matcher.instrument(metrics)
+        self.assertEqual(matcher.match_descriptions_batch(descriptions),
+                         expected)
+        self.assertEqual(metrics.counters, {
+            'descriptions': 4, 'descriptions_scored': 3, 'ties': 1,
+            'no_match': 1})
+        self.assertEqual(metrics.stages['batch_scoring'].count, 1)
+
 if __name__ == '__main__':
     unittest.main()
 
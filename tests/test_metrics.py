@@ -0,0 +1,82 @@
+import unittest, sys, os, tempfile, time
+from unittest.mock import MagicMock
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from services.metrics import (Histogram, LogSink, Metrics, SamplingProfiler,
+                              TextfileSink)
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets_and_quantiles(self):
+        histogram = Histogram((1, 10, 100))
+        for value in (0.5, 1, 5, 50, 500):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual((histogram.count, histogram.sum), (5, 556.5))
+        self.assertEqual(histogram.quantile(0.4), 1)
+        self.assertEqual(histogram.quantile(0.8), 100)
+        self.assertEqual(histogram.quantile(1.0), float('inf'))
+
+    def test_empty_quantile(self):
+        self.assertEqual(Histogram((1,)).quantile(0.5), 0.0)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+        self.metrics.increment('descriptions', 3)
+        self.metrics.increment('no_match')
+        self.metrics.set_gauge('vehicles', 42)
+        self.metrics.observe('candidates', 7)
+        with self.metrics.stage('normalise'):
+            pass
+
+    def test_records(self):
+        self.assertEqual(self.metrics.counters,
+                         {'descriptions': 3, 'no_match': 1})
+        self.assertEqual(self.metrics.stages['normalise'].count, 1)
+        self.assertEqual(self.metrics.histograms['candidates'].sum, 7)
+
+    def test_prometheus_text(self):
+        text = self.metrics.prometheus_text()
+        self.assertIn("# TYPE vehicle_matcher_descriptions_total counter\n"
+                      "vehicle_matcher_descriptions_total 3\n", text)
+        self.assertIn("vehicle_matcher_vehicles 42\n", text)
+        self.assertIn('vehicle_matcher_stage_seconds_bucket'
+                      '{stage="normalise",le="+Inf"} 1\n', text)
+        self.assertIn('vehicle_matcher_stage_seconds_count'
+                      '{stage="normalise"} 1\n', text)
+        self.assertIn('vehicle_matcher_candidates_bucket{le="5"} 0\n', text)
+        self.assertIn('vehicle_matcher_candidates_bucket{le="10"} 1\n', text)
+
+    def test_sinks(self):
+        logger = MagicMock()
+        path = os.path.join(tempfile.mkdtemp(), "metrics.prom")
+        self.metrics.sinks = [LogSink(logger), TextfileSink(path)]
+        self.metrics.export()
+        logged = [call.args[2] for call in logger.log.call_args_list]
+        self.assertIn("descriptions: 3", logged)
+        self.assertTrue(any(line.startswith("stage normalise: n=1")
+                            for line in logged))
+        with open(path) as f:
+            self.assertEqual(f.read(), self.metrics.prometheus_text())
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_samples_busy_thread(self):
+        def spin():
+            deadline = time.perf_counter() + 0.1
+            while time.perf_counter() < deadline:
+                pass
+
+        with SamplingProfiler(interval=0.001) as profiler:
+            spin()
+        lines = profiler.collapsed()
+        self.assertTrue(lines)
+        self.assertTrue(any("test_metrics.py:spin" in line for line in lines))
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest, sys, os, asyncio
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from models import VehicleRow
+from services.matcher import Matcher, Normaliser
+from services.microbatch import MicroBatcher
+
+
+def sample_matcher():
+    vehicles = [
+        VehicleRow("1", "Toyota", "86", "GT", "Automatic", "Petrol",
+                   "Rear Wheel Drive"),
+        VehicleRow("2", "Volkswagen", "Golf", "R", "Automatic", "Petrol",
+                   "Four Wheel Drive"),
+        VehicleRow("3", "Volkswagen", "Golf", "GTI", "Automatic", "Petrol",
+                   "Front Wheel Drive"),
+    ]
+    db = SimpleNamespace(vehicles={v.id: v for v in vehicles},
+                         listing_counts={"1": 10, "2": 18, "3": 16})
+    return Matcher(db, Normaliser())
+
+
+class TestMicroBatcher(unittest.TestCase):
+    descriptions = ["Toyota 86 GT", "VW Golf R", "Golf GTI", "unknown",
+                    "Volkswagen Golf"]
+
+    def run_batcher(self, batcher, coroutine_function):
+        async def run():
+            await batcher.start()
+            try:
+                return await coroutine_function()
+            finally:
+                await batcher.stop()
+        return asyncio.run(run())
+
+    def test_results_match_matcher(self):
+        matcher = sample_matcher()
+        batcher = MicroBatcher(matcher, max_batch_size=2, max_wait=0.01)
+        results = self.run_batcher(
+            batcher, lambda: batcher.match_many(self.descriptions))
+        self.assertEqual(results, matcher.match_descriptions(self.descriptions))
+        self.assertEqual(batcher.stats()['batches'], 3)
+
+    def test_concurrent_requests_coalesced(self):
+        batcher = MicroBatcher(sample_matcher(), max_batch_size=64,
+                               max_wait=0.05)
+
+        async def requests():
+            return await asyncio.gather(
+                *(batcher.match(d) for d in self.descriptions))
+
+        results = self.run_batcher(batcher, requests)
+        self.assertEqual([r['input'] for r in results], self.descriptions)
+        self.assertEqual(batcher.stats(), {
+            'batches': 1, 'descriptions': 5, 'batch_size': 5.0})
+
+    def test_full_batch_not_held(self):
+        """A full batch is scored without waiting out max_wait"""
+        batcher = MicroBatcher(sample_matcher(), max_batch_size=2,
+                               max_wait=60)
+
+        async def requests():
+            return await asyncio.wait_for(
+                batcher.match_many(self.descriptions[:2]), 5)
+
+        self.assertEqual(len(self.run_batcher(batcher, requests)), 2)
+
+    def test_errors_reach_every_request(self):
+        matcher = MagicMock()
+        matcher.match_descriptions_batch.side_effect = RuntimeError("boom")
+        batcher = MicroBatcher(matcher, max_wait=0)
+        with self.assertRaises(RuntimeError):
+            self.run_batcher(batcher, lambda: batcher.match("Toyota"))
+
+    def test_large_catalogue_scored_per_description(self):
+        matcher = sample_matcher()
+        expected = matcher.match_descriptions(self.descriptions)
+        matcher.match_descriptions_batch = MagicMock()
+        batcher = MicroBatcher(matcher, max_wait=0.01, batch_scoring_limit=2)
+        results = self.run_batcher(
+            batcher, lambda: batcher.match_many(self.descriptions))
+        self.assertEqual(results, expected)
+        matcher.match_descriptions_batch.assert_not_called()
+
+    def test_swap(self):
+        batcher = MicroBatcher(sample_matcher(), max_wait=0)
+        replacement = sample_matcher()
+        replacement.db.vehicles.pop("1")
+
+        async def requests():
+            before = await batcher.match("Toyota 86 GT")
+            batcher.swap(replacement)
+            return before, await batcher.match("Toyota 86 GT")
+
+        before, after = self.run_batcher(batcher, requests)
+        self.assertEqual(before['vehicle_id'], "1")
+        self.assertIsNone(after['vehicle_id'])
+
+if __name__ == '__main__':
+    unittest.main()
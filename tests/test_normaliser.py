@@ -1,8 +1,8 @@
-import unittest, sys, os
+import unittest, sys, os, json, tempfile, timeit
 
 # Add the app directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
-from services.normaliser import Normaliser
+from services.normaliser import Normaliser, DEFAULT_ABBREVIATIONS
 
 
 class TestNormaliser(unittest.TestCase):
@@ -52,5 +52,54 @@ class TestNormaliser(unittest.TestCase):
         result = self.normaliser.preprocess("")
         self.assertEqual(result, "")
 
+    def test_custom_abbreviations(self):
+        """Test multi-word and special character abbreviations"""
+        normaliser = Normaliser({"h/line": "highline", "E/D": "edition",
+                                 "auto": "automatic"})
+        result = normaliser.preprocess("Amarok H/Line Auto, E/D")
+        self.assertEqual(result, "amarok highline automatic edition")
+
+    def test_longest_abbreviation_wins(self):
+        normaliser = Normaliser({"e": "e-class", "e d": "edition"})
+        self.assertEqual(normaliser.preprocess("black e/d"), "black edition")
+        self.assertEqual(normaliser.preprocess("mercedes e 200"),
+                         "mercedes e-class 200")
+
+    def test_empty_expansion_removes_word(self):
+        normaliser = Normaliser({"with": ""})
+        self.assertEqual(normaliser.preprocess("golf with engine"),
+                         "golf engine")
+
+    def test_from_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json",
+                                         delete=False) as f:
+            json.dump({"h/line": "highline"}, f)
+        self.addCleanup(os.remove, f.name)
+        normaliser = Normaliser.from_file(f.name)
+        self.assertEqual(normaliser.preprocess("h/line"), "highline")
+
+
+class TestNormaliserScaling(unittest.TestCase):
+    """Micro-benchmark: normalisation cost must not grow with the number of
+    abbreviations, since the table is compiled into one pass"""
+
+    DESCRIPTION = "VW Amarok H/Line TDI580 Ultimate Quto 4x4 Diesel Highline"
+
+    def time_preprocess(self, normaliser):
+        return min(timeit.repeat(
+            lambda: normaliser.preprocess(self.DESCRIPTION),
+            number=2000, repeat=5))
+
+    def test_cost_independent_of_dictionary_size(self):
+        large = dict(DEFAULT_ABBREVIATIONS)
+        for i in range(1000):
+            large[f"abbr{i}"] = f"expansion {i}"
+            large[f"x{i}/y"] = f"phrase {i}"
+        small, large = Normaliser(), Normaliser(large)
+        self.assertEqual(small.preprocess(self.DESCRIPTION),
+                         large.preprocess(self.DESCRIPTION))
+        self.assertLess(self.time_preprocess(large),
+                        3 * self.time_preprocess(small))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
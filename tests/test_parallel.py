@@ -0,0 +1,32 @@
+import unittest, sys, os
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from tests.fixtures import sample_database
+from services.matcher import Matcher, Normaliser
+from services.parallel import ParallelMatcher
+
+
+class TestParallelMatcher(unittest.TestCase):
+    def setUp(self):
+        self.mock_db = sample_database()
+        self.matcher = Matcher(self.mock_db, Normaliser())
+        self.descriptions = ["Toyota 86 GT", "VW Golf", "Golf GTI Manual",
+                             "unknown", "FWD petrol"] * 7
+
+    def test_results_in_input_order(self):
+        parallel = ParallelMatcher(self.matcher, workers=2, chunk_size=3)
+        self.assertEqual(list(parallel.match_descriptions(self.descriptions)),
+                         self.matcher.match_descriptions(self.descriptions))
+
+    def test_accepts_iterator(self):
+        parallel = ParallelMatcher(self.matcher, workers=2, chunk_size=4)
+        results = list(parallel.match_descriptions(iter(self.descriptions)))
+        self.assertEqual(len(results), len(self.descriptions))
+
+    def test_empty_input(self):
+        parallel = ParallelMatcher(self.matcher, workers=2)
+        self.assertEqual(list(parallel.match_descriptions([])), [])
+
+if __name__ == '__main__':
+    unittest.main()
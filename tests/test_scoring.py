@@ -0,0 +1,133 @@
+import json, os, sys, tempfile, unittest
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from models.vehicle import VehicleRow
+from services.features import FeatureTable
+from services.index import VehicleIndex
+from services.scoring import FieldRule, ScoringPlan, WordExpander
+
+
+class TestScoringPlan(unittest.TestCase):
+    def setUp(self):
+        self.vehicles = {
+            "1": VehicleRow("1", "toyota", "86", "gt", "automatic", "petrol",
+                            "rear wheel drive"),
+            "2": VehicleRow("2", "volkswagen", "amarok", "tdi580 ultimate",
+                            "automatic", "diesel", "four wheel drive"),
+        }
+
+    def features(self, plan, vehicle_id):
+        table = FeatureTable(self.vehicles, plan.phrase_fields,
+                             plan.word_fields)
+        return table.records[table.position(vehicle_id)]
+
+    def test_default_plan(self):
+        plan = ScoringPlan()
+        self.assertEqual(plan.field_weights, {
+            "make": 3, "model": 2, "badge": 2, "transmission_type": 1,
+            "fuel_type": 1, "drive_type": 1})
+        self.assertEqual(plan.phrase_fields, (
+            "make", "model", "transmission_type", "fuel_type", "drive_type"))
+        self.assertEqual(plan.word_fields, ("badge",))
+        self.assertEqual(plan.max_score, 10)
+        self.assertEqual(plan.confidence(5), 5)
+        self.assertEqual(plan.confidence(12), 10)
+
+    def test_compiled_score(self):
+        plan = ScoringPlan()
+        features = self.features(plan, "2")
+        description = "volkswagen amarok ultimate diesel"
+        self.assertEqual(
+            plan.score(features, description, (set(description.split()),)),
+            3 + 2 + 2 + 1)
+        self.assertEqual(plan.score(features, "toyota", ({"toyota"},)), 0)
+
+    def test_zero_weight_skipped(self):
+        plan = ScoringPlan([FieldRule("make", 3, "substring"),
+                            FieldRule("fuel_type", 0, "substring")])
+        self.assertEqual(plan.max_score, 3)
+        features = self.features(plan, "2")
+        self.assertEqual(plan.score(features, "volkswagen diesel", ()), 3)
+        self.assertEqual(plan.score(features, "diesel", ()), 0)
+
+    def test_from_dict(self):
+        plan = ScoringPlan.from_dict({
+            "fields": {"make": {"weight": 4},
+                       "badge": {"weight": 2, "mode": "prefix"}},
+            "min_prefix_length": 4})
+        self.assertEqual(plan.rules, (FieldRule("make", 4, "substring"),
+                                      FieldRule("badge", 2, "prefix")))
+        self.assertEqual(plan.min_prefix_length, 4)
+        self.assertEqual(plan.max_score, 6)
+
+    def test_from_file(self):
+        config = {"fields": {"model": {"weight": 2, "mode": "fuzzy"}},
+                  "max_edit_distance": 2}
+        with tempfile.NamedTemporaryFile('w', suffix=".json",
+                                         delete=False) as f:
+            json.dump(config, f)
+        try:
+            plan = ScoringPlan.from_file(f.name)
+        finally:
+            os.remove(f.name)
+        self.assertEqual(plan.word_fields, ("model",))
+        self.assertEqual(plan.max_edit_distance, 2)
+
+    def test_invalid_plans(self):
+        for rules in ([FieldRule("colour", 1, "substring")],
+                      [FieldRule("make", 1, "substring"),
+                       FieldRule("make", 2, "word")],
+                      [FieldRule("make", 1, "soundex")],
+                      [FieldRule("make", -1, "substring")],
+                      [FieldRule("make", 1.5, "substring")]):
+            with self.subTest(rules=rules):
+                with self.assertRaises(ValueError):
+                    ScoringPlan(rules)
+        with self.assertRaises(ValueError):
+            ScoringPlan.from_dict({"fields": {}})
+
+
+class TestWordExpander(unittest.TestCase):
+    def setUp(self):
+        self.vehicles = {
+            "1": VehicleRow("1", "toyota", "86", "gt", "", "", ""),
+            "2": VehicleRow("2", "volkswagen", "amarok", "tdi580 ultimate",
+                            "", "", ""),
+            "3": VehicleRow("3", "volkswagen", "golf", "gti", "", "", ""),
+        }
+
+    def expander(self, plan):
+        return WordExpander(plan, VehicleIndex(FeatureTable(
+            self.vehicles, plan.phrase_fields, plan.word_fields)))
+
+    def test_word_mode_unexpanded(self):
+        expander = self.expander(ScoringPlan())
+        words = {"golf", "gt"}
+        self.assertFalse(expander.expands)
+        self.assertIs(expander.expand(words)[0], words)
+        self.assertIs(WordExpander.lookup_words(words, expander.expand(words)),
+                      words)
+
+    def test_prefix(self):
+        expander = self.expander(ScoringPlan(
+            [FieldRule("badge", 2, "prefix")], min_prefix_length=2))
+        self.assertEqual(expander.expand({"ulti"})[0], {"ulti", "ultimate"})
+        self.assertEqual(expander.expand({"gt"})[0], {"gt", "gti"})
+        # Shorter than min_prefix_length
+        self.assertEqual(expander.expand({"u"})[0], {"u"})
+
+    def test_fuzzy(self):
+        expander = self.expander(ScoringPlan(
+            [FieldRule("model", 2, "fuzzy"), FieldRule("badge", 2, "word")]))
+        model_words, badge_words = expander.expand({"amrok", "gti"})
+        self.assertEqual(model_words, {"amarok"})
+        self.assertEqual(badge_words, {"amrok", "gti"})
+        self.assertEqual(
+            WordExpander.lookup_words({"amrok", "gti"},
+                                      (model_words, badge_words)),
+            {"amrok", "gti", "amarok"})
+
+
+if __name__ == '__main__':
+    unittest.main()
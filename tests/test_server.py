@@ -0,0 +1,185 @@
+import unittest, sys, os, asyncio, json, threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from models import CatalogueDelta, VehicleRow
+from server import MatchServer
+from services.matcher import Matcher, Normaliser
+from services.metrics import Metrics
+from services.microbatch import MicroBatcher
+
+
+def sample_matcher():
+    vehicles = [
+        VehicleRow("1", "Toyota", "86", "GT", "Automatic", "Petrol",
+                   "Rear Wheel Drive"),
+        VehicleRow("2", "Volkswagen", "Golf", "R", "Automatic", "Petrol",
+                   "Four Wheel Drive"),
+        VehicleRow("3", "Volkswagen", "Golf", "GTI", "Automatic", "Petrol",
+                   "Front Wheel Drive"),
+    ]
+    db = SimpleNamespace(vehicles={v.id: v for v in vehicles},
+                         listing_counts={"1": 10, "2": 18, "3": 16})
+    return Matcher(db, Normaliser())
+
+
+async def request(port, method, path, payload=None, raw=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = raw if raw is not None else (
+        json.dumps(payload).encode() if payload is not None else b"")
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n"
+                 f"\r\n".encode() + body)
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+class TestMatchServer(unittest.TestCase):
+    def setUp(self):
+        self.matcher = sample_matcher()
+        self.loader = MagicMock(side_effect=sample_matcher)
+        self.server = MatchServer(MicroBatcher(self.matcher, max_wait=0.001),
+                                  self.loader)
+
+    def serve(self, client):
+        async def run():
+            _, port = await self.server.start("127.0.0.1", 0)
+            try:
+                return await client(port)
+            finally:
+                await self.server.stop()
+        return asyncio.run(run())
+
+    def test_match(self):
+        status, result = self.serve(lambda port: request(
+            port, "POST", "/match", {'description': "VW Golf R"}))
+        self.assertEqual(status, 200)
+        self.assertEqual(result, self.matcher.match_description("VW Golf R"))
+
+    def test_match_batch(self):
+        descriptions = ["Toyota 86 GT", "unknown", "Golf GTI"]
+        status, result = self.serve(lambda port: request(
+            port, "POST", "/match/batch", {'descriptions': descriptions}))
+        self.assertEqual(status, 200)
+        self.assertEqual(result['results'],
+                         self.matcher.match_descriptions(descriptions))
+
+    def test_keep_alive(self):
+        async def client(port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            statuses = []
+            for description in ("Toyota 86", "Golf R"):
+                body = json.dumps({'description': description}).encode()
+                writer.write(b"POST /match HTTP/1.1\r\nContent-Length: "
+                             + str(len(body)).encode() + b"\r\n\r\n" + body)
+                statuses.append(await reader.readline())
+                length = 0
+                while (line := await reader.readline()) != b"\r\n":
+                    if line.lower().startswith(b"content-length"):
+                        length = int(line.split(b":")[1])
+                await reader.readexactly(length)
+            writer.close()
+            return statuses
+
+        self.assertEqual(self.serve(client), [b"HTTP/1.1 200 OK\r\n"] * 2)
+
+    def test_bad_requests(self):
+        async def client(port):
+            return [
+                await request(port, "POST", "/match", raw=b"{not json"),
+                await request(port, "POST", "/match", {'description': 1}),
+                await request(port, "GET", "/match"),
+                await request(port, "GET", "/nowhere"),
+            ]
+
+        statuses = [status for status, _ in self.serve(client)]
+        self.assertEqual(statuses, [400, 400, 405, 404])
+
+    def test_incremental_reload(self):
+        delta = CatalogueDelta({}, {"1"}, {"1": 0})
+        batcher_thread = []
+        self.matcher.db.fetch_changes = MagicMock(
+            side_effect=lambda: batcher_thread.append(
+                threading.current_thread()) or delta)
+
+        def apply_changes(changes):
+            batcher_thread.append(threading.current_thread())
+            self.matcher.db.vehicles.pop("1")
+        self.matcher.db.apply_changes = MagicMock(side_effect=apply_changes)
+
+        async def client(port):
+            reload = await request(port, "POST", "/reload")
+            return reload, await request(port, "POST", "/match",
+                                         {'description': "Toyota 86 GT"})
+
+        (status, reload), (_, result) = self.serve(client)
+        self.assertEqual(reload, {'full': False, 'updated': 0, 'removed': 1})
+        self.assertIsNone(result['vehicle_id'])
+        self.matcher.db.apply_changes.assert_called_once_with(delta)
+        # The queries never run on the matching thread
+        fetched, applied = batcher_thread
+        self.assertIsNot(fetched, applied)
+
+    def test_incremental_reload_without_change_tracking(self):
+        self.matcher.db.fetch_changes = MagicMock(return_value=None)
+        self.matcher.db.close = MagicMock()
+        status, result = self.serve(lambda port: request(
+            port, "POST", "/reload"))
+        self.assertEqual((status, result), (200, {'full': True, 'vehicles': 3}))
+        self.loader.assert_called_once()
+
+    def test_full_reload_swaps_matcher(self):
+        self.matcher.db.close = MagicMock()
+        status, result = self.serve(lambda port: request(
+            port, "POST", "/reload?full=1"))
+        self.assertEqual((status, result), (200, {'full': True, 'vehicles': 3}))
+        self.loader.assert_called_once()
+        self.matcher.db.close.assert_called_once()
+        self.assertIsNot(self.server.batcher.matcher, self.matcher)
+
+    def test_health(self):
+        status, result = self.serve(lambda port: request(port, "GET", "/health"))
+        self.assertEqual(status, 200)
+        self.assertEqual(result['vehicles'], 3)
+
+    def test_health_reports_cache_use(self):
+        async def client(port):
+            for _ in range(2):
+                await request(port, "POST", "/match",
+                              {'description': "VW Golf"})
+            return await request(port, "GET", "/health")
+
+        status, result = self.serve(client)
+        self.assertEqual(status, 200)
+        self.assertEqual(result['cache']['match']['size'], 1)
+        self.assertEqual(result['cache']['match']['hits'], 1)
+
+    def test_metrics_disabled(self):
+        status, _ = self.serve(lambda port: request(port, "GET", "/metrics"))
+        self.assertEqual(status, 404)
+
+    def test_metrics(self):
+        self.server.metrics = Metrics()
+        self.matcher.instrument(self.server.metrics)
+
+        async def client(port):
+            await request(port, "POST", "/match", {'description': "VW Golf"})
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nConnection: close\r\n"
+                         b"\r\n")
+            response = await reader.read()
+            writer.close()
+            return response.decode()
+
+        response = self.serve(client)
+        self.assertIn("Content-Type: text/plain", response)
+        self.assertIn("vehicle_matcher_descriptions_total 1\n", response)
+        self.assertIn("vehicle_matcher_batching_batches 1\n", response)
+        self.assertIn('stage_seconds_count{stage="normalise"} 1\n', response)
+
+if __name__ == '__main__':
+    unittest.main()
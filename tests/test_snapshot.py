@@ -0,0 +1,152 @@
+import unittest, sys, os, tempfile
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+from models import VehicleRow
+from models.snapshot import (SavedPostings, SnapshotDatabase, SnapshotError,
+                             write_snapshot, SNAPSHOT_MAGIC)
+from services.index import VehicleIndex
+from services.matcher import Matcher, Normaliser
+from services.scoring import FieldRule, ScoringPlan
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        vehicles = [
+            VehicleRow("6434473696559104", "Toyota", "86", "GT", "Automatic",
+                       "Petrol", "Rear Wheel Drive"),
+            VehicleRow("5824662093168640", "Volkswagen", "Golf", "R",
+                       "Automatic", "Petrol", "Four Wheel Drive"),
+            VehicleRow("4628393442148352", "Volkswagen", "Golf", "GTI",
+                       "Automatic", "Petrol", "Four Wheel Drive"),
+            VehicleRow("5000000000000000", "Škoda", "Octavia", "",
+                       "Manual", "Diesel", "Front Wheel Drive"),
+        ]
+        self.db = SimpleNamespace(
+            vehicles={v.id: v for v in vehicles},
+            listing_counts={"6434473696559104": 10, "5824662093168640": 18,
+                            "4628393442148352": 16},
+            change_watermark=42)
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, "catalogue.snap")
+        write_snapshot(self.db, self.path)
+        self.addCleanup(lambda: os.path.exists(self.path)
+                        and os.remove(self.path))
+
+    def open(self, **kwargs):
+        snapshot = SnapshotDatabase(self.path, **kwargs)
+        snapshot.load_data()
+        return snapshot
+
+    def test_round_trip(self):
+        snapshot = self.open()
+        self.assertEqual(dict(snapshot.vehicles.items()), self.db.vehicles)
+        self.assertEqual(list(snapshot.vehicles), list(self.db.vehicles))
+        self.assertEqual(snapshot.listing_counts.get("5824662093168640"), 18)
+        self.assertEqual(snapshot.listing_counts.get("5000000000000000", 0), 0)
+        self.assertEqual(snapshot.change_watermark, 42)
+
+    def test_matches_without_database(self):
+        descriptions = ["Toyota 86 GT", "VW Golf", "Skoda Octavia", "unknown"]
+        self.assertEqual(
+            Matcher(self.open(), Normaliser()).match_descriptions(descriptions),
+            Matcher(self.db, Normaliser()).match_descriptions(descriptions))
+
+    def test_corruption_detected(self):
+        with open(self.path, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xFF]))
+        with self.assertRaises(SnapshotError):
+            self.open(verify=True)
+        self.open()
+
+    def test_not_a_snapshot(self):
+        with open(self.path, "wb") as f:
+            f.write(b"CREATE TABLE vehicle")
+        with self.assertRaises(SnapshotError):
+            self.open()
+
+    def test_other_format_rejected(self):
+        with open(self.path, "r+b") as f:
+            data = f.read().replace(b'"format": 1', b'"format": 9', 1)
+            f.seek(0)
+            f.write(data)
+        with self.assertRaises(SnapshotError):
+            self.open()
+
+    def test_stale_detection(self):
+        snapshot = self.open()
+        source = MagicMock()
+        source._get_change_watermark.return_value = 42
+        self.assertFalse(snapshot.is_stale(source))
+        source._get_change_watermark.return_value = 43
+        self.assertTrue(snapshot.is_stale(source))
+
+    def test_stale_warning_on_load(self):
+        source = MagicMock()
+        with patch.dict(os.environ, {"DATABASE_URL": "sqlite://"}), \
+                patch("models.snapshot.VehicleDatabase", return_value=source):
+            source._get_change_watermark.return_value = 43
+            with self.assertLogs("models.snapshot", "WARNING"):
+                self.open(check_source=True)
+            source._get_change_watermark.return_value = 42
+            with self.assertNoLogs("models.snapshot", "WARNING"):
+                self.open(check_source=True)
+        source.close.assert_called()
+
+    def test_saved_index(self):
+        matcher = Matcher(self.db, Normaliser())
+        write_snapshot(self.db, self.path, matcher.index)
+        snapshot = self.open()
+        with patch.object(VehicleIndex, "__init__",
+                          side_effect=AssertionError("index rebuilt")):
+            restored_matcher = Matcher(snapshot, Normaliser())
+            restored = restored_matcher.index
+        self.assertEqual(restored_matcher._get_position_counts(),
+                         matcher._get_position_counts())
+        self.assertIsInstance(restored.phrases, SavedPostings)
+        self.assertEqual(restored.phrases, matcher.index.phrases)
+        self.assertEqual(restored.words, matcher.index.words)
+        self.assertEqual(restored.word_masks, matcher.index.word_masks)
+        self.assertEqual(
+            [restored.table.vehicle_id(p) for p in range(len(restored))],
+            [matcher.index.table.vehicle_id(p) for p in range(len(restored))])
+
+        descriptions = ["Toyota 86 GT", "VW Golf", "Skoda Octavia", "unknown"]
+        self.assertEqual(
+            Matcher(snapshot, Normaliser()).match_descriptions(descriptions),
+            matcher.match_descriptions(descriptions))
+
+    def test_saved_index_for_other_fields_ignored(self):
+        write_snapshot(self.db, self.path,
+                       Matcher(self.db, Normaliser()).index)
+        plan = ScoringPlan([FieldRule("make", 3, "substring"),
+                            FieldRule("badge", 2, "prefix")])
+        snapshot = self.open()
+        self.assertIsNone(snapshot.saved_index(plan.phrase_fields,
+                                               plan.word_fields))
+        self.assertEqual(
+            Matcher(snapshot, Normaliser(), plan=plan).match_descriptions(
+                ["Toyota G"]),
+            Matcher(self.db, Normaliser(), plan=plan).match_descriptions(
+                ["Toyota G"]))
+
+    def test_index_out_of_catalogue_order_rejected(self):
+        matcher = Matcher(self.db, Normaliser())
+        index = matcher.index
+        self.db.vehicles = dict(reversed(self.db.vehicles.items()))
+        with self.assertRaises(SnapshotError):
+            write_snapshot(self.db, self.path, index)
+
+    def test_empty_catalogue(self):
+        write_snapshot(SimpleNamespace(vehicles={}, listing_counts={},
+                                       change_watermark=None), self.path)
+        snapshot = self.open()
+        self.assertEqual(len(snapshot.vehicles), 0)
+
+if __name__ == '__main__':
+    unittest.main()